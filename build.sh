@@ -34,6 +34,10 @@ python manage.py makemigrations
 echo "Applying migrations..."
 python manage.py migrate --noinput
 
+# Create the cache table (a no-op unless CACHE_BACKEND is the database cache)
+echo "Creating cache table..."
+python manage.py createcachetable
+
 # Verify database tables
 echo "Verifying database tables..."
 python << END
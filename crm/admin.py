@@ -3,7 +3,7 @@ from .models import (
     Account, Contact, Lead, Opportunity, Task,
     CustomField, CustomFieldValue, Report, Dashboard, DashboardComponent,
     EmailTemplate, WorkflowRule, WorkflowAction, ApprovalProcess,
-    ApprovalStep, ApprovalRequest
+    ApprovalStep, ApprovalRequest, ApprovalResponse, DashboardMetrics, WorkflowOutboxEntry
 )
 
 @admin.register(Account)
@@ -86,6 +86,13 @@ class WorkflowActionAdmin(admin.ModelAdmin):
     search_fields = ('name',)
     ordering = ('workflow_rule', 'order')
 
+@admin.register(WorkflowOutboxEntry)
+class WorkflowOutboxEntryAdmin(admin.ModelAdmin):
+    list_display = ('action_type', 'workflow_rule', 'content_type', 'record_id', 'status', 'attempts', 'available_date')
+    list_filter = ('status', 'action_type')
+    search_fields = ('last_error',)
+    ordering = ('-created_date',)
+
 @admin.register(ApprovalProcess)
 class ApprovalProcessAdmin(admin.ModelAdmin):
     list_display = ('name', 'model_name', 'active', 'owner')
@@ -105,3 +112,14 @@ class ApprovalRequestAdmin(admin.ModelAdmin):
     list_filter = ('approval_process', 'status', 'current_step')
     search_fields = ('comments',)
     ordering = ('-created_date',)
+
+@admin.register(ApprovalResponse)
+class ApprovalResponseAdmin(admin.ModelAdmin):
+    list_display = ('approval_request', 'step', 'approver', 'decision', 'created_date')
+    list_filter = ('decision',)
+    ordering = ('-created_date',)
+
+@admin.register(DashboardMetrics)
+class DashboardMetricsAdmin(admin.ModelAdmin):
+    list_display = ('period', 'total_accounts', 'open_opportunities_count', 'active_leads_count', 'refreshed_date')
+    readonly_fields = ('refreshed_date',)
@@ -19,5 +19,8 @@ router.register(r'workflow-actions', views.WorkflowActionViewSet)
 router.register(r'approval-processes', views.ApprovalProcessViewSet)
 router.register(r'approval-steps', views.ApprovalStepViewSet)
 router.register(r'approval-requests', views.ApprovalRequestViewSet)
+router.register(r'communications', views.EmailCommunicationViewSet)
 
-urlpatterns = router.urls 
\ No newline at end of file
+urlpatterns = router.urls + [
+    path('cache-stats/', views.ResponseCacheStatsView.as_view(), name='cache-stats'),
+] 
\ No newline at end of file
@@ -0,0 +1,336 @@
+"""Approval process matching and approval request decisions.
+
+``approval_matcher`` picks the active approval process whose
+``entry_criteria`` a record meets. Criteria use the same lookups as workflow
+rule conditions (crm/workflows.py). Each model's active processes are
+compiled once per schema snapshot into a ``ProcessIndex``: processes are
+bucketed by the value they require of the attribute most of them test for
+equality, so a match is one dict lookup plus the predicates of the few
+candidates in that bucket. When several processes match, the oldest wins.
+``submit_records`` uses it to submit many records for approval at once.
+
+``apply_bulk_action`` approves, rejects or recalls many requests in one
+transaction. Whatever the batch size it runs a fixed number of queries:
+lock the requests, load every step of their processes, load the current
+steps' approvers, load prior responses (unanimous steps only), then one
+insert for the responses and one update for the requests.
+
+Approving a ``first_response`` step advances the request at once; a
+``unanimous`` step advances when every approver of the step has approved.
+Advancing moves to the next ``step_number`` of the process, or marks the
+request approved after the last step. Any approver's rejection rejects the
+request, and only the submitter (or staff) can recall it.
+"""
+import logging
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Callable, NamedTuple, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ApprovalRequest, ApprovalResponse, ApprovalStep, get_record_model
+from .registry import ApprovalProcessSpec, schema_registry
+from .workflows import WorkflowConditionError, compile_conditions, equality_constraints
+
+logger = logging.getLogger(__name__)
+
+BULK_ACTIONS = ('approve', 'reject', 'recall')
+WRITE_BATCH_SIZE = 1000
+
+
+class CompiledProcess(NamedTuple):
+    spec: ApprovalProcessSpec
+    predicate: Callable
+
+
+class ProcessIndex(NamedTuple):
+    attname: Optional[str]  # the bucketed attribute, None if nothing is
+    field: Any
+    buckets: dict  # value -> (CompiledProcess, ...) in priority order
+    fallback: Tuple[CompiledProcess, ...]  # processes that do not constrain attname
+
+    def candidates(self, instance):
+        if self.attname is None:
+            return self.fallback
+        value = getattr(instance, self.attname)
+        if value is not None:
+            try:
+                value = self.field.to_python(value)
+            except ValidationError:
+                return self.fallback
+        return self.buckets.get(value, self.fallback)
+
+
+def _build_index(compiled):
+    """Bucket ``(CompiledProcess, constraints)`` pairs, already in priority order."""
+    counts = Counter(attname for _, constraints in compiled for attname in constraints)
+    if not counts:
+        return ProcessIndex(None, None, {}, tuple(process for process, _ in compiled))
+    attname = min(counts, key=lambda name: (-counts[name], name))
+    field = next(constraints[attname][0] for _, constraints in compiled if attname in constraints)
+
+    values = set()
+    for _, constraints in compiled:
+        if attname in constraints:
+            values.update(constraints[attname][1])
+    # Each bucket keeps the processes requiring that value plus the ones that
+    # do not care, so a lookup never has to merge two lists.
+    buckets = {
+        value: tuple(
+            process for process, constraints in compiled
+            if attname not in constraints or value in constraints[attname][1]
+        )
+        for value in values
+    }
+    fallback = tuple(process for process, constraints in compiled if attname not in constraints)
+    return ProcessIndex(attname, field, buckets, fallback)
+
+
+def compile_processes(snapshot):
+    """Return {model_name: ProcessIndex} for the active processes of a snapshot."""
+    by_model = defaultdict(list)
+    for spec in snapshot.approval_processes.values():
+        if not spec.active:
+            continue
+        try:
+            model = get_record_model(spec.model_name)
+            predicate = compile_conditions(model, spec.entry_criteria)
+            constraints = equality_constraints(model, spec.entry_criteria)
+        except (LookupError, WorkflowConditionError) as exc:
+            logger.warning('Skipping approval process %s (%s): %s', spec.pk, spec.name, exc)
+            continue
+        by_model[spec.model_name].append((CompiledProcess(spec, predicate), constraints))
+    return {
+        model_name: _build_index(sorted(compiled, key=lambda item: item[0].spec.pk))
+        for model_name, compiled in by_model.items()
+    }
+
+
+class ApprovalMatcher:
+    """Finds the approval process that applies to a record."""
+
+    def __init__(self, registry=schema_registry):
+        self.registry = registry
+        self._compiled = (None, {})
+        self._lock = threading.Lock()
+
+    def index_for(self, model_name):
+        snapshot = self.registry.snapshot()
+        compiled_snapshot, indexes = self._compiled
+        if compiled_snapshot is not snapshot:
+            with self._lock:
+                compiled_snapshot, indexes = self._compiled
+                if compiled_snapshot is not snapshot:
+                    indexes = compile_processes(snapshot)
+                    self._compiled = (snapshot, indexes)
+        return indexes.get(model_name)
+
+    def match(self, instance):
+        """Return the ApprovalProcessSpec ``instance`` enters, or None."""
+        return self.match_many([instance])[0]
+
+    def match_many(self, instances):
+        """Match records of one model; return a spec or None for each, in order."""
+        instances = list(instances)
+        if not instances:
+            return []
+        index = self.index_for(type(instances[0]).__name__)
+        if index is None:
+            return [None] * len(instances)
+        matched = []
+        for instance in instances:
+            for process in index.candidates(instance):
+                try:
+                    if process.predicate(instance):
+                        matched.append(process.spec)
+                        break
+                except TypeError as exc:
+                    logger.warning('Approval process %s could not be evaluated: %s', process.spec.pk, exc)
+            else:
+                matched.append(None)
+        return matched
+
+
+approval_matcher = ApprovalMatcher()
+
+
+def submit_records(user, model_name, record_ids, comments=''):
+    """Submit records of one model for approval; return one result per id, in order.
+
+    Each record enters the process ``approval_matcher`` picks for it, at that
+    process's first step. A result is ``{'index', 'record_id', 'status':
+    'submitted', 'id', 'approval_process'}`` or ``{'index', 'record_id',
+    'status': 'error', 'errors': {...}}``. Runs four queries however many
+    records are submitted.
+    """
+    model = get_record_model(model_name)
+    with transaction.atomic():
+        records = model._default_manager.in_bulk(set(record_ids))
+        matched = dict(zip(records, approval_matcher.match_many(records.values())))
+        process_ids = {spec.pk for spec in matched.values() if spec is not None}
+        first_steps = {}
+        for step in ApprovalStep.objects.filter(approval_process__in=process_ids).order_by('-step_number', '-pk'):
+            first_steps[step.approval_process_id] = step
+        pending = set(ApprovalRequest.objects.filter(
+            status='pending', approval_process__model_name=model_name, record_id__in=list(records)
+        ).values_list('record_id', flat=True))
+
+        results = []
+        to_create = []
+        seen = {}
+        for index, record_id in enumerate(record_ids):
+            spec = matched.get(record_id)
+            error = None
+            if record_id not in records:
+                error = f'{model_name} {record_id} does not exist'
+            elif record_id in seen:
+                error = f'Duplicate of row {seen[record_id]}'
+            elif record_id in pending:
+                error = 'Record already has a pending approval request'
+            elif spec is None:
+                error = 'No active approval process applies to this record'
+            elif spec.pk not in first_steps:
+                error = f'Approval process {spec.name} has no steps'
+            if error:
+                results.append({
+                    'index': index, 'record_id': record_id, 'status': 'error', 'errors': {'record_id': error},
+                })
+                continue
+            seen[record_id] = index
+            to_create.append(ApprovalRequest(
+                approval_process_id=spec.pk, current_step=first_steps[spec.pk], record_id=record_id,
+                submitter=user, comments=comments,
+            ))
+            results.append({
+                'index': index, 'record_id': record_id, 'status': 'submitted', 'approval_process': spec.pk,
+            })
+
+        created = ApprovalRequest.objects.bulk_create(to_create, batch_size=WRITE_BATCH_SIZE)
+    for result, request in zip((r for r in results if r['status'] == 'submitted'), created):
+        result['id'] = request.pk
+    return results
+
+
+def _next_steps(steps):
+    """Map each step id to the following step of its process, or None."""
+    by_process = defaultdict(list)
+    for step in steps:
+        by_process[step.approval_process_id].append(step)
+    following = {}
+    for process_steps in by_process.values():
+        process_steps.sort(key=lambda step: (step.step_number, step.pk))
+        for step, after in zip(process_steps, process_steps[1:] + [None]):
+            following[step.pk] = after
+    return following
+
+
+def apply_bulk_action(user, action, request_ids, comments=''):
+    """Apply ``action`` to each request id; return one result per id, in order.
+
+    A result is ``{'index', 'id', 'status', 'current_step'}`` where status is
+    ``approved``, ``advanced``, ``recorded`` (a unanimous step still waiting
+    on other approvers), ``rejected`` or ``recalled``; or
+    ``{'index', 'id', 'status': 'error', 'errors': {...}}``.
+    """
+    if action not in BULK_ACTIONS:
+        raise ValueError(f"action must be one of {', '.join(BULK_ACTIONS)}")
+    now = timezone.now()
+
+    with transaction.atomic():
+        requests = ApprovalRequest.objects.select_for_update().in_bulk(set(request_ids))
+        pending = [r for r in requests.values() if r.status == 'pending']
+
+        approvers = defaultdict(set)
+        following = {}
+        steps = {}
+        responded = defaultdict(set)
+        approved_by = defaultdict(set)
+        if pending and action != 'recall':
+            process_steps = ApprovalStep.objects.filter(
+                approval_process__in={r.approval_process_id for r in pending}
+            )
+            steps = {step.pk: step for step in process_steps}
+            following = _next_steps(steps.values())
+            memberships = ApprovalStep.approvers.through.objects.filter(
+                approvalstep_id__in={r.current_step_id for r in pending}
+            ).values_list('approvalstep_id', 'user_id')
+            for step_id, user_id in memberships:
+                approvers[step_id].add(user_id)
+
+            unanimous = [
+                r.pk for r in pending
+                if r.current_step_id in steps and steps[r.current_step_id].approval_type == 'unanimous'
+            ]
+            if unanimous:
+                prior = ApprovalResponse.objects.filter(
+                    approval_request__in=unanimous
+                ).values_list('approval_request_id', 'step_id', 'approver_id', 'decision')
+                for request_id, step_id, approver_id, decision in prior:
+                    responded[request_id, step_id].add(approver_id)
+                    if decision == 'approved':
+                        approved_by[request_id, step_id].add(approver_id)
+
+        results = []
+        responses = []
+        changed = []
+        seen = {}
+        for index, pk in enumerate(request_ids):
+            request = requests.get(pk)
+            error = None
+            if request is None:
+                error = f'Approval request {pk} does not exist'
+            elif pk in seen:
+                error = f'Duplicate of row {seen[pk]}'
+            elif request.status != 'pending':
+                error = f'Request is already {request.status}'
+            elif action == 'recall':
+                if request.submitter_id != user.pk and not user.is_staff:
+                    error = 'Only the submitter can recall a request'
+            elif request.current_step_id not in steps:
+                error = 'The current step does not belong to the approval process'
+            elif user.pk not in approvers[request.current_step_id]:
+                error = 'You are not an approver of the current step'
+            elif user.pk in responded[pk, request.current_step_id]:
+                error = 'You have already responded to this step'
+            if error:
+                results.append({'index': index, 'id': pk, 'status': 'error', 'errors': {'id': error}})
+                continue
+            seen[pk] = index
+
+            if action == 'recall':
+                request.status = outcome = 'recalled'
+            else:
+                step = steps[request.current_step_id]
+                decision = 'approved' if action == 'approve' else 'rejected'
+                responses.append(ApprovalResponse(
+                    approval_request=request, step=step, approver=user,
+                    decision=decision, comments=comments, created_date=now,
+                ))
+                waiting = approvers[step.pk] - approved_by[pk, step.pk] - {user.pk}
+                if decision == 'rejected':
+                    request.status = outcome = 'rejected'
+                elif step.approval_type == 'unanimous' and waiting:
+                    outcome = 'recorded'
+                elif following[step.pk] is None:
+                    request.status = outcome = 'approved'
+                else:
+                    request.current_step = following[step.pk]
+                    outcome = 'advanced'
+            if outcome != 'recorded':
+                if comments:
+                    request.comments = comments
+                request.modified_date = now
+                changed.append(request)
+            results.append({
+                'index': index, 'id': pk, 'status': outcome, 'current_step': request.current_step_id,
+            })
+
+        if responses:
+            ApprovalResponse.objects.bulk_create(responses, batch_size=WRITE_BATCH_SIZE)
+        if changed:
+            ApprovalRequest.objects.bulk_update(
+                changed, ['status', 'current_step', 'comments', 'modified_date'], batch_size=WRITE_BATCH_SIZE
+            )
+    return results
@@ -0,0 +1,322 @@
+"""Bulk write paths for the API.
+
+Rows are validated in one pass with every lookup they need (custom fields,
+record ids) fetched in a constant number of queries, and written in a single
+transaction.
+
+``create_records``, ``update_records`` and ``delete_records`` do this for
+the core CRM records. One child serializer validates every row, with the
+related records the rows reference loaded in one query per relation. Valid
+rows are written with ``bulk_create`` or ``bulk_update``, which skip model
+signals, so the effects of the post_save handlers in crm/signals.py are
+applied here instead: one dashboard metrics update for the batch and a
+workflow evaluation per record. Deletes go through ``QuerySet.delete`` so
+cascades and the delete handlers run as usual.
+"""
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from rest_framework import serializers
+
+from . import metrics
+from .custom_fields import TYPED_COLUMNS, typed_columns
+from .models import CustomField, CustomFieldValue, get_record_model
+from .workflows import workflow_engine
+
+DEFAULT_BULK_MAX_ROWS = 5000
+WRITE_BATCH_SIZE = 1000
+
+
+def bulk_max_rows():
+    return getattr(settings, 'CRM_BULK_MAX_ROWS', DEFAULT_BULK_MAX_ROWS)
+
+
+def _as_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _as_id(value):
+    if isinstance(value, bool):
+        raise ValueError
+    return int(value)
+
+
+def _normalize_value_row(row):
+    """Return (custom_field_id, record_id, value, errors) for a dict or 3-item row."""
+    if isinstance(row, (list, tuple)) and len(row) == 3:
+        custom_field_id, record_id, value = row
+    elif isinstance(row, dict):
+        custom_field_id, record_id, value = row.get('custom_field'), row.get('record_id'), row.get('value')
+    else:
+        return None, None, None, {'non_field_errors': 'Expected an object or a [custom_field, record_id, value] triple'}
+
+    errors = {}
+    try:
+        custom_field_id = _as_id(custom_field_id)
+    except (TypeError, ValueError):
+        errors['custom_field'] = 'A valid custom field id is required'
+    try:
+        record_id = _as_id(record_id)
+    except (TypeError, ValueError):
+        errors['record_id'] = 'A valid record id is required'
+    return custom_field_id, record_id, _as_text(value), errors
+
+
+def upsert_custom_field_values(rows):
+    """Validate and upsert custom field values; return one result per row.
+
+    Each result is ``{'index': i, 'status': 'upserted'}`` or
+    ``{'index': i, 'status': 'error', 'errors': {...}}``. Valid rows are
+    written with the database's native upsert on (custom_field, record_id).
+    """
+    normalized = [_normalize_value_row(row) for row in rows]
+
+    field_ids = {field_id for field_id, _, _, errors in normalized if not errors}
+    fields = CustomField.objects.in_bulk(field_ids)
+
+    # One existence query per record model referenced in the batch.
+    wanted_records = defaultdict(set)
+    for field_id, record_id, _, errors in normalized:
+        if not errors and field_id in fields:
+            wanted_records[fields[field_id].model_name].add(record_id)
+    existing_records = {}
+    content_types = {}
+    for model_name, record_ids in wanted_records.items():
+        model = get_record_model(model_name)
+        content_types[model_name] = ContentType.objects.get_for_model(model)
+        existing_records[model_name] = set(
+            model._default_manager.filter(pk__in=record_ids).values_list('pk', flat=True)
+        )
+
+    picklists = {field_id: set(field.get_picklist_values()) for field_id, field in fields.items()}
+
+    results = []
+    to_write = []
+    seen = {}
+    for index, (field_id, record_id, value, errors) in enumerate(normalized):
+        errors = dict(errors)
+        field = fields.get(field_id)
+        if not errors:
+            if field is None:
+                errors['custom_field'] = f'Custom field {field_id} does not exist'
+            elif record_id not in existing_records[field.model_name]:
+                errors['record_id'] = f'{field.model_name} {record_id} does not exist'
+            elif (field_id, record_id) in seen:
+                errors['non_field_errors'] = f'Duplicate of row {seen[(field_id, record_id)]}'
+        if not errors:
+            try:
+                columns = typed_columns(field.field_type, value, strict=True)
+            except ValueError as exc:
+                errors['value'] = str(exc)
+            else:
+                if value and picklists[field_id] and value not in picklists[field_id]:
+                    errors['value'] = f"'{value}' is not one of {sorted(picklists[field_id])}"
+                elif not value and field.required:
+                    errors['value'] = 'This field is required'
+        if errors:
+            results.append({'index': index, 'status': 'error', 'errors': errors})
+            continue
+
+        seen[(field_id, record_id)] = index
+        to_write.append(CustomFieldValue(
+            custom_field_id=field_id,
+            record_id=record_id,
+            content_type=content_types[field.model_name],
+            value=value,
+            **columns,
+        ))
+        results.append({'index': index, 'status': 'upserted'})
+
+    if to_write:
+        with transaction.atomic():
+            CustomFieldValue.objects.bulk_create(
+                to_write,
+                batch_size=WRITE_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['custom_field', 'record_id'],
+                update_fields=['value', 'content_type', *TYPED_COLUMNS],
+            )
+    return results
+
+
+# Core records
+
+def _lookup_preloaded(field, found, data):
+    try:
+        pk = _as_id(data)
+    except (TypeError, ValueError):
+        # Malformed: let the field report it as usual.
+        return type(field).to_internal_value(field, data)
+    if pk not in found:
+        field.fail('does_not_exist', pk_value=data)
+    return found[pk]
+
+
+def _preload_related_fields(serializer, rows):
+    """Resolve the primary keys ``rows`` reference with one query per related field."""
+    for name, field in serializer.fields.items():
+        if field.read_only or not isinstance(field, serializers.PrimaryKeyRelatedField):
+            continue
+        ids = set()
+        for row in rows:
+            try:
+                ids.add(_as_id(row[name]))
+            except (KeyError, TypeError, ValueError):
+                continue
+        found = field.get_queryset().in_bulk(ids) if ids else {}
+        field.to_internal_value = partial(_lookup_preloaded, field, found)
+
+
+def _validate_rows(serializer_class, rows, context, instances=None):
+    """Yield ``(validated_data, errors)`` for each row.
+
+    Rows are validated by a single child serializer, partially against
+    ``instances`` (one per row) when given.
+    """
+    child = serializer_class(many=True, partial=instances is not None, context=context).child
+    _preload_related_fields(child, [row for row in rows if isinstance(row, dict)])
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            yield None, {'non_field_errors': 'Expected an object'}
+            continue
+        child.instance = instances[index] if instances is not None else None
+        try:
+            yield child.run_validation(row), None
+        except serializers.ValidationError as exc:
+            yield None, serializers.as_serializer_error(exc)
+
+
+def _saved(model, instances, created, old_values=None):
+    """Apply the post_save effects of crm/signals.py to records written in bulk."""
+    if model in metrics.TRACKED_FIELDS:
+        old_values = old_values or [None] * len(instances)
+        metrics.apply_deltas(model, [
+            (old, metrics.instance_values(instance)) for old, instance in zip(old_values, instances)
+        ])
+    for instance in instances:
+        workflow_engine.run(instance, created)
+
+
+def create_records(serializer_class, rows, context=None, defaults=None):
+    """Validate and insert ``rows``; return one result per row.
+
+    ``defaults`` are set on every new record (the owner, as the viewset's
+    ``perform_create`` would). A result is ``{'index', 'id', 'status':
+    'created'}`` or ``{'index', 'status': 'error', 'errors': {...}}``.
+    """
+    model = serializer_class.Meta.model
+    results = []
+    to_create = []
+    for index, (validated, errors) in enumerate(_validate_rows(serializer_class, rows, context)):
+        if errors:
+            results.append({'index': index, 'status': 'error', 'errors': errors})
+            continue
+        to_create.append(model(**validated, **(defaults or {})))
+        results.append({'index': index, 'status': 'created'})
+
+    if to_create:
+        with transaction.atomic():
+            model._default_manager.bulk_create(to_create, batch_size=WRITE_BATCH_SIZE)
+            _saved(model, to_create, created=True)
+        created = iter(to_create)
+        for result in results:
+            if result['status'] == 'created':
+                result['id'] = next(created).pk
+    return results
+
+
+def update_records(queryset, serializer_class, rows, context=None):
+    """Validate and apply partial updates of the records of ``queryset`` named by each row's ``id``.
+
+    A result is ``{'index', 'id', 'status': 'updated'}`` or ``{'index', 'id',
+    'status': 'error', 'errors': {...}}``.
+    """
+    model = queryset.model
+    ids = []
+    for row in rows:
+        try:
+            ids.append(_as_id(row['id']))
+        except (KeyError, TypeError, ValueError):
+            ids.append(None)
+
+    with transaction.atomic():
+        records = queryset.select_for_update().in_bulk({pk for pk in ids if pk is not None})
+        tracked = model in metrics.TRACKED_FIELDS
+        auto_now = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)]
+
+        results = []
+        seen = {}
+        valid_rows = []
+        instances = []
+        for index, pk in enumerate(ids):
+            error = None
+            if pk is None:
+                error = 'A valid record id is required'
+            elif pk not in records:
+                error = f'{model.__name__} {pk} does not exist'
+            elif pk in seen:
+                error = f'Duplicate of row {seen[pk]}'
+            if error:
+                results.append({'index': index, 'id': pk, 'status': 'error', 'errors': {'id': error}})
+                continue
+            seen[pk] = index
+            valid_rows.append((index, rows[index]))
+            instances.append(records[pk])
+
+        changed = []
+        old_values = []
+        fields = {field.name for field in auto_now}
+        validation = _validate_rows(serializer_class, [row for _, row in valid_rows], context, instances)
+        for (index, _), instance, (validated, errors) in zip(valid_rows, instances, validation):
+            if errors:
+                results.append({'index': index, 'id': instance.pk, 'status': 'error', 'errors': errors})
+                continue
+            if tracked:
+                old_values.append(metrics.instance_values(instance))
+            for name, value in validated.items():
+                setattr(instance, name, value)
+            for field in auto_now:
+                field.pre_save(instance, add=False)
+            fields.update(validated)
+            changed.append(instance)
+            results.append({'index': index, 'id': instance.pk, 'status': 'updated'})
+
+        if changed:
+            model._default_manager.bulk_update(changed, sorted(fields), batch_size=WRITE_BATCH_SIZE)
+            _saved(model, changed, created=False, old_values=old_values)
+    results.sort(key=lambda result: result['index'])
+    return results
+
+
+def delete_records(queryset, ids):
+    """Delete the records of ``queryset`` with the given ids; return one result per id.
+
+    A result is ``{'index', 'id', 'status': 'deleted'}`` or ``{'index', 'id',
+    'status': 'error', 'errors': {...}}``.
+    """
+    model = queryset.model
+    with transaction.atomic():
+        existing = set(queryset.filter(pk__in=set(ids)).values_list('pk', flat=True))
+        results = []
+        seen = {}
+        for index, pk in enumerate(ids):
+            error = None
+            if pk not in existing:
+                error = f'{model.__name__} {pk} does not exist'
+            elif pk in seen:
+                error = f'Duplicate of row {seen[pk]}'
+            if error:
+                results.append({'index': index, 'id': pk, 'status': 'error', 'errors': {'id': error}})
+                continue
+            seen[pk] = index
+            results.append({'index': index, 'id': pk, 'status': 'deleted'})
+        if seen:
+            queryset.filter(pk__in=list(seen)).delete()
+    return results
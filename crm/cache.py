@@ -0,0 +1,174 @@
+"""Read-through cache for API responses.
+
+Cached entries live in a per-process LRU. They are keyed by the viewset,
+action, URL kwargs, query parameters, the requester's visibility class and
+the current version of every model the response is built from. Versions are
+counters kept in Django's cache backend, so a configured shared backend lets
+every worker see a bump; ``bump_version`` is called from the post_save and
+post_delete handlers in crm/signals.py. A stale entry is never served because
+its key can no longer be produced; it simply ages out of the LRU.
+
+With a process-local backend (the default LocMemCache) a bump would never
+reach the other workers, so responses are only cached when
+``CRM_RESPONSE_CACHE_ENABLED`` says so or, when it is unset, when the
+backend is shared.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+VERSION_KEY_PREFIX = 'crm:version:'
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared():
+    """Whether the default cache backend is visible to every worker."""
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+def response_cache_enabled():
+    """Whether API responses may be cached; see the module docstring."""
+    enabled = getattr(settings, 'CRM_RESPONSE_CACHE_ENABLED', None)
+    if enabled is None:
+        enabled = cache_is_shared()
+    return enabled
+
+
+def _version_key(model):
+    return f'{VERSION_KEY_PREFIX}{model._meta.label_lower}'
+
+
+def _initial_version():
+    # Seeded from the clock so a counter evicted from the cache backend never
+    # restarts at a value an existing LRU entry was keyed with.
+    return time.time_ns() // 1000
+
+
+def get_versions(models):
+    """Return the current version of each model, in order."""
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return tuple(versions[key] for key in keys)
+
+
+def bump_version(model):
+    """Invalidate every cached response built from ``model``."""
+    key = _version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with hit, miss and eviction counters."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+response_cache = LRUCache(getattr(settings, 'CRM_RESPONSE_CACHE_SIZE', 512))
+visibility_cache = LRUCache(getattr(settings, 'CRM_RESPONSE_CACHE_SIZE', 512))
+
+
+class CachedResponseMixin:
+    """Serve GET list/retrieve responses of owner-or-public viewsets from cache.
+
+    ``cache_models`` lists every model the serialized response depends on; the
+    first one must carry the ``owner``/``is_public`` fields used by
+    ``get_queryset``. Users who own no private objects all see the same
+    results and share one ``public`` visibility class.
+    """
+    cache_models = ()
+
+    def get_visibility_class(self, versions):
+        user = self.request.user
+        model = self.cache_models[0]
+        key = ('owns-private', model._meta.label_lower, user.pk, versions[0])
+        owns_private = visibility_cache.get(key)
+        if owns_private is None:
+            owns_private = model._default_manager.filter(owner=user, is_public=False).exists()
+            visibility_cache.set(key, owns_private)
+        return f'user:{user.pk}' if owns_private else 'public'
+
+    def get_cache_key(self, request, versions):
+        params = tuple(sorted((name, tuple(values)) for name, values in request.query_params.lists()))
+        return (
+            type(self).__name__,
+            self.action,
+            tuple(sorted(self.kwargs.items())),
+            params,
+            self.get_visibility_class(versions),
+            versions,
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not response_cache_enabled():
+            return handler(request, *args, **kwargs)
+        versions = get_versions(self.cache_models)
+        key = self.get_cache_key(request, versions)
+        data = response_cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response_cache.set(key, response.data)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,109 @@
+"""Typed storage helpers for custom field values.
+
+``CustomFieldValue.value`` keeps the raw text the API accepts, and one typed
+column, picked by ``CustomField.field_type``, holds the parsed value so it can
+be indexed, range-filtered and sorted in the database.
+"""
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+TEXT_COLUMN_LENGTH = 255
+NUMBER_MAX_DIGITS = 28
+NUMBER_DECIMAL_PLACES = 8
+
+TYPED_COLUMNS = ('value_number', 'value_date', 'value_datetime', 'value_boolean', 'value_text')
+
+COLUMN_FOR_TYPE = {
+    'number': 'value_number',
+    'date': 'value_date',
+    'datetime': 'value_datetime',
+    'boolean': 'value_boolean',
+    'text': 'value_text',
+    'picklist': 'value_text',
+    'url': 'value_text',
+    'email': 'value_text',
+    'phone': 'value_text',
+}
+
+TRUE_VALUES = {'true', '1', 'yes', 'y', 'on'}
+FALSE_VALUES = {'false', '0', 'no', 'n', 'off'}
+
+
+def _parse_number(raw):
+    try:
+        number = Decimal(raw)
+    except InvalidOperation:
+        raise ValueError(f"'{raw}' is not a valid number")
+    if not number.is_finite():
+        raise ValueError(f"'{raw}' is not a valid number")
+    if number and number.adjusted() >= NUMBER_MAX_DIGITS - NUMBER_DECIMAL_PLACES:
+        raise ValueError(f"'{raw}' is out of range")
+    return number.quantize(Decimal(1).scaleb(-NUMBER_DECIMAL_PLACES))
+
+
+def _parse_date(raw):
+    parsed = parse_date(raw)
+    if parsed is None:
+        raise ValueError(f"'{raw}' is not a valid date (YYYY-MM-DD)")
+    return parsed
+
+
+def _parse_datetime(raw):
+    parsed = parse_datetime(raw)
+    if parsed is None:
+        parsed_date = parse_date(raw)
+        if parsed_date is None:
+            raise ValueError(f"'{raw}' is not a valid datetime (ISO 8601)")
+        parsed = datetime.combine(parsed_date, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _parse_boolean(raw):
+    lowered = raw.lower()
+    if lowered in TRUE_VALUES:
+        return True
+    if lowered in FALSE_VALUES:
+        return False
+    raise ValueError(f"'{raw}' is not a valid boolean")
+
+
+PARSERS = {
+    'value_number': _parse_number,
+    'value_date': _parse_date,
+    'value_datetime': _parse_datetime,
+    'value_boolean': _parse_boolean,
+    'value_text': lambda raw: raw[:TEXT_COLUMN_LENGTH],
+}
+
+
+def parse_value(field_type, raw):
+    """Parse raw text for ``field_type``; return (column, value).
+
+    Blank values parse to ``None``. Raises ValueError for text that is not a
+    valid value of the type.
+    """
+    column = COLUMN_FOR_TYPE.get(field_type, 'value_text')
+    raw = (raw or '').strip()
+    if not raw:
+        return column, None
+    return column, PARSERS[column](raw)
+
+
+def typed_columns(field_type, raw, strict=False):
+    """Return every typed column for a raw value; unparseable values map to ``None``
+    unless ``strict`` is set, in which case ValueError propagates.
+    """
+    columns = dict.fromkeys(TYPED_COLUMNS)
+    try:
+        column, value = parse_value(field_type, raw)
+    except ValueError:
+        if strict:
+            raise
+        return columns
+    columns[column] = value
+    return columns
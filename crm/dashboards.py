@@ -0,0 +1,117 @@
+"""Batched dashboard rendering.
+
+All components of a dashboard are loaded in one query and every distinct
+report behind them runs once, however many components chart it. Distinct
+reports can optionally run concurrently on a thread pool, each thread on its
+own database connection.
+
+Each report returns at most ``CRM_DASHBOARD_MAX_ROWS`` rows; components of a
+cut-off report are marked ``truncated``. A component whose report cannot run
+or whose chart configuration is invalid gets an ``error`` entry instead of
+failing the whole dashboard. Rendered for a user, only reports that user may
+see (their own or public ones) are run; components of any other report get
+an ``error`` entry too.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+from .reports import ReportDefinitionError, compile_report
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RENDER_WORKERS = 4
+DEFAULT_MAX_ROWS = 1000
+
+
+def _execute(report):
+    """Run a report and return (columns, rows, truncated) or raise ReportDefinitionError."""
+    max_rows = getattr(settings, 'CRM_DASHBOARD_MAX_ROWS', DEFAULT_MAX_ROWS)
+    compiled = compile_report(report)
+    rows = [list(row) for row in compiled.queryset[:max_rows + 1]]
+    return compiled.columns, rows[:max_rows], len(rows) > max_rows
+
+
+def _execute_in_worker(report):
+    try:
+        return _execute(report)
+    finally:
+        # Worker threads get their own connection; don't leak it.
+        connection.close()
+
+
+def _collect(execute, report):
+    try:
+        return {'result': execute(report)}
+    except ReportDefinitionError as exc:
+        return {'error': str(exc)}
+    except Exception:
+        logger.exception('Dashboard report %s failed', report.pk)
+        return {'error': 'The report could not be run'}
+
+
+def report_visible_to(report, user):
+    """Whether ``user`` may see the output of ``report``."""
+    return report.is_public or report.owner_id == user.pk
+
+
+def render_dashboard(dashboard, concurrent=False, max_workers=None, user=None):
+    """Return every component of ``dashboard`` with its report data.
+
+    With ``user``, reports that user may not see are not run.
+    """
+    components = list(
+        dashboard.components.select_related('report').order_by('position', 'pk')
+    )
+    reports = {}
+    hidden = {}
+    for component in components:
+        if user is not None and not report_visible_to(component.report, user):
+            hidden[component.report_id] = {'error': 'Report not found'}
+        else:
+            reports.setdefault(component.report_id, component.report)
+
+    if concurrent and len(reports) > 1:
+        max_workers = max_workers or getattr(settings, 'CRM_DASHBOARD_RENDER_WORKERS', DEFAULT_RENDER_WORKERS)
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(reports))) as pool:
+            futures = {
+                report_id: pool.submit(_collect, _execute_in_worker, report)
+                for report_id, report in reports.items()
+            }
+            results = {report_id: future.result() for report_id, future in futures.items()}
+    else:
+        results = {report_id: _collect(_execute, report) for report_id, report in reports.items()}
+    results.update(hidden)
+
+    rendered = []
+    for component in components:
+        outcome = results[component.report_id]
+        try:
+            chart_config = component.get_chart_config()
+        except ValueError as exc:
+            chart_config = {}
+            outcome = {'error': f'Invalid chart_config: {exc}'}
+        entry = {
+            'id': component.pk,
+            'title': component.title,
+            'report': component.report_id,
+            'chart_type': component.chart_type,
+            'chart_config': chart_config,
+            'width': component.width,
+            'height': component.height,
+            'position': component.position,
+        }
+        if 'error' in outcome:
+            entry['error'] = outcome['error']
+        else:
+            entry['columns'], entry['rows'], entry['truncated'] = outcome['result']
+        rendered.append(entry)
+
+    return {
+        'dashboard': dashboard.pk,
+        'name': dashboard.name,
+        'reports_executed': len(reports),
+        'components': rendered,
+    }
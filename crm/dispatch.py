@@ -0,0 +1,305 @@
+"""Pooled HTTP delivery for workflow outbound messages.
+
+``OutboundDispatcher.send`` takes a list of messages, each addressed to an
+``Endpoint``, and delivers them concurrently:
+
+* connections are kept alive and reused, pooled per (scheme, host, port);
+* only hosts matching CRM_OUTBOUND_ALLOWED_HOSTS are contacted, or, without
+  that setting, only public addresses (see ``check_host``);
+* at most ``Endpoint.concurrency`` requests are in flight per endpoint;
+* endpoints configured with ``batch_size`` > 1 receive up to that many
+  messages per request as ``{"messages": [...]}``; others get one JSON
+  payload per request.
+
+Each message comes back with an outcome: ``done``, ``retry`` (network
+errors, timeouts, 408, 429 and 5xx) or ``failed`` (any other response, or a
+url or header the request cannot be built from; the caller dead-letters it).
+The dispatcher holds no durable state; retries and dead letters are tracked
+by the workflow outbox (crm/outbox.py).
+"""
+import http.client
+import ipaddress
+import json
+import socket
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import NamedTuple, Tuple
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http.request import validate_host
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 10
+DEFAULT_WORKERS = 32
+DEFAULT_POOL_SIZE = 16
+MAX_BATCH_SIZE = 500
+
+RETRY_STATUSES = {408, 429}
+
+
+class EndpointConfigError(ValueError):
+    """Raised for an outbound message configuration that can never be delivered."""
+
+
+def _is_public(address):
+    ip = ipaddress.ip_address(address)
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global
+
+
+def check_host(hostname):
+    """Return True if ``hostname`` is trusted by CRM_OUTBOUND_ALLOWED_HOSTS.
+
+    With the setting, hosts it does not match raise EndpointConfigError.
+    Without it, IP literals must be public addresses and names are checked
+    once resolved (``public_addresses``), so workflows cannot reach
+    loopback, private or link-local services.
+    """
+    allowed = getattr(settings, 'CRM_OUTBOUND_ALLOWED_HOSTS', None)
+    if allowed is not None:
+        if not validate_host(hostname, allowed):
+            raise EndpointConfigError(f'{hostname} is not in CRM_OUTBOUND_ALLOWED_HOSTS')
+        return True
+    try:
+        public = _is_public(hostname)
+    except ValueError:
+        return False
+    if not public:
+        raise EndpointConfigError(f'{hostname} is not a public address')
+    return False
+
+
+def public_addresses(hostname, port):
+    """Resolve ``hostname``; raise EndpointConfigError unless every address is public."""
+    infos = socket.getaddrinfo(hostname, port, type=socket.SOCK_STREAM)
+    for *_, sockaddr in infos:
+        if not _is_public(sockaddr[0]):
+            raise EndpointConfigError(f'{hostname} resolves to {sockaddr[0]}, which is not a public address')
+    return infos
+
+
+def create_connection(address, timeout, source_address=None):
+    """``socket.create_connection`` that only connects to permitted addresses.
+
+    The vetted address is the one connected to, so a name cannot resolve to
+    something else between the check and the connection.
+    """
+    host, port = address
+    if check_host(host):
+        return socket.create_connection(address, timeout, source_address)
+    error = None
+    for family, type_, proto, _, sockaddr in public_addresses(host, port):
+        sock = socket.socket(family, type_, proto)
+        try:
+            sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as exc:
+            sock.close()
+            error = exc
+    raise error
+
+
+class Endpoint(NamedTuple):
+    url: str
+    batch_size: int = 1
+    concurrency: int = DEFAULT_CONCURRENCY
+    timeout: float = DEFAULT_TIMEOUT
+    headers: Tuple[Tuple[str, str], ...] = ()
+
+
+def endpoint_for(config):
+    """Build an Endpoint from an outbound_message action's config."""
+    url = config.get('url')
+    parts = urlsplit(url or '')
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise EndpointConfigError('Outbound message needs an http(s) url')
+    try:
+        parts.port
+    except ValueError:
+        raise EndpointConfigError(f'Outbound message url has an invalid port: {url}')
+    check_host(parts.hostname)
+    try:
+        batch_size = int(config.get('batch_size', 1))
+        concurrency = int(config.get(
+            'concurrency', getattr(settings, 'CRM_OUTBOUND_CONCURRENCY', DEFAULT_CONCURRENCY)
+        ))
+        timeout = float(config.get('timeout', DEFAULT_TIMEOUT))
+    except (TypeError, ValueError):
+        raise EndpointConfigError('batch_size, concurrency and timeout must be numbers')
+    if not 1 <= batch_size <= MAX_BATCH_SIZE or concurrency < 1 or timeout <= 0:
+        raise EndpointConfigError(f'batch_size must be 1-{MAX_BATCH_SIZE}; concurrency and timeout positive')
+    headers = tuple(sorted((str(k), str(v)) for k, v in dict(config.get('headers', {})).items()))
+    return Endpoint(url, batch_size, concurrency, timeout, headers)
+
+
+class ConnectionPool:
+    """Idle keep-alive connections to one host."""
+
+    def __init__(self, scheme, host, port, maxsize):
+        self.connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        self.host = host
+        self.port = port
+        self.maxsize = maxsize
+        self.created = 0
+        self._idle = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        """Return (connection, reused)."""
+        with self._lock:
+            if self._idle:
+                conn = self._idle.pop()
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+            self.created += 1
+        conn = self.connection_class(self.host, self.port, timeout=timeout)
+        # http.client connects through this hook; HTTPS still verifies the
+        # certificate against self.host.
+        conn._create_connection = create_connection
+        return conn, False
+
+    def release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for conn in idle:
+            conn.close()
+
+
+class OutboundDispatcher:
+    """Delivers outbound messages over pooled keep-alive connections."""
+
+    def __init__(self, workers=None, pool_size=None):
+        self.workers = workers or getattr(settings, 'CRM_OUTBOUND_WORKERS', DEFAULT_WORKERS)
+        self.pool_size = pool_size or getattr(settings, 'CRM_OUTBOUND_POOL_SIZE', DEFAULT_POOL_SIZE)
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='outbound')
+            return self._executor
+
+    def pool_for(self, url):
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname, port)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = ConnectionPool(parts.scheme, parts.hostname, port, self.pool_size)
+            return pool
+
+    def post(self, endpoint, body):
+        """POST ``body`` to the endpoint; return the response status."""
+        parts = urlsplit(endpoint.url)
+        path = parts.path or '/'
+        if parts.query:
+            path = f'{path}?{parts.query}'
+        headers = {'Content-Type': 'application/json', **dict(endpoint.headers)}
+        pool = self.pool_for(endpoint.url)
+        while True:
+            conn, reused = pool.acquire(endpoint.timeout)
+            try:
+                conn.request('POST', path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if reused:
+                    # The server closed an idle keep-alive connection; try a
+                    # fresh one before counting this as a failure.
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                pool.release(conn)
+            return response.status
+
+    def deliver(self, endpoint, payloads):
+        """Send one request carrying ``payloads``; return (outcome, error)."""
+        if endpoint.batch_size > 1:
+            document = {'messages': payloads}
+        else:
+            document = payloads[0]
+        body = json.dumps(document, cls=DjangoJSONEncoder).encode()
+        try:
+            status = self.post(endpoint, body)
+        except (ValueError, http.client.InvalidURL) as exc:
+            # A malformed url or header value fails the same way every time.
+            return 'failed', f'{type(exc).__name__}: {exc}'
+        except (OSError, http.client.HTTPException) as exc:
+            return 'retry', f'{type(exc).__name__}: {exc}'
+        if 200 <= status < 300:
+            return 'done', ''
+        if status in RETRY_STATUSES or status >= 500:
+            return 'retry', f'HTTP {status}'
+        return 'failed', f'HTTP {status}'
+
+    def _drain(self, endpoint, chunks, outcomes):
+        while True:
+            try:
+                chunk = chunks.popleft()
+            except IndexError:
+                return
+            outcome = self.deliver(endpoint, [payload for _, payload in chunk])
+            for key, _ in chunk:
+                outcomes[key] = outcome
+
+    def send(self, messages):
+        """Deliver ``messages`` (an iterable of (key, Endpoint, payload)).
+
+        Returns {key: (outcome, error)}. Each endpoint's messages are split
+        into requests of up to ``batch_size`` and drained by at most
+        ``concurrency`` tasks, which caps the requests in flight to it.
+        """
+        by_endpoint = defaultdict(list)
+        for key, endpoint, payload in messages:
+            by_endpoint[endpoint].append((key, payload))
+
+        outcomes = {}
+        futures = []
+        executor = self.executor()
+        for endpoint, items in by_endpoint.items():
+            size = endpoint.batch_size
+            chunks = deque(items[i:i + size] for i in range(0, len(items), size))
+            for _ in range(min(endpoint.concurrency, len(chunks))):
+                futures.append(executor.submit(self._drain, endpoint, chunks, outcomes))
+        wait(futures)
+        for future in futures:
+            future.result()
+        return outcomes
+
+    def close(self):
+        """Close pooled connections and stop the worker threads."""
+        with self._lock:
+            pools, self._pools = self._pools, {}
+            executor, self._executor = self._executor, None
+        for pool in pools.values():
+            pool.close()
+        if executor is not None:
+            executor.shutdown()
+
+
+outbound_dispatcher = OutboundDispatcher()
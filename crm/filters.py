@@ -0,0 +1,146 @@
+"""Custom field filtering and ordering for the record ViewSets.
+
+``?cf.<name>=<value>`` and ``?cf.<name>__<lookup>=<value>`` filter records by a
+custom field; ``?ordering=cf.<name>`` (or ``-cf.<name>``) sorts by one. Both
+run in the database against the typed ``CustomFieldValue`` columns, as an
+EXISTS subquery for filters and a correlated subquery for ordering.
+
+``EmailCommunicationFilter`` adds address filters for the communications API.
+"""
+import django_filters
+from django.db.models import Exists, F, OuterRef, Subquery
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from .custom_fields import COLUMN_FOR_TYPE, parse_value
+from .models import CustomFieldValue, EmailCommunication, EmailRecipient
+from .recipients import normalize_address
+from .registry import schema_registry
+
+CUSTOM_FIELD_PREFIX = 'cf.'
+
+COMPARISON_LOOKUPS = {'exact', 'gt', 'gte', 'lt', 'lte'}
+TEXT_LOOKUPS = {'iexact', 'contains', 'icontains', 'startswith', 'istartswith'}
+LOOKUPS = COMPARISON_LOOKUPS | TEXT_LOOKUPS | {'in', 'isnull'}
+
+
+def get_custom_fields(model, names):
+    """Return {name: CustomFieldSpec} for the given names defined on ``model``."""
+    defined = schema_registry.custom_fields(model.__name__)
+    return {name: defined[name] for name in names if name in defined}
+
+
+def value_subquery(custom_field, **filters):
+    """Custom field values of ``custom_field`` for the outer record."""
+    return CustomFieldValue.objects.filter(
+        custom_field_id=custom_field.pk, record_id=OuterRef('pk'), **filters
+    )
+
+
+class CustomFieldFilterBackend(BaseFilterBackend):
+    """Filter records with ``?cf.<name>[__<lookup>]=<value>`` parameters."""
+
+    def parse_params(self, request):
+        params = []
+        for key in request.query_params:
+            if not key.startswith(CUSTOM_FIELD_PREFIX):
+                continue
+            name, _, lookup = key[len(CUSTOM_FIELD_PREFIX):].partition('__')
+            lookup = lookup or 'exact'
+            if lookup not in LOOKUPS:
+                raise ValidationError({key: f"Unsupported lookup '{lookup}'"})
+            params.append((key, name, lookup, request.query_params.get(key)))
+        return params
+
+    def build_condition(self, key, custom_field, lookup, raw):
+        column = COLUMN_FOR_TYPE.get(custom_field.field_type, 'value_text')
+        try:
+            if lookup == 'isnull':
+                _, is_null = parse_value('boolean', raw)
+                has_value = Exists(value_subquery(custom_field, **{f'{column}__isnull': False}))
+                return ~has_value if is_null else has_value
+            if lookup in TEXT_LOOKUPS:
+                if column != 'value_text':
+                    raise ValueError(f"'{lookup}' only applies to text fields")
+                return Exists(value_subquery(custom_field, **{f'{column}__{lookup}': raw}))
+            if lookup == 'in':
+                values = [parse_value(custom_field.field_type, item)[1] for item in raw.split(',')]
+                return Exists(value_subquery(custom_field, **{f'{column}__in': values}))
+            _, value = parse_value(custom_field.field_type, raw)
+        except ValueError as exc:
+            raise ValidationError({key: str(exc)})
+        if value is None:
+            raise ValidationError({key: 'A value is required'})
+        return Exists(value_subquery(custom_field, **{f'{column}__{lookup}': value}))
+
+    def filter_queryset(self, request, queryset, view):
+        params = self.parse_params(request)
+        if not params:
+            return queryset
+        fields = get_custom_fields(queryset.model, [name for _, name, _, _ in params])
+        for key, name, lookup, raw in params:
+            if name not in fields:
+                raise ValidationError({key: f"Unknown custom field '{name}'"})
+            queryset = queryset.filter(self.build_condition(key, fields[name], lookup, raw))
+        return queryset
+
+
+class CustomFieldOrderingFilter(OrderingFilter):
+    """OrderingFilter that also accepts ``cf.<name>`` terms."""
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param)
+        terms = [term.strip() for term in params.split(',')] if params else []
+        names = [
+            term.lstrip('-')[len(CUSTOM_FIELD_PREFIX):]
+            for term in terms if term.lstrip('-').startswith(CUSTOM_FIELD_PREFIX)
+        ]
+        if not names:
+            return super().filter_queryset(request, queryset, view)
+
+        fields = get_custom_fields(queryset.model, names)
+        ordering = []
+        for term in terms:
+            name = term.lstrip('-')
+            if not name.startswith(CUSTOM_FIELD_PREFIX):
+                ordering.extend(self.remove_invalid_fields(queryset, [term], view, request))
+                continue
+            custom_field = fields.get(name[len(CUSTOM_FIELD_PREFIX):])
+            if custom_field is None:
+                continue
+            alias = f'_cf_{custom_field.pk}'
+            column = COLUMN_FOR_TYPE.get(custom_field.field_type, 'value_text')
+            queryset = queryset.annotate(**{alias: Subquery(value_subquery(custom_field).values(column)[:1])})
+            expression = F(alias)
+            ordering.append(
+                expression.desc(nulls_last=True) if term.startswith('-') else expression.asc(nulls_last=True)
+            )
+        return queryset.order_by(*ordering) if ordering else queryset
+
+
+class EmailCommunicationFilter(django_filters.FilterSet):
+    """``?recipient=`` and ``?participant=`` (sender or recipient) by address.
+
+    Both resolve through the EmailRecipient index (crm/recipients.py), as a
+    semi-join on (address, role).
+    """
+    recipient = django_filters.CharFilter(method='filter_recipient')
+    participant = django_filters.CharFilter(method='filter_participant')
+
+    class Meta:
+        model = EmailCommunication
+        fields = ['account', 'contact', 'direction', 'requires_follow_up', 'follow_up_completed']
+
+    def _by_address(self, queryset, value, roles):
+        address = normalize_address(value)
+        if not address:
+            return queryset.none()
+        return queryset.filter(pk__in=EmailRecipient.objects.filter(
+            address=address, role__in=roles
+        ).values('communication_id'))
+
+    def filter_recipient(self, queryset, name, value):
+        return self._by_address(queryset, value, ['recipient'])
+
+    def filter_participant(self, queryset, name, value):
+        return self._by_address(queryset, value, ['sender', 'recipient'])
@@ -0,0 +1,90 @@
+"""Open email follow-ups across the org.
+
+A follow-up is open while ``requires_follow_up`` is set and
+``follow_up_completed`` is not. ``open_follow_ups`` filters on exactly the
+condition of the partial index ``crm_email_follow_up_idx`` on
+``(owner, follow_up_date)``, so both the per-owner queue and the digest read
+only open follow-ups, however much mail has been logged. Follow-ups without
+a date are never overdue or upcoming and are left out of both.
+
+``follow_up_digest`` returns, for every owner with something due, how many
+follow-ups are overdue and upcoming plus the earliest few of them. It is a
+single query: window functions count and number each owner's rows, so no
+per-owner query is issued and only the listed rows leave the database.
+"""
+import datetime
+from typing import List, NamedTuple, Optional
+
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import EmailCommunication
+
+OPEN_CONDITION = Q(requires_follow_up=True, follow_up_completed=False)
+DEFAULT_DAYS = 7
+MAX_DAYS = 366
+DEFAULT_LIMIT = 10
+DUE_CHOICES = ('overdue', 'upcoming', 'all')
+
+
+def open_follow_ups(queryset=None):
+    """Return the open follow-ups in ``queryset`` (default: all communications)."""
+    if queryset is None:
+        queryset = EmailCommunication.objects.all()
+    return queryset.filter(OPEN_CONDITION)
+
+
+def due_follow_ups(queryset=None, due='all', today=None, days=DEFAULT_DAYS):
+    """Return open follow-ups that are overdue, upcoming within ``days``, or either.
+
+    Overdue means a follow-up date before ``today``; upcoming means from
+    ``today`` up to and including ``today + days``, where ``days`` is
+    0-MAX_DAYS.
+    """
+    if due not in DUE_CHOICES:
+        raise ValueError(f"due must be one of {', '.join(DUE_CHOICES)}")
+    if not 0 <= days <= MAX_DAYS:
+        raise ValueError(f'days must be 0-{MAX_DAYS}')
+    today = today or timezone.localdate()
+    queryset = open_follow_ups(queryset)
+    if due == 'overdue':
+        return queryset.filter(follow_up_date__lt=today)
+    horizon = today + datetime.timedelta(days=days)
+    if due == 'upcoming':
+        return queryset.filter(follow_up_date__gte=today, follow_up_date__lte=horizon)
+    return queryset.filter(follow_up_date__lte=horizon)
+
+
+class OwnerDigest(NamedTuple):
+    owner_id: Optional[int]
+    owner: Optional[object]
+    overdue: int
+    upcoming: int
+    items: List[EmailCommunication]
+
+
+def follow_up_digest(today=None, days=DEFAULT_DAYS, limit=DEFAULT_LIMIT, owner_ids=None) -> List[OwnerDigest]:
+    """Return each owner's overdue and upcoming follow-up counts and earliest ``limit`` items.
+
+    Owners are ordered by id, with follow-ups that have no owner last; items
+    are ordered by follow-up date, so overdue ones come first. ``owner_ids``
+    restricts the digest to those owners.
+    """
+    today = today or timezone.localdate()
+    queryset = due_follow_ups(today=today, days=days)
+    if owner_ids is not None:
+        queryset = queryset.filter(owner_id__in=owner_ids)
+    per_owner = {'partition_by': [F('owner_id')]}
+    rows = queryset.select_related('owner', 'account').defer('body').annotate(
+        owner_overdue=Window(Count('id', filter=Q(follow_up_date__lt=today)), **per_owner),
+        owner_upcoming=Window(Count('id', filter=Q(follow_up_date__gte=today)), **per_owner),
+        position=Window(RowNumber(), order_by=[F('follow_up_date').asc(), F('id').asc()], **per_owner),
+    ).filter(position__lte=limit).order_by(F('owner_id').asc(nulls_last=True), 'follow_up_date', 'id')
+
+    digest = []
+    for row in rows:
+        if not digest or digest[-1].owner_id != row.owner_id:
+            digest.append(OwnerDigest(row.owner_id, row.owner, row.owner_overdue, row.owner_upcoming, []))
+        digest[-1].items.append(row)
+    return digest
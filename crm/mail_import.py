@@ -0,0 +1,244 @@
+"""Streaming import of mbox and .eml archives into EmailCommunication.
+
+``iter_messages`` yields parsed messages one at a time. mbox files are read
+line by line and each message is fed to its own parser, so memory depends
+on the largest message rather than on the file. ``AddressIndex`` maps
+addresses to contacts, accounts and users. It is built once from three
+queries, so matching a message costs dictionary lookups only.
+``parse_message`` extracts the fields and a de-duplication key, and
+``build_communication`` turns the result into an unsaved EmailCommunication
+(or None when no account can be found for it).
+"""
+import datetime
+import hashlib
+import os
+from email import policy
+from email.header import decode_header, make_header
+from email.feedparser import BytesFeedParser
+from email.utils import getaddresses, parseaddr, parsedate_to_datetime
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import Account, Contact, EmailCommunication
+
+MAILBOX_SUFFIXES = ('.mbox', '.mbx', '.mbox.txt')
+EML_SUFFIX = '.eml'
+
+
+def _new_parser():
+    # compat32 leaves headers as raw strings; the structured header classes
+    # of policy.default cost several times more than the rest of parsing.
+    return BytesFeedParser(policy=policy.compat32)
+
+
+def iter_mbox(fh) -> Iterator:
+    """Yield the messages of an mbox opened in binary mode, one at a time."""
+    parser = None
+    after_blank = True
+    for line in fh:
+        if after_blank and line.startswith(b'From '):
+            if parser is not None:
+                yield parser.close()
+            parser = _new_parser()
+        elif parser is not None:
+            if line.startswith(b'>') and line.lstrip(b'>').startswith(b'From '):
+                line = line[1:]  # mboxrd quoting
+            parser.feed(line)
+        after_blank = line in (b'\n', b'\r\n')
+    if parser is not None:
+        yield parser.close()
+
+
+def iter_eml(path) -> Iterator:
+    """Yield the single message stored in an .eml file."""
+    parser = _new_parser()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(64 * 1024), b''):
+            parser.feed(chunk)
+    yield parser.close()
+
+
+def iter_paths(paths) -> Iterator[str]:
+    """Expand directories into the mailbox and .eml files under them."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(MAILBOX_SUFFIXES + (EML_SUFFIX,)):
+                    yield os.path.join(root, name)
+
+
+def iter_messages(paths) -> Iterator[Tuple[str, object]]:
+    """Yield (path, message) for every message in ``paths``."""
+    for path in iter_paths(paths):
+        if path.lower().endswith(EML_SUFFIX):
+            for message in iter_eml(path):
+                yield path, message
+        else:
+            with open(path, 'rb') as fh:
+                for message in iter_mbox(fh):
+                    yield path, message
+
+
+def _domain(address):
+    return address.rpartition('@')[2]
+
+
+class AddressIndex:
+    """In-memory lookups from email addresses to CRM records."""
+
+    def __init__(self, contacts: Dict[str, Tuple[int, int]], domains: Dict[str, int], users: Dict[str, int]):
+        self.contacts = contacts  # address -> (contact_id, account_id)
+        self.domains = domains  # domain -> account_id
+        self.users = users  # address -> user_id
+
+    @classmethod
+    def build(cls) -> 'AddressIndex':
+        """Load every contact, account website and user address; three queries."""
+        contacts = {}
+        domain_accounts = {}
+        for contact_id, email, account_id in Contact.objects.order_by('pk').values_list('pk', 'email', 'account_id'):
+            address = email.strip().lower()
+            if address:
+                contacts.setdefault(address, (contact_id, account_id))
+                domain_accounts.setdefault(_domain(address), set()).add(account_id)
+        # A contact domain names an account only if all its contacts share one.
+        domains = {domain: ids.pop() for domain, ids in domain_accounts.items() if len(ids) == 1}
+        for account_id, website in Account.objects.exclude(website='').values_list('pk', 'website'):
+            host = (urlsplit(website if '//' in website else f'//{website}').hostname or '').lower()
+            if host.startswith('www.'):
+                host = host[4:]
+            if host:
+                domains[host] = account_id
+        users = {
+            email.strip().lower(): user_id
+            for user_id, email in User.objects.exclude(email='').order_by('-pk').values_list('pk', 'email')
+        }
+        return cls(contacts, domains, users)
+
+    def contact(self, address) -> Optional[Tuple[int, int]]:
+        return self.contacts.get(address)
+
+    def account(self, address) -> Optional[int]:
+        contact = self.contacts.get(address)
+        if contact is not None:
+            return contact[1]
+        return self.domains.get(_domain(address))
+
+
+class ParsedMessage(NamedTuple):
+    key: str
+    sender: str
+    recipients: Tuple[str, ...]
+    subject: str
+    body: str
+    sent_date: object
+
+
+def _header(message, name):
+    value = message.get(name)
+    if value is None:
+        return ''
+    try:
+        return str(make_header(decode_header(value)))
+    except (LookupError, UnicodeError, ValueError):
+        return str(value)
+
+
+def _text_body(message):
+    """Return the first text/plain part, else the first text/html part as text."""
+    html = None
+    for part in message.walk():
+        if part.is_multipart() or part.get_content_maintype() != 'text':
+            continue
+        if part.get('Content-Disposition', '').lower().startswith('attachment'):
+            continue
+        subtype = part.get_content_subtype()
+        if subtype == 'plain':
+            return _decode_part(part).strip()
+        if subtype == 'html' and html is None:
+            html = part
+    return strip_tags(_decode_part(html)).strip() if html is not None else ''
+
+
+def _decode_part(part):
+    payload = part.get_payload(decode=True) or b''
+    try:
+        return payload.decode(part.get_content_charset() or 'utf-8', 'replace')
+    except LookupError:
+        return payload.decode('utf-8', 'replace')
+
+
+def parse_message(message) -> Optional[ParsedMessage]:
+    """Extract the fields EmailCommunication needs; None if it has no sender or date."""
+    try:
+        sender = parseaddr(str(message.get('From', '')))[1].strip().lower()
+        headers = [str(value) for name in ('To', 'Cc', 'Bcc') for value in message.get_all(name, [])]
+        recipients = tuple(dict.fromkeys(
+            address.strip().lower() for _, address in getaddresses(headers) if address
+        ))
+        date = message.get('Date')
+        sent_date = parsedate_to_datetime(str(date)) if date else None
+    except (TypeError, ValueError, IndexError):
+        return None
+    if not sender or sent_date is None:
+        return None
+    if timezone.is_naive(sent_date):
+        sent_date = timezone.make_aware(sent_date, datetime.timezone.utc)
+    subject = ' '.join(_header(message, 'Subject').split())
+    body = _text_body(message)
+
+    message_id = str(message.get('Message-ID', '')).strip().strip('<>').lower()
+    if message_id:
+        seed = f'id:{message_id}'
+    else:
+        seed = '\0'.join(['content', sender, sent_date.isoformat(), subject, body])
+    key = hashlib.sha256(seed.encode('utf-8', 'surrogatepass')).hexdigest()
+    return ParsedMessage(key, sender, recipients, subject, body, sent_date)
+
+
+def build_communication(parsed: ParsedMessage, index: AddressIndex, default_account_id=None,
+                        default_owner_id=None) -> Optional[EmailCommunication]:
+    """Return an unsaved EmailCommunication for a message, or None if no account matches.
+
+    A message from an address that belongs to an account (a contact or a
+    known domain) is inbound; anything else is outbound and is attributed to
+    its first recipient who is a contact, or failing that to the first one
+    from a known domain. The owner is the CRM user on our side of it.
+    """
+    sender_account_id = None if parsed.sender in index.users else index.account(parsed.sender)
+    if sender_account_id is not None:
+        direction, account_id = 'inbound', sender_account_id
+        contact = index.contact(parsed.sender)
+        owner_id = next((index.users[r] for r in parsed.recipients if r in index.users), None)
+    else:
+        direction = 'outbound'
+        contact = next(filter(None, map(index.contact, parsed.recipients)), None)
+        if contact is not None:
+            account_id = contact[1]
+        else:
+            account_id = next(filter(None, map(index.account, parsed.recipients)), None)
+        owner_id = index.users.get(parsed.sender)
+    account_id = account_id or default_account_id
+    if account_id is None:
+        return None
+    subject_field = EmailCommunication._meta.get_field('subject')
+    return EmailCommunication(
+        account_id=account_id,
+        contact_id=contact[0] if contact else None,
+        direction=direction,
+        subject=parsed.subject[:subject_field.max_length],
+        body=parsed.body,
+        sent_date=parsed.sent_date,
+        sender=parsed.sender[:254],
+        recipients=', '.join(parsed.recipients),
+        owner_id=owner_id or default_owner_id,
+        message_key=parsed.key,
+    )
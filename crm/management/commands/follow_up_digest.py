@@ -0,0 +1,91 @@
+from django.contrib.auth.models import User
+from django.core.mail import get_connection, EmailMessage
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from crm.follow_ups import DEFAULT_DAYS, DEFAULT_LIMIT, MAX_DAYS, follow_up_digest
+
+
+class Command(BaseCommand):
+    """Management command to report overdue and upcoming email follow-ups per owner."""
+
+    help = (
+        'Lists each owner\'s overdue and upcoming email follow-ups, optionally emailing '
+        'every owner their own digest'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=DEFAULT_DAYS,
+            help=f'How many days ahead count as upcoming, up to {MAX_DAYS} (default {DEFAULT_DAYS})',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=DEFAULT_LIMIT,
+            help=f'Follow-ups listed per owner; counts always cover all of them (default {DEFAULT_LIMIT})',
+        )
+        parser.add_argument(
+            '--owner',
+            action='append',
+            help='Username to report on; may be repeated (default: every owner)',
+        )
+        parser.add_argument(
+            '--send',
+            action='store_true',
+            help='Email each owner their digest instead of printing it',
+        )
+
+    def resolve_owners(self, usernames):
+        """Return the ids of ``usernames``, or None for every owner."""
+        if not usernames:
+            return None
+        owners = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+        missing = sorted(set(usernames) - set(owners))
+        if missing:
+            raise CommandError(f"Unknown users: {', '.join(missing)}")
+        return list(owners.values())
+
+    def format_digest(self, entry, today) -> str:
+        """Return one owner's digest as plain text."""
+        lines = [f'{entry.overdue} overdue, {entry.upcoming} upcoming']
+        for item in entry.items:
+            state = 'OVERDUE' if item.follow_up_date < today else 'due'
+            lines.append(
+                f'  [{state} {item.follow_up_date:%Y-%m-%d}] {item.account.name}: {item.subject}'
+            )
+        hidden = entry.overdue + entry.upcoming - len(entry.items)
+        if hidden:
+            lines.append(f'  ... and {hidden} more')
+        return '\n'.join(lines)
+
+    def handle(self, *args, **options):
+        """Main command handler."""
+        if not 0 <= options['days'] <= MAX_DAYS or options['limit'] < 1:
+            raise CommandError(f'--days must be 0-{MAX_DAYS} and --limit at least 1')
+        today = timezone.localdate()
+        digest = follow_up_digest(
+            today=today, days=options['days'], limit=options['limit'],
+            owner_ids=self.resolve_owners(options['owner']),
+        )
+
+        if not options['send']:
+            for entry in digest:
+                name = entry.owner.username if entry.owner else '(no owner)'
+                self.stdout.write(f'{name}: {self.format_digest(entry, today)}')
+            self.stdout.write(self.style.SUCCESS(f'{len(digest)} owners with follow-ups due'))
+            return
+
+        messages = [
+            EmailMessage(
+                f'Follow-ups: {entry.overdue} overdue, {entry.upcoming} upcoming',
+                self.format_digest(entry, today),
+                to=[entry.owner.email],
+            )
+            for entry in digest if entry.owner is not None and entry.owner.email
+        ]
+        sent = get_connection().send_messages(messages) if messages else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {sent} digests; {len(digest) - len(messages)} owners without an email address skipped'
+        ))
@@ -0,0 +1,120 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from crm.mail_import import AddressIndex, build_communication, iter_messages, parse_message
+from crm.models import Account, EmailCommunication
+from crm.recipients import index_participants
+
+
+class Command(BaseCommand):
+    """Management command to import mbox and .eml archives as email communications."""
+
+    help = (
+        'Streams messages from mbox files, .eml files or directories of them into EmailCommunication, '
+        'matching addresses to contacts and accounts and skipping messages already imported'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='mbox files, .eml files or directories')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Messages per insert (default 2000)',
+        )
+        parser.add_argument(
+            '--default-account',
+            type=int,
+            help='Account for messages no address matches (default: skip them)',
+        )
+        parser.add_argument(
+            '--owner',
+            help='Username to own messages that no CRM user sent or received',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Parse and match without writing anything (repeats in different batches are not caught)',
+        )
+
+    def resolve_options(self, options) -> tuple:
+        """Check --default-account and --owner; return their ids."""
+        account_id = options['default_account']
+        if account_id is not None and not Account.objects.filter(pk=account_id).exists():
+            raise CommandError(f'Account {account_id} does not exist')
+        owner_id = None
+        if options['owner']:
+            owner_id = User.objects.filter(username=options['owner']).values_list('pk', flat=True).first()
+            if owner_id is None:
+                raise CommandError(f"User '{options['owner']}' does not exist")
+        return account_id, owner_id
+
+    def write_batch(self, batch: dict, dry_run: bool) -> int:
+        """Insert the batch's messages not imported before; return how many were new."""
+        existing = set(EmailCommunication.objects.filter(
+            message_key__in=list(batch)
+        ).values_list('message_key', flat=True))
+        new = [communication for key, communication in batch.items() if key not in existing]
+        if new and not dry_run:
+            with transaction.atomic():
+                # ignore_conflicts covers a concurrent import of the same
+                # messages, but leaves the pks unset, so read them back to
+                # index the participants.
+                EmailCommunication.objects.bulk_create(new, ignore_conflicts=True)
+                index_participants(EmailCommunication.objects.filter(
+                    message_key__in=[communication.message_key for communication in new]
+                ).values_list('pk', 'sender', 'recipients'))
+        return len(new)
+
+    def handle(self, *args, **options):
+        """Main command handler."""
+        batch_size = max(1, options['batch_size'])
+        default_account_id, default_owner_id = self.resolve_options(options)
+        index = AddressIndex.build()
+        counts = {'read': 0, 'imported': 0, 'duplicate': 0, 'unmatched': 0, 'invalid': 0}
+        started = time.monotonic()
+        batch = {}
+
+        def flush():
+            imported = self.write_batch(batch, options['dry_run'])
+            counts['imported'] += imported
+            counts['duplicate'] += len(batch) - imported
+            batch.clear()
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{counts['read']} messages read, {counts['imported']} imported "
+                f"({counts['read'] / elapsed if elapsed else 0:.0f} msg/s)"
+            )
+
+        try:
+            for _, message in iter_messages(options['paths']):
+                counts['read'] += 1
+                parsed = parse_message(message)
+                if parsed is None:
+                    counts['invalid'] += 1
+                    continue
+                if parsed.key in batch:
+                    counts['duplicate'] += 1
+                    continue
+                communication = build_communication(parsed, index, default_account_id, default_owner_id)
+                if communication is None:
+                    counts['unmatched'] += 1
+                    continue
+                batch[parsed.key] = communication
+                if len(batch) >= batch_size:
+                    flush()
+        except OSError as exc:
+            raise CommandError(str(exc))
+        if batch:
+            flush()
+
+        elapsed = time.monotonic() - started
+        rate = counts['read'] / elapsed if elapsed else 0
+        prefix = 'Dry run: would have imported' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {counts['imported']} of {counts['read']} messages in {elapsed:.1f}s ({rate:.0f} msg/s); "
+            f"{counts['duplicate']} duplicates, {counts['unmatched']} without an account, "
+            f"{counts['invalid']} without a sender or date"
+        ))
@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand
+from crm.models import WorkflowAction
+from crm.outbox import DEFAULT_WORKERS, claim_batch, process_batch, requeue_failed
+
+
+class Command(BaseCommand):
+    """Management command to run queued workflow actions."""
+
+    help = 'Runs workflow actions from the outbox on a thread pool, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Entries to claim per batch (default: CRM_OUTBOX_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help=f'Worker threads (default: CRM_OUTBOX_WORKERS or {DEFAULT_WORKERS})',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to sleep when the outbox is empty',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the entries that are due now, then exit',
+        )
+        parser.add_argument(
+            '--requeue-failed',
+            nargs='?',
+            const='all',
+            choices=['all'] + [value for value, _ in WorkflowAction.ACTION_TYPES],
+            help='Put failed (dead-lettered) entries, optionally of one action type, back in the queue first',
+        )
+
+    def drain(self, batch_size: int, workers: int) -> dict:
+        """Process batches until none are due; return the status counts."""
+        totals = {'done': 0, 'retry': 0, 'failed': 0}
+        while True:
+            entries = claim_batch(batch_size)
+            if not entries:
+                return totals
+            for status, count in process_batch(entries, workers).items():
+                totals[status] += count
+
+    def handle(self, *args, **options):
+        """Main command handler."""
+        batch_size, workers = options['batch_size'], options['workers']
+        if options['requeue_failed']:
+            action_type = None if options['requeue_failed'] == 'all' else options['requeue_failed']
+            self.stdout.write(f'Requeued {requeue_failed(action_type)} failed entries')
+        if options['once']:
+            totals = self.drain(batch_size, workers)
+            self.stdout.write(self.style.SUCCESS(
+                f"Processed outbox: {totals['done']} done, {totals['retry']} to retry, {totals['failed']} failed"
+            ))
+            return
+
+        self.stdout.write('Processing workflow outbox (Ctrl+C to stop)')
+        try:
+            while True:
+                totals = self.drain(batch_size, workers)
+                if any(totals.values()):
+                    self.stdout.write(
+                        f"{totals['done']} done, {totals['retry']} to retry, {totals['failed']} failed"
+                    )
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('Stopped'))
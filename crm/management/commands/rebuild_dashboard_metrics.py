@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from crm.metrics import METRIC_FIELDS, compute_dashboard_metrics, rebuild_dashboard_metrics
+from crm.models import DashboardMetrics
+
+
+class Command(BaseCommand):
+    """Management command to rebuild the dashboard metrics snapshot."""
+
+    help = 'Rebuilds the dashboard metrics snapshot from live queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Compare the stored snapshot with live queries without rewriting it',
+        )
+
+    def check_snapshot(self) -> int:
+        """Report metrics whose snapshot value differs from the live value."""
+        period = timezone.localdate()
+        snapshot = DashboardMetrics.objects.filter(period=period).values(*METRIC_FIELDS).first()
+        if snapshot is None:
+            self.stdout.write(self.style.WARNING(f'No snapshot for {period}'))
+            return 1
+
+        live = compute_dashboard_metrics(period)
+        drift = [name for name in METRIC_FIELDS if snapshot[name] != live[name]]
+        for name in drift:
+            self.stdout.write(self.style.WARNING(f'{name}: snapshot={snapshot[name]} live={live[name]}'))
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Snapshot matches live metrics'))
+        return len(drift)
+
+    def handle(self, *args, **options):
+        """Main command handler."""
+        if options['check']:
+            # Non-zero exit on drift or a missing snapshot, for cron and monitoring.
+            if self.check_snapshot():
+                raise CommandError('Dashboard metrics snapshot is missing or out of date')
+            return
+
+        metrics = rebuild_dashboard_metrics()
+        for name in METRIC_FIELDS:
+            self.stdout.write(f'{name}: {metrics[name]}')
+        self.stdout.write(self.style.SUCCESS('Successfully rebuilt dashboard metrics'))
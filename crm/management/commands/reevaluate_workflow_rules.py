@@ -0,0 +1,142 @@
+import json
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional, Tuple
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from crm.models import get_record_model
+from crm.outbox import PermanentActionError
+from crm.registry import schema_registry
+from crm.workflows import WorkflowConditionError, build_reevaluation_plan, reevaluate_chunk
+
+
+class Command(BaseCommand):
+    """Management command to apply workflow rules to existing records."""
+
+    help = (
+        'Re-evaluates workflow rules across every record of their model and applies their '
+        'field updates; other action types are not replayed for existing records'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('rule_ids', nargs='+', type=int, help='Workflow rules to re-evaluate')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Records per chunk (default 2000)',
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes; 1 runs everything in this process',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording progress; an existing checkpoint for the same rules is resumed',
+        )
+
+    def load_rules(self, rule_ids) -> str:
+        """Check the rules exist, share a model and compile; return the model name."""
+        snapshot = schema_registry.snapshot()
+        missing = [pk for pk in rule_ids if pk not in snapshot.workflow_rules]
+        if missing:
+            raise CommandError(f'Unknown workflow rules: {missing}')
+        rules = [snapshot.workflow_rules[pk] for pk in rule_ids]
+        model_names = {rule.model_name for rule in rules}
+        if len(model_names) != 1:
+            raise CommandError('All rules must belong to the same model')
+        for rule in rules:
+            if not rule.active:
+                self.stdout.write(self.style.WARNING(f'Rule {rule.pk} ({rule.name}) is inactive'))
+        model_name = model_names.pop()
+        try:
+            build_reevaluation_plan(get_record_model(model_name), rules)
+        except (WorkflowConditionError, PermanentActionError) as exc:
+            raise CommandError(str(exc))
+        return model_name
+
+    def chunk_bounds(self, model, chunk_size: int, after: Optional[int]) -> Iterator[Tuple[int, int]]:
+        """Yield (first_pk, last_pk) for consecutive keyset chunks after ``after``."""
+        pks = model._default_manager.order_by('pk').values_list('pk', flat=True)
+        while True:
+            page = pks.filter(pk__gt=after) if after is not None else pks
+            chunk = list(page[:chunk_size])
+            if not chunk:
+                return
+            yield chunk[0], chunk[-1]
+            after = chunk[-1]
+
+    def read_checkpoint(self, path: Optional[str], rule_ids) -> dict:
+        """Return saved progress, or a fresh state if there is none."""
+        state = {'rule_ids': sorted(rule_ids), 'last_pk': None, 'scanned': 0, 'matched': 0, 'updated': 0}
+        if not path or not os.path.exists(path):
+            return state
+        with open(path) as fh:
+            saved = json.load(fh)
+        if saved.get('rule_ids') != state['rule_ids']:
+            raise CommandError(f'Checkpoint {path} is for rules {saved.get("rule_ids")}')
+        self.stdout.write(f"Resuming after pk {saved['last_pk']}")
+        return saved
+
+    def write_checkpoint(self, path: Optional[str], state: dict) -> None:
+        """Atomically replace the checkpoint file with ``state``."""
+        if not path:
+            return
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump(state, fh)
+        os.replace(tmp_path, path)
+
+    def handle(self, *args, **options):
+        """Main command handler."""
+        rule_ids = sorted(set(options['rule_ids']))
+        model_name = self.load_rules(rule_ids)
+        model = get_record_model(model_name)
+        path = options['checkpoint']
+        state = self.read_checkpoint(path, rule_ids)
+        bounds = self.chunk_bounds(model, options['chunk_size'], state['last_pk'])
+
+        def record(last_pk, result):
+            scanned, matched, updated = result
+            state.update(
+                last_pk=last_pk,
+                scanned=state['scanned'] + scanned,
+                matched=state['matched'] + matched,
+                updated=state['updated'] + updated,
+            )
+            self.write_checkpoint(path, state)
+
+        processes = max(1, options['processes'])
+        if processes == 1:
+            for first_pk, last_pk in bounds:
+                record(last_pk, reevaluate_chunk(model_name, rule_ids, first_pk, last_pk))
+        else:
+            # Workers are spawned rather than forked so none inherits this
+            # process's database connection; each sets Django up on start.
+            connections.close_all()
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(processes, mp_context=context, initializer=django.setup) as pool:
+                # Chunks finish out of order; the checkpoint only advances
+                # past chunks whose predecessors are all done.
+                in_flight = deque()
+                for first_pk, last_pk in bounds:
+                    in_flight.append((last_pk, pool.submit(reevaluate_chunk, model_name, rule_ids, first_pk, last_pk)))
+                    if len(in_flight) >= processes * 2:
+                        last, future = in_flight.popleft()
+                        record(last, future.result())
+                while in_flight:
+                    last, future = in_flight.popleft()
+                    record(last, future.result())
+
+        if path and os.path.exists(path):
+            os.remove(path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-evaluated {state['scanned']} {model_name} records: "
+            f"{state['matched']} matched, {state['updated']} updated"
+        ))
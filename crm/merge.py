@@ -0,0 +1,146 @@
+"""Mail merge of ``EmailTemplate`` subjects and bodies against CRM records.
+
+Templates reference record fields as ``{{ first_name }}`` or, across
+forward relations, ``{{ account.name }}`` and ``{{ owner.email }}``. When
+``available_merge_fields`` is non-empty, only the fields it lists may be
+used. Paths are checked with the report engine's ``resolve_field``, so the
+same fields are reachable (including only the public User fields).
+
+``compile_template`` turns a template into a ``MergePlan`` once and caches
+it on the template text, so an edited template simply compiles anew. The
+plan holds the distinct field paths the template uses and a ``str.format``
+pattern for the subject and for the body. ``MergePlan.render`` reads exactly
+those columns, joining the related tables, in one ``values_list`` query
+streamed in chunks, and formats each row with no further queries and no
+model instances. Memory stays bounded by the chunk size however many records
+are merged. Values are escaped in HTML bodies; missing values render empty.
+"""
+import html
+import re
+from functools import lru_cache
+from typing import Iterator, NamedTuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.constants import LOOKUP_SEP
+
+from .models import get_record_model
+from .reports import ReportDefinitionError, resolve_field
+
+PLACEHOLDER = re.compile(r'{{\s*([A-Za-z_][\w.]*)\s*}}')
+ROW_CHUNK_SIZE = 2000
+
+
+class MergeTemplateError(ValueError):
+    """Raised when an email template cannot be compiled for merging."""
+
+
+class MergedMessage(NamedTuple):
+    record_id: int
+    subject: str
+    body: str
+
+
+def _to_lookup(path):
+    return path.replace('.', LOOKUP_SEP)
+
+
+class MergePlan:
+    """A template compiled against its model: the columns to read and how to format them."""
+
+    def __init__(self, model, lookups, subject_format, body_format, is_html):
+        self.model = model
+        self.lookups = lookups
+        self.subject_format = subject_format
+        self.body_format = body_format
+        self.is_html = is_html
+
+    def render_row(self, row) -> MergedMessage:
+        """Merge one ``(pk, *values)`` row, in the order of ``lookups``."""
+        values = ['' if value is None else str(value) for value in row[1:]]
+        subject = self.subject_format.format(*values)
+        if self.is_html:
+            values = [html.escape(value) for value in values]
+        return MergedMessage(row[0], subject, self.body_format.format(*values))
+
+    def render(self, queryset=None) -> Iterator[MergedMessage]:
+        """Yield the merged message for every record of ``queryset`` (default: all), by id."""
+        if queryset is None:
+            queryset = self.model._default_manager.all()
+        rows = queryset.order_by('pk').values_list('pk', *self.lookups).iterator(chunk_size=ROW_CHUNK_SIZE)
+        for row in rows:
+            yield self.render_row(row)
+
+    def stream_json(self, queryset=None, template_id=None):
+        """Yield the merged messages as a JSON document, a chunk at a time."""
+        encoder = DjangoJSONEncoder()
+        yield '{"template": %s, "messages": [' % encoder.encode(template_id)
+        chunk = []
+        separator = ''
+        for message in self.render(queryset):
+            chunk.append(encoder.encode(message._asdict()))
+            if len(chunk) >= ROW_CHUNK_SIZE:
+                yield separator + ','.join(chunk)
+                separator = ','
+                chunk = []
+        if chunk:
+            yield separator + ','.join(chunk)
+        yield ']}'
+
+
+def _compile_text(text, columns) -> str:
+    """Return ``text`` as a str.format pattern whose fields index ``columns``.
+
+    ``columns`` maps each lookup to its position and is extended in place.
+    """
+    pattern = []
+    position = 0
+    for match in PLACEHOLDER.finditer(text):
+        pattern.append(text[position:match.start()].replace('{', '{{').replace('}', '}}'))
+        lookup = _to_lookup(match.group(1))
+        index = columns.setdefault(lookup, len(columns))
+        pattern.append('{%d}' % index)
+        position = match.end()
+    pattern.append(text[position:].replace('{', '{{').replace('}', '}}'))
+    return ''.join(pattern)
+
+
+@lru_cache(maxsize=256)
+def _compile(model_name, subject, body, is_html, allowed) -> MergePlan:
+    try:
+        model = get_record_model(model_name)
+    except LookupError as exc:
+        raise MergeTemplateError(str(exc))
+
+    columns = {}
+    subject_format = _compile_text(subject, columns)
+    body_format = _compile_text(body, columns)
+    for lookup in columns:
+        path = lookup.replace(LOOKUP_SEP, '.')
+        if allowed and path not in allowed:
+            raise MergeTemplateError(f"'{path}' is not one of the template's merge fields")
+        try:
+            field = resolve_field(model, lookup)
+        except ReportDefinitionError as exc:
+            raise MergeTemplateError(str(exc).replace(lookup, path))
+        if field.is_relation:
+            raise MergeTemplateError(f"'{path}' is a relation; merge one of its fields instead")
+    return MergePlan(model, tuple(columns), subject_format, body_format, is_html)
+
+
+def compile_template(template) -> MergePlan:
+    """Compile an ``EmailTemplate``; raise MergeTemplateError if it cannot be merged."""
+    try:
+        allowed = template.get_merge_fields()
+    except ValueError as exc:
+        raise MergeTemplateError(f'Invalid merge fields: {exc}')
+    if not isinstance(allowed, (list, tuple)) or not all(isinstance(path, str) for path in allowed):
+        raise MergeTemplateError('available_merge_fields must be a list of field paths')
+    return _compile(
+        template.model_name, template.subject, template.body, template.is_html,
+        frozenset(path.replace(LOOKUP_SEP, '.') for path in allowed),
+    )
+
+
+def merge_template(template, queryset=None) -> Iterator[MergedMessage]:
+    """Yield ``(record_id, subject, body)`` for ``template`` merged with each record."""
+    return compile_template(template).render(queryset)
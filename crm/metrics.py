@@ -0,0 +1,192 @@
+"""Incrementally maintained metrics behind the home dashboard.
+
+The dashboard reads a single ``DashboardMetrics`` row instead of running a
+COUNT/SUM per tile. The row is rebuilt from live queries when its ``period``
+no longer matches today (or by ``manage.py rebuild_dashboard_metrics``) and
+is kept current in between by applying per-record deltas from the
+post_save/post_delete handlers in crm/signals.py.
+
+Writes that bypass model signals (``QuerySet.update``, ``bulk_create``) are
+not reflected until the next rebuild, unless they apply their deltas
+themselves as the bulk record endpoints do (crm/bulk.py).
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import Account, DashboardMetrics, Lead, Opportunity, Task
+
+SNAPSHOT_PK = 1
+
+CLOSED_STAGES = ('closed_won', 'closed_lost')
+OPEN_TASK_STATUSES = ('not_started', 'in_progress')
+
+METRIC_FIELDS = [
+    'total_accounts',
+    'new_accounts_count',
+    'open_opportunities_count',
+    'total_opportunity_value',
+    'active_leads_count',
+    'converted_leads_count',
+    'tasks_due_count',
+    'overdue_tasks_count',
+]
+
+# Fields each tracked model contributes through; a save touching none of
+# them cannot move any metric.
+TRACKED_FIELDS = {
+    Account: ('created_date',),
+    Opportunity: ('stage', 'amount'),
+    Lead: ('status', 'modified_date'),
+    Task: ('status', 'due_date'),
+}
+
+
+def _boundaries(period):
+    """Return (day_start, day_end, month_start) for a period date."""
+    day_start = timezone.make_aware(datetime.combine(period, time.min))
+    return day_start, day_start + timedelta(days=1), day_start.replace(day=1)
+
+
+def compute_dashboard_metrics(period=None):
+    """Compute every dashboard metric with live aggregate queries."""
+    period = period or timezone.localdate()
+    day_start, day_end, month_start = _boundaries(period)
+
+    accounts = Account.objects.aggregate(
+        total_accounts=Count('id'),
+        new_accounts_count=Count('id', filter=Q(created_date__gte=month_start)),
+    )
+    opportunities = Opportunity.objects.exclude(stage__in=CLOSED_STAGES).aggregate(
+        open_opportunities_count=Count('id'),
+        total_opportunity_value=Sum('amount'),
+    )
+    leads = Lead.objects.aggregate(
+        active_leads_count=Count('id', filter=~Q(status='converted')),
+        converted_leads_count=Count('id', filter=Q(status='converted', modified_date__gte=month_start)),
+    )
+    tasks = Task.objects.aggregate(
+        tasks_due_count=Count('id', filter=Q(due_date__gte=day_start, due_date__lt=day_end)),
+        overdue_tasks_count=Count('id', filter=Q(due_date__lt=day_start, status__in=OPEN_TASK_STATUSES)),
+    )
+
+    metrics = {**accounts, **opportunities, **leads, **tasks}
+    metrics['total_opportunity_value'] = metrics['total_opportunity_value'] or Decimal('0')
+    return metrics
+
+
+def rebuild_dashboard_metrics(period=None):
+    """Recompute the snapshot from scratch and return its metrics."""
+    period = period or timezone.localdate()
+    with transaction.atomic():
+        metrics = compute_dashboard_metrics(period)
+        DashboardMetrics.objects.update_or_create(
+            pk=SNAPSHOT_PK,
+            defaults={'period': period, 'refreshed_date': timezone.now(), **metrics},
+        )
+    return metrics
+
+
+def get_dashboard_metrics():
+    """Return the current snapshot, rebuilding it if it is missing or stale."""
+    period = timezone.localdate()
+    snapshot = DashboardMetrics.objects.filter(pk=SNAPSHOT_PK, period=period).values(*METRIC_FIELDS).first()
+    if snapshot is None:
+        snapshot = rebuild_dashboard_metrics(period)
+    return snapshot
+
+
+def _account_contribution(values, day_start, day_end, month_start):
+    created_date = values['created_date']
+    return {
+        'total_accounts': 1,
+        'new_accounts_count': int(created_date is not None and created_date >= month_start),
+    }
+
+
+def _opportunity_contribution(values, day_start, day_end, month_start):
+    if values['stage'] in CLOSED_STAGES:
+        return {}
+    return {
+        'open_opportunities_count': 1,
+        'total_opportunity_value': values['amount'] or Decimal('0'),
+    }
+
+
+def _lead_contribution(values, day_start, day_end, month_start):
+    if values['status'] != 'converted':
+        return {'active_leads_count': 1}
+    modified_date = values['modified_date']
+    return {'converted_leads_count': int(modified_date is not None and modified_date >= month_start)}
+
+
+def _task_contribution(values, day_start, day_end, month_start):
+    due_date = values['due_date']
+    if due_date is None:
+        return {}
+    return {
+        'tasks_due_count': int(day_start <= due_date < day_end),
+        'overdue_tasks_count': int(due_date < day_start and values['status'] in OPEN_TASK_STATUSES),
+    }
+
+
+CONTRIBUTIONS = {
+    Account: _account_contribution,
+    Opportunity: _opportunity_contribution,
+    Lead: _lead_contribution,
+    Task: _task_contribution,
+}
+
+
+def tracks_update(model, update_fields):
+    """Whether a save limited to ``update_fields`` can change any metric."""
+    return update_fields is None or bool(set(update_fields) & set(TRACKED_FIELDS[model]))
+
+
+def stored_values(model, pk):
+    """Load the tracked fields of a row as currently stored in the database."""
+    return model._default_manager.filter(pk=pk).values(*TRACKED_FIELDS[model]).first()
+
+
+def instance_values(instance):
+    """Read the tracked fields from an instance, normalised like the database would."""
+    values = {}
+    for name in TRACKED_FIELDS[type(instance)]:
+        value = instance._meta.get_field(name).to_python(getattr(instance, name))
+        if isinstance(value, datetime) and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        values[name] = value
+    return values
+
+
+def apply_delta(model, old_values=None, new_values=None):
+    """Move the snapshot from a record's old contribution to its new one.
+
+    Only the snapshot for today is touched; a stale or missing snapshot is
+    left alone because it will be rebuilt on the next read.
+    """
+    apply_deltas(model, [(old_values, new_values)])
+
+
+def apply_deltas(model, changes):
+    """Apply many ``(old_values, new_values)`` pairs with a single UPDATE."""
+    period = timezone.localdate()
+    boundaries = _boundaries(period)
+    contribute = CONTRIBUTIONS[model]
+
+    delta = defaultdict(int)
+    for old_values, new_values in changes:
+        if new_values is not None:
+            for name, value in contribute(new_values, *boundaries).items():
+                delta[name] += value
+        if old_values is not None:
+            for name, value in contribute(old_values, *boundaries).items():
+                delta[name] -= value
+
+    changes = {name: F(name) + value for name, value in delta.items() if value}
+    if changes:
+        DashboardMetrics.objects.filter(pk=SNAPSHOT_PK, period=period).update(**changes)
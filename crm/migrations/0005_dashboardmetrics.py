@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_emailcommunication'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('total_accounts', models.IntegerField(default=0)),
+                ('new_accounts_count', models.IntegerField(default=0)),
+                ('open_opportunities_count', models.IntegerField(default=0)),
+                ('total_opportunity_value', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('active_leads_count', models.IntegerField(default=0)),
+                ('converted_leads_count', models.IntegerField(default=0)),
+                ('tasks_due_count', models.IntegerField(default=0)),
+                ('overdue_tasks_count', models.IntegerField(default=0)),
+                ('refreshed_date', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'dashboard metrics',
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('crm', '0005_dashboardmetrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customfieldvalue',
+            name='content_type',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype'),
+        ),
+        migrations.AddField(
+            model_name='customfieldvalue',
+            name='value_boolean',
+            field=models.BooleanField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='customfieldvalue',
+            name='value_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='customfieldvalue',
+            name='value_datetime',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='customfieldvalue',
+            name='value_number',
+            field=models.DecimalField(decimal_places=8, editable=False, max_digits=28, null=True),
+        ),
+        migrations.AddField(
+            model_name='customfieldvalue',
+            name='value_text',
+            field=models.CharField(editable=False, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='customfieldvalue',
+            name='record_id',
+            field=models.BigIntegerField(),
+        ),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:43
+
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+BATCH_SIZE = 2000
+
+# A frozen copy of crm.custom_fields as of this migration, so later changes
+# to the app code cannot change what the backfill writes.
+TYPED_COLUMNS = ('value_number', 'value_date', 'value_datetime', 'value_boolean', 'value_text')
+COLUMN_FOR_TYPE = {
+    'number': 'value_number',
+    'date': 'value_date',
+    'datetime': 'value_datetime',
+    'boolean': 'value_boolean',
+}
+TRUE_VALUES = {'true', '1', 'yes', 'y', 'on'}
+FALSE_VALUES = {'false', '0', 'no', 'n', 'off'}
+
+
+def _parse_number(raw):
+    number = Decimal(raw)
+    if not number.is_finite() or (number and number.adjusted() >= 20):
+        return None
+    return number.quantize(Decimal('1e-8'))
+
+
+def _parse_datetime(raw):
+    parsed = parse_datetime(raw)
+    if parsed is None:
+        parsed_date = parse_date(raw)
+        if parsed_date is None:
+            return None
+        parsed = datetime.combine(parsed_date, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _parse_boolean(raw):
+    lowered = raw.lower()
+    if lowered in TRUE_VALUES:
+        return True
+    if lowered in FALSE_VALUES:
+        return False
+    return None
+
+
+PARSERS = {
+    'value_number': _parse_number,
+    'value_date': parse_date,
+    'value_datetime': _parse_datetime,
+    'value_boolean': _parse_boolean,
+    'value_text': lambda raw: raw[:255],
+}
+
+
+def typed_columns(field_type, raw):
+    """Return every typed column for a raw value; unparseable values map to None."""
+    columns = dict.fromkeys(TYPED_COLUMNS)
+    column = COLUMN_FOR_TYPE.get(field_type, 'value_text')
+    raw = (raw or '').strip()
+    if raw:
+        try:
+            columns[column] = PARSERS[column](raw)
+        except (InvalidOperation, ValueError):
+            pass
+    return columns
+
+
+def backfill_typed_values(apps, schema_editor):
+    CustomField = apps.get_model('crm', 'CustomField')
+    CustomFieldValue = apps.get_model('crm', 'CustomFieldValue')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    content_types = {}
+    for model_name, _ in CustomField._meta.get_field('model_name').choices:
+        content_type, _ = ContentType.objects.get_or_create(app_label='crm', model=model_name.lower())
+        content_types[model_name] = content_type.pk
+    fields = {
+        pk: (field_type, content_types.get(model_name))
+        for pk, field_type, model_name in CustomField.objects.values_list('pk', 'field_type', 'model_name')
+    }
+
+    # Keyset batches keep memory flat and, with atomic = False, commit as
+    # they go so a large table is not rewritten in one transaction.
+    last_pk = 0
+    while True:
+        batch = list(
+            CustomFieldValue.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .only('pk', 'custom_field_id', 'value')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for row in batch:
+            field_type, content_type_id = fields[row.custom_field_id]
+            row.content_type_id = content_type_id
+            for column, typed in typed_columns(field_type, row.value).items():
+                setattr(row, column, typed)
+        CustomFieldValue.objects.bulk_update(batch, ['content_type', *TYPED_COLUMNS])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('crm', '0006_customfieldvalue_typed_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_typed_values, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0007_backfill_customfieldvalue_typed_columns'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customfieldvalue',
+            index=models.Index(fields=['content_type', 'record_id'], name='crm_cfv_record_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customfieldvalue',
+            index=models.Index(fields=['custom_field', 'value_number'], name='crm_cfv_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customfieldvalue',
+            index=models.Index(fields=['custom_field', 'value_date'], name='crm_cfv_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customfieldvalue',
+            index=models.Index(fields=['custom_field', 'value_datetime'], name='crm_cfv_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customfieldvalue',
+            index=models.Index(fields=['custom_field', 'value_boolean'], name='crm_cfv_boolean_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customfieldvalue',
+            index=models.Index(fields=['custom_field', 'value_text'], name='crm_cfv_text_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('crm', '0008_customfieldvalue_typed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkflowOutboxEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigger_id', models.UUIDField()),
+                ('action_type', models.CharField(choices=[('field_update', 'Field Update'), ('email_alert', 'Email Alert'), ('task_creation', 'Task Creation'), ('outbound_message', 'Outbound Message')], max_length=20)),
+                ('action_config', models.TextField(blank=True)),
+                ('order', models.IntegerField(default=0)),
+                ('record_id', models.BigIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('available_date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_date', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_date', models.DateTimeField(blank=True, null=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+                ('workflow_action', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='outbox_entries', to='crm.workflowaction')),
+                ('workflow_rule', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='outbox_entries', to='crm.workflowrule')),
+            ],
+            options={
+                'verbose_name_plural': 'workflow outbox entries',
+                'indexes': [models.Index(fields=['status', 'available_date'], name='crm_outbox_status_idx'), models.Index(fields=['trigger_id', 'order'], name='crm_outbox_trigger_idx')],
+            },
+        ),
+    ]
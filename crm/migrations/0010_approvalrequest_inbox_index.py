@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0009_workflowoutboxentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='approvalrequest',
+            index=models.Index(fields=['status', 'current_step'], name='crm_approval_inbox_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('crm', '0010_approvalrequest_inbox_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApprovalResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('decision', models.CharField(choices=[('approved', 'Approved'), ('rejected', 'Rejected')], max_length=20)),
+                ('comments', models.TextField(blank=True)),
+                ('created_date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('approval_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='crm.approvalrequest')),
+                ('approver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='approval_responses', to=settings.AUTH_USER_MODEL)),
+                ('step', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='crm.approvalstep')),
+            ],
+            options={
+                'unique_together': {('approval_request', 'step', 'approver')},
+            },
+        ),
+    ]
@@ -0,0 +1,90 @@
+"""Full-text search index over email communications.
+
+PostgreSQL gets a stored generated ``search_vector`` tsvector column with a
+GIN index. SQLite gets an external-content FTS5 table kept in sync by
+triggers. Either way the database maintains the index as rows are written;
+see crm/search.py for the queries. Other backends get nothing and search
+falls back to ``icontains``.
+
+On SQLite, a later migration that rebuilds crm_emailcommunication (most
+AlterField operations do) drops the triggers with the old table and must
+recreate them with ``SQLITE_TRIGGERS``.
+"""
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE crm_emailcommunication ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(subject, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(body, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(sender, '') || ' ' || coalesce(recipients, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX crm_email_search_idx ON crm_emailcommunication USING GIN (search_vector)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS crm_email_search_idx",
+    "ALTER TABLE crm_emailcommunication DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER crm_emailcommunication_fts_insert AFTER INSERT ON crm_emailcommunication BEGIN
+        INSERT INTO crm_emailcommunication_fts (rowid, subject, body, sender, recipients)
+        VALUES (new.id, new.subject, new.body, new.sender, new.recipients);
+    END
+    """,
+    """
+    CREATE TRIGGER crm_emailcommunication_fts_delete AFTER DELETE ON crm_emailcommunication BEGIN
+        INSERT INTO crm_emailcommunication_fts (crm_emailcommunication_fts, rowid, subject, body, sender, recipients)
+        VALUES ('delete', old.id, old.subject, old.body, old.sender, old.recipients);
+    END
+    """,
+    """
+    CREATE TRIGGER crm_emailcommunication_fts_update
+    AFTER UPDATE OF subject, body, sender, recipients ON crm_emailcommunication BEGIN
+        INSERT INTO crm_emailcommunication_fts (crm_emailcommunication_fts, rowid, subject, body, sender, recipients)
+        VALUES ('delete', old.id, old.subject, old.body, old.sender, old.recipients);
+        INSERT INTO crm_emailcommunication_fts (rowid, subject, body, sender, recipients)
+        VALUES (new.id, new.subject, new.body, new.sender, new.recipients);
+    END
+    """,
+]
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE crm_emailcommunication_fts USING fts5(
+        subject, body, sender, recipients,
+        content='crm_emailcommunication', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    *SQLITE_TRIGGERS,
+    "INSERT INTO crm_emailcommunication_fts (crm_emailcommunication_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS crm_emailcommunication_fts_insert",
+    "DROP TRIGGER IF EXISTS crm_emailcommunication_fts_delete",
+    "DROP TRIGGER IF EXISTS crm_emailcommunication_fts_update",
+    "DROP TABLE IF EXISTS crm_emailcommunication_fts",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0011_approvalresponse'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
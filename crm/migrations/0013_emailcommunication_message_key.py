@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0012_emailcommunication_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailcommunication',
+            name='message_key',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 of the Message-ID (or of the content) for imported mail', max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='emailcommunication',
+            constraint=models.UniqueConstraint(condition=models.Q(('message_key__isnull', False)), fields=('message_key',), name='crm_email_message_key_uniq'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0013_emailcommunication_message_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailRecipient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=254)),
+                ('role', models.CharField(choices=[('sender', 'Sender'), ('recipient', 'Recipient')], max_length=10)),
+                ('communication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='crm.emailcommunication')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['address', 'role', 'communication'], name='crm_email_recipient_idx')],
+                'unique_together': {('communication', 'address', 'role')},
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+from email.utils import getaddresses
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+# A frozen copy of the address parsing in crm.recipients as of this
+# migration; importing it would load crm.models, not the historical models.
+def participant_rows(sender, recipients):
+    rows = [
+        (address, 'recipient')
+        for address in dict.fromkeys(
+            address.strip().lower() for _, address in getaddresses([recipients or '']) if address.strip()
+        )
+    ]
+    sender = getaddresses([sender])[0][1].strip().lower() if sender else ''
+    if sender:
+        rows.insert(0, (sender, 'sender'))
+    return rows
+
+
+def backfill_participants(apps, schema_editor):
+    EmailCommunication = apps.get_model('crm', 'EmailCommunication')
+    EmailRecipient = apps.get_model('crm', 'EmailRecipient')
+
+    # Keyset batches keep memory flat and, with atomic = False, commit as
+    # they go so a large table is not indexed in one transaction.
+    last_pk = 0
+    while True:
+        batch = list(
+            EmailCommunication.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', 'sender', 'recipients')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        EmailRecipient.objects.bulk_create(
+            [
+                EmailRecipient(communication_id=pk, address=address, role=role)
+                for pk, sender, recipients in batch
+                for address, role in participant_rows(sender, recipients)
+            ],
+            ignore_conflicts=True,
+        )
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('crm', '0014_emailrecipient'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_participants, migrations.RunPython.noop),
+    ]
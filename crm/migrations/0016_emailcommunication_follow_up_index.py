@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0015_backfill_emailrecipient'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailcommunication',
+            index=models.Index(condition=models.Q(('follow_up_completed', False), ('requires_follow_up', True)), fields=['owner', 'follow_up_date'], name='crm_email_follow_up_idx'),
+        ),
+    ]
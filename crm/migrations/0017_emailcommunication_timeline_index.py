@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0016_emailcommunication_follow_up_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailcommunication',
+            index=models.Index(fields=['account', '-sent_date', '-id'], name='crm_email_timeline_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0017_emailcommunication_timeline_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['modified_date', 'id'], name='crm_account_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['modified_date', 'id'], name='crm_contact_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['modified_date', 'id'], name='crm_lead_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(fields=['modified_date', 'id'], name='crm_opportunity_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['modified_date', 'id'], name='crm_task_sync_idx'),
+        ),
+    ]
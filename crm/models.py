@@ -1,7 +1,12 @@
+from django.apps import apps
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
-import json
+
+from .custom_fields import COLUMN_FOR_TYPE, TYPED_COLUMNS, typed_columns
+from .registry import load_json
 
 class Account(models.Model):
     name = models.CharField(max_length=200)
@@ -16,6 +21,11 @@ class Account(models.Model):
     created_date = models.DateTimeField(default=timezone.now)
     modified_date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['modified_date', 'id'], name='crm_account_sync_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -32,6 +42,11 @@ class Contact(models.Model):
     created_date = models.DateTimeField(default=timezone.now)
     modified_date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['modified_date', 'id'], name='crm_contact_sync_idx'),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
@@ -57,6 +72,11 @@ class Lead(models.Model):
     created_date = models.DateTimeField(default=timezone.now)
     modified_date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['modified_date', 'id'], name='crm_lead_sync_idx'),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.company}"
 
@@ -82,6 +102,11 @@ class Opportunity(models.Model):
     created_date = models.DateTimeField(default=timezone.now)
     modified_date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['modified_date', 'id'], name='crm_opportunity_sync_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -111,6 +136,11 @@ class Task(models.Model):
     created_date = models.DateTimeField(default=timezone.now)
     modified_date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['modified_date', 'id'], name='crm_task_sync_idx'),
+        ]
+
     def __str__(self):
         return self.subject
 
@@ -150,16 +180,55 @@ class CustomField(models.Model):
 
     def get_picklist_values(self):
         if self.field_type == 'picklist' and self.picklist_values:
-            return json.loads(self.picklist_values)
-        return []
+            return load_json(self.picklist_values)
+        return ()
 
 class CustomFieldValue(models.Model):
     custom_field = models.ForeignKey(CustomField, on_delete=models.CASCADE)
-    record_id = models.IntegerField()
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True, editable=False)
+    record_id = models.BigIntegerField()
+    record = GenericForeignKey('content_type', 'record_id')
     value = models.TextField(blank=True)
-    
+    # Parsed copies of ``value``; only the column for the field's type is set.
+    value_number = models.DecimalField(max_digits=28, decimal_places=8, null=True, editable=False)
+    value_date = models.DateField(null=True, editable=False)
+    value_datetime = models.DateTimeField(null=True, editable=False)
+    value_boolean = models.BooleanField(null=True, editable=False)
+    value_text = models.CharField(max_length=255, null=True, editable=False)
+
     class Meta:
         unique_together = ('custom_field', 'record_id')
+        indexes = [
+            models.Index(fields=['content_type', 'record_id'], name='crm_cfv_record_idx'),
+            models.Index(fields=['custom_field', 'value_number'], name='crm_cfv_number_idx'),
+            models.Index(fields=['custom_field', 'value_date'], name='crm_cfv_date_idx'),
+            models.Index(fields=['custom_field', 'value_datetime'], name='crm_cfv_datetime_idx'),
+            models.Index(fields=['custom_field', 'value_boolean'], name='crm_cfv_boolean_idx'),
+            models.Index(fields=['custom_field', 'value_text'], name='crm_cfv_text_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.custom_field.name} = {self.value}"
+
+    @property
+    def typed_value(self):
+        """The parsed value, or the raw text for text-like field types."""
+        column = COLUMN_FOR_TYPE.get(self.custom_field.field_type, 'value_text')
+        return self.value if column == 'value_text' else getattr(self, column)
+
+    def set_typed_value(self):
+        """Fill ``content_type`` and the typed columns from ``value``."""
+        custom_field = self.custom_field
+        self.content_type = ContentType.objects.get_for_model(get_record_model(custom_field.model_name))
+        for column, typed in typed_columns(custom_field.field_type, self.value).items():
+            setattr(self, column, typed)
+
+    def save(self, *args, **kwargs):
+        self.set_typed_value()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'value' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'content_type', *TYPED_COLUMNS}
+        super().save(*args, **kwargs)
 
 class Report(models.Model):
     REPORT_TYPES = [
@@ -184,13 +253,13 @@ class Report(models.Model):
         return self.name
 
     def get_fields(self):
-        return json.loads(self.fields)
+        return load_json(self.fields)
 
     def get_filters(self):
-        return json.loads(self.filters) if self.filters else {}
+        return load_json(self.filters, empty={})
 
     def get_grouping_fields(self):
-        return json.loads(self.grouping_fields) if self.grouping_fields else []
+        return load_json(self.grouping_fields, empty=[])
 
 class Dashboard(models.Model):
     CHART_TYPES = [
@@ -226,7 +295,7 @@ class DashboardComponent(models.Model):
         return f"{self.title} - {self.dashboard.name}"
 
     def get_chart_config(self):
-        return json.loads(self.chart_config) if self.chart_config else {}
+        return load_json(self.chart_config, empty={})
 
 class EmailTemplate(models.Model):
     name = models.CharField(max_length=200)
@@ -243,7 +312,7 @@ class EmailTemplate(models.Model):
         return self.name
 
     def get_merge_fields(self):
-        return json.loads(self.available_merge_fields) if self.available_merge_fields else []
+        return load_json(self.available_merge_fields, empty=[])
 
 class WorkflowRule(models.Model):
     EVALUATION_CRITERIA = [
@@ -266,7 +335,7 @@ class WorkflowRule(models.Model):
         return self.name
 
     def get_conditions(self):
-        return json.loads(self.conditions) if self.conditions else {}
+        return load_json(self.conditions, empty={})
 
 class WorkflowAction(models.Model):
     ACTION_TYPES = [
@@ -286,7 +355,51 @@ class WorkflowAction(models.Model):
         return f"{self.name} ({self.get_action_type_display()})"
 
     def get_action_config(self):
-        return json.loads(self.action_config) if self.action_config else {}
+        return load_json(self.action_config, empty={})
+
+class WorkflowOutboxEntry(models.Model):
+    """A workflow action waiting to run, written with the save that fired it.
+
+    The action's type and configuration are copied at enqueue time. Entries
+    sharing a ``trigger_id`` came from one rule firing on one record and run
+    in ``order``; the ``process_workflow_outbox`` command executes them.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    workflow_rule = models.ForeignKey(WorkflowRule, on_delete=models.SET_NULL, null=True, related_name='outbox_entries')
+    workflow_action = models.ForeignKey(WorkflowAction, on_delete=models.SET_NULL, null=True, related_name='outbox_entries')
+    trigger_id = models.UUIDField()
+    action_type = models.CharField(max_length=20, choices=WorkflowAction.ACTION_TYPES)
+    action_config = models.TextField(blank=True)
+    order = models.IntegerField(default=0)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    record_id = models.BigIntegerField()
+    record = GenericForeignKey('content_type', 'record_id')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_date = models.DateTimeField(default=timezone.now)
+    locked_date = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_date = models.DateTimeField(default=timezone.now)
+    processed_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'workflow outbox entries'
+        indexes = [
+            models.Index(fields=['status', 'available_date'], name='crm_outbox_status_idx'),
+            models.Index(fields=['trigger_id', 'order'], name='crm_outbox_trigger_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_action_type_display()} for {self.content_type.model} {self.record_id} ({self.status})"
+
+    def get_action_config(self):
+        return load_json(self.action_config, empty={})
 
 class ApprovalProcess(models.Model):
     name = models.CharField(max_length=200)
@@ -302,7 +415,7 @@ class ApprovalProcess(models.Model):
         return self.name
 
     def get_entry_criteria(self):
-        return json.loads(self.entry_criteria) if self.entry_criteria else {}
+        return load_json(self.entry_criteria, empty={})
 
 class ApprovalStep(models.Model):
     APPROVAL_TYPE = [
@@ -326,13 +439,13 @@ class ApprovalStep(models.Model):
         return f"{self.name} - Step {self.step_number}"
 
     def get_reject_behavior(self):
-        return json.loads(self.reject_behavior) if self.reject_behavior else {}
+        return load_json(self.reject_behavior, empty={})
 
     def get_approval_actions(self):
-        return json.loads(self.approval_actions) if self.approval_actions else {}
+        return load_json(self.approval_actions, empty={})
 
     def get_rejection_actions(self):
-        return json.loads(self.rejection_actions) if self.rejection_actions else {}
+        return load_json(self.rejection_actions, empty={})
 
 class ApprovalRequest(models.Model):
     STATUS_CHOICES = [
@@ -351,9 +464,37 @@ class ApprovalRequest(models.Model):
     modified_date = models.DateTimeField(auto_now=True)
     comments = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'current_step'], name='crm_approval_inbox_idx'),
+        ]
+
     def __str__(self):
         return f"Approval Request for {self.approval_process.name} - {self.get_status_display()}"
 
+class ApprovalResponse(models.Model):
+    """One approver's decision on a request at one step.
+
+    Unanimous steps advance once every approver of the step has approved.
+    """
+    DECISION_CHOICES = [
+        ('approved', 'Approved'),
+        ('rejected', 'Rejected'),
+    ]
+
+    approval_request = models.ForeignKey(ApprovalRequest, on_delete=models.CASCADE, related_name='responses')
+    step = models.ForeignKey(ApprovalStep, on_delete=models.CASCADE, related_name='responses')
+    approver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='approval_responses')
+    decision = models.CharField(max_length=20, choices=DECISION_CHOICES)
+    comments = models.TextField(blank=True)
+    created_date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('approval_request', 'step', 'approver')
+
+    def __str__(self):
+        return f"{self.approver} {self.get_decision_display().lower()} {self.step}"
+
 class EmailCommunication(models.Model):
     DIRECTION_CHOICES = [
         ('inbound', 'Inbound'),
@@ -373,11 +514,34 @@ class EmailCommunication(models.Model):
     follow_up_notes = models.TextField(blank=True)
     follow_up_completed = models.BooleanField(default=False)
     owner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    message_key = models.CharField(
+        max_length=64, null=True, blank=True, editable=False,
+        help_text='SHA-256 of the Message-ID (or of the content) for imported mail'
+    )
     created_date = models.DateTimeField(default=timezone.now)
     modified_date = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-sent_date']
+        constraints = [
+            # Partial, so adding it does not rebuild the table on SQLite
+            # (which would drop the full-text search triggers).
+            models.UniqueConstraint(
+                fields=['message_key'], condition=models.Q(message_key__isnull=False),
+                name='crm_email_message_key_uniq'
+            ),
+        ]
+        indexes = [
+            # Only open follow-ups, a small slice of all mail, are indexed;
+            # crm/follow_ups.py filters on exactly this condition.
+            models.Index(
+                fields=['owner', 'follow_up_date'],
+                condition=models.Q(requires_follow_up=True, follow_up_completed=False),
+                name='crm_email_follow_up_idx'
+            ),
+            # The account timeline pages on (-sent_date, -id); see crm/timeline.py.
+            models.Index(fields=['account', '-sent_date', '-id'], name='crm_email_timeline_idx'),
+        ]
 
     def __str__(self):
         return f"{self.subject} ({self.sent_date.strftime('%Y-%m-%d %H:%M')})"
@@ -390,3 +554,69 @@ class EmailCommunication(models.Model):
         if self.requires_follow_up and not self.follow_up_completed:
             return self.follow_up_date and self.follow_up_date < timezone.now().date()
         return False
+
+class EmailRecipient(models.Model):
+    """One normalized address taking part in an email communication.
+
+    Kept in sync with ``EmailCommunication.sender`` and ``recipients`` by
+    crm/recipients.py so "emails sent to x" is an index lookup.
+    """
+    ROLE_CHOICES = [
+        ('sender', 'Sender'),
+        ('recipient', 'Recipient'),
+    ]
+
+    communication = models.ForeignKey(EmailCommunication, on_delete=models.CASCADE, related_name='participants')
+    address = models.CharField(max_length=254)
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+
+    class Meta:
+        unique_together = ('communication', 'address', 'role')
+        indexes = [
+            models.Index(fields=['address', 'role', 'communication'], name='crm_email_recipient_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.address} ({self.role})"
+
+class DashboardMetrics(models.Model):
+    """Single-row snapshot of the home dashboard tiles.
+
+    Rebuilt from live queries once per ``period`` (day) and kept current in
+    between by the signal handlers in crm/signals.py. Month-to-date metrics
+    are relative to the first day of ``period``'s month; overdue tasks are
+    open tasks due before the start of ``period``.
+    """
+    period = models.DateField()
+    total_accounts = models.IntegerField(default=0)
+    new_accounts_count = models.IntegerField(default=0)
+    open_opportunities_count = models.IntegerField(default=0)
+    total_opportunity_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    active_leads_count = models.IntegerField(default=0)
+    converted_leads_count = models.IntegerField(default=0)
+    tasks_due_count = models.IntegerField(default=0)
+    overdue_tasks_count = models.IntegerField(default=0)
+    refreshed_date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'dashboard metrics'
+
+    def __str__(self):
+        return f"Dashboard metrics ({self.period})"
+
+class SchemaVersion(models.Model):
+    """Single-row version stamp of the schema registry's metadata.
+
+    Bumped in the transaction of every metadata write when the cache
+    backend is process-local; see crm/registry.py.
+    """
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Schema version {self.version}"
+
+def get_record_model(model_name):
+    """Return the CRM model class for one of ``CustomField.MODEL_CHOICES``."""
+    if model_name not in dict(CustomField.MODEL_CHOICES):
+        raise LookupError(f"'{model_name}' is not a CRM record model")
+    return apps.get_model('crm', model_name)
@@ -0,0 +1,200 @@
+"""Derive select_related/prefetch_related from a serializer's fields.
+
+``related_lookups`` walks a serializer class and returns the relations its
+output touches:
+
+* a nested serializer over a forward foreign key or one-to-one (``owner =
+  UserSerializer()``) is joined with ``select_related``;
+* a ``many=True`` serializer or primary key list over a reverse foreign key
+  or many-to-many (``steps``, ``approvers``) is prefetched, and so is
+  everything nested below it, since a join cannot cross a prefetch;
+* a dotted ``source`` (``source='account.name'``) follows its relations the
+  same way.
+
+Plain foreign key fields serialize from the ``*_id`` column and need
+nothing. ``QueryOptimizerMixin`` applies the lookups to every queryset a
+viewset serializes, so a page costs a fixed number of queries whatever its
+size. The lookups depend only on the serializer class and are computed once
+per class.
+"""
+from functools import lru_cache
+from typing import NamedTuple, Tuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.constants import LOOKUP_SEP
+from rest_framework import serializers
+
+
+class RelatedLookups(NamedTuple):
+    select: Tuple[str, ...]
+    prefetch: Tuple[str, ...]
+
+
+def _relation(model, name):
+    """Return the relation field ``name`` of ``model``, or None if it is not one."""
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.is_relation else None
+
+
+def _single_valued(field):
+    return field.many_to_one or field.one_to_one
+
+
+def _walk(serializer, model, prefix, in_prefetch, select, prefetch):
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        current, path, prefetched = model, prefix, in_prefetch
+        # Follow every relation on the source path; the last attribute is only
+        # a relation for nested serializers and related fields.
+        attrs = field.source_attrs
+        relation_attrs = attrs if isinstance(field, (serializers.BaseSerializer, serializers.RelatedField,
+                                                     serializers.ManyRelatedField)) else attrs[:-1]
+        for index, name in enumerate(relation_attrs):
+            relation = _relation(current, name) if current is not None else None
+            if relation is None:
+                current = None
+                break
+            is_last = index == len(relation_attrs) - 1
+            if is_last and isinstance(field, serializers.RelatedField) and _single_valued(relation):
+                # PrimaryKeyRelatedField and friends over a foreign key read
+                # the *_id column unless they render the related object.
+                if field.use_pk_only_optimization():
+                    break
+            path = f'{path}{name}'
+            if not _single_valued(relation):
+                prefetched = True
+            (prefetch if prefetched else select).append(path)
+            path += LOOKUP_SEP
+            current = relation.related_model
+        else:
+            child = field.child if isinstance(field, serializers.ListSerializer) else field
+            if isinstance(child, serializers.Serializer) and current is not None:
+                _walk(child, current, path, prefetched, select, prefetch)
+
+
+def _model(serializer):
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    return getattr(getattr(serializer, 'Meta', None), 'model', None), serializer
+
+
+def serializer_lookups(serializer) -> RelatedLookups:
+    """Return the lookups a serializer instance needs, for the fields it has now."""
+    model, serializer = _model(serializer)
+    select, prefetch = [], []
+    if model is not None:
+        _walk(serializer, model, '', False, select, prefetch)
+    # select_related('a__b') implies 'a'; keep only the deepest paths.
+    select = [path for path in select if not any(other.startswith(path + LOOKUP_SEP) for other in select)]
+    return RelatedLookups(tuple(dict.fromkeys(select)), tuple(dict.fromkeys(prefetch)))
+
+
+@lru_cache(maxsize=None)
+def related_lookups(serializer_class) -> RelatedLookups:
+    """Return the select_related and prefetch_related lookups ``serializer_class`` needs."""
+    return serializer_lookups(serializer_class())
+
+
+def selected_columns(serializer):
+    """Return the model fields a serializer instance reads, for ``only()``.
+
+    None when some field is not backed by a column of the model (a property
+    or method), since ``only()`` cannot tell what such a field reads.
+    """
+    model, serializer = _model(serializer)
+    if model is None:
+        return None
+    columns = []
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*':
+            return None
+        try:
+            model_field = model._meta.get_field(field.source_attrs[0])
+        except FieldDoesNotExist:
+            return None
+        if model_field.concrete and not model_field.many_to_many:
+            columns.append(model_field.name)
+        elif not model_field.is_relation:
+            return None
+    return columns
+
+
+def apply_lookups(queryset, lookups):
+    if lookups.select:
+        queryset = queryset.select_related(*lookups.select)
+    if lookups.prefetch:
+        queryset = queryset.prefetch_related(*lookups.prefetch)
+    return queryset
+
+
+def optimize_queryset(queryset, serializer_class):
+    """Apply ``related_lookups(serializer_class)`` to ``queryset``."""
+    return apply_lookups(queryset, related_lookups(serializer_class))
+
+
+def parse_field_list(value):
+    """Split a comma-separated query parameter into a set of names."""
+    return frozenset(name.strip() for name in value.split(',') if name.strip())
+
+
+class QueryOptimizerMixin:
+    """Join and prefetch the relations the viewset's serializer renders.
+
+    Applied in ``filter_queryset`` so it also covers viewsets that override
+    ``get_queryset``; list, retrieve and the object lookup of updates all go
+    through it.
+
+    GET requests may also ask for a sparse response (see
+    ``SparseFieldsMixin`` in crm/serializers.py): ``?fields=`` picks the
+    top-level fields and ``?expand=`` the nested objects to embed. The
+    queryset then joins only the expanded relations and, with ``?fields=``,
+    reads only the selected columns.
+    """
+    fields_param = 'fields'
+    expand_param = 'expand'
+
+    def get_sparse_fields(self):
+        """Return (fields or None, expand) requested for this GET; (None, None) if neither."""
+        if self.request is None or self.request.method != 'GET':
+            return None, None
+        params = self.request.query_params
+        if self.fields_param not in params and self.expand_param not in params:
+            return None, None
+        fields = parse_field_list(params[self.fields_param]) if self.fields_param in params else None
+        return fields, parse_field_list(params.get(self.expand_param, ''))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        fields, expand = self.get_sparse_fields()
+        if expand is not None:
+            context['sparse_fields'] = fields
+            context['expand'] = expand
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields, expand = self.get_sparse_fields()
+        if expand is None:
+            return optimize_queryset(queryset, self.get_serializer_class())
+        serializer = self.get_serializer()
+        queryset = apply_lookups(queryset, serializer_lookups(serializer))
+        columns = selected_columns(serializer) if fields is not None else None
+        if not columns:
+            return queryset
+        return queryset.only(*columns, *self.get_keyset_columns(queryset))
+
+    def get_keyset_columns(self, queryset):
+        """Return the columns cursor pagination reads from each page's last row.
+
+        They must be in the ``only()`` set or reading them costs a query per page.
+        """
+        get_ordering = getattr(self.paginator, 'get_keyset_ordering', None)
+        if get_ordering is None:
+            return ()
+        return tuple(name.lstrip('-') for name in get_ordering(queryset, self.request, self))
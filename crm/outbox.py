@@ -0,0 +1,470 @@
+"""Transactional outbox for workflow actions.
+
+When a workflow rule fires, ``enqueue`` writes one ``WorkflowOutboxEntry``
+per action in the same transaction as the record save, so the request that
+saved the record never runs the actions itself. The
+``process_workflow_outbox`` command claims batches of due entries with row
+locks (``SKIP LOCKED`` where the database supports it), runs them on a
+thread pool and retries failures with exponential backoff.
+
+Entries from one rule firing run in ``WorkflowAction.order``: an entry is
+only claimable once every entry before it in its trigger has finished, so
+later actions never overtake an earlier one that is waiting for a retry.
+A permanently failed entry does not block the ones after it.
+
+Outbound messages are delivered in bulk through the pooled dispatcher in
+crm/dispatch.py. Entries that fail permanently or run out of attempts stay
+``failed``; that is the dead-letter queue, and ``requeue_failed`` (or
+``process_workflow_outbox --requeue-failed``) puts them back in line.
+
+Email subjects and bodies and task subjects and descriptions may reference
+the record as ``{{ record.<path> }}``, e.g. ``{{ record.account.name }}``.
+Paths are checked like report fields (forward relations only, public User
+fields only) and substituted as plain text; no other template syntax is
+evaluated. ``validate_action_config`` applies the same checks when an
+action is saved through the API. Tasks created by an action are not
+evaluated against workflow rules, so a rule on Task cannot retrigger itself.
+"""
+import json
+import logging
+import random
+import re
+import socket
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist, ValidationError
+from django.core.mail import send_mail
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.db.models.constants import LOOKUP_SEP
+from django.utils import timezone
+
+from . import metrics
+from .dispatch import check_host, endpoint_for, outbound_dispatcher, public_addresses
+from .models import Account, Contact, Opportunity, Task, WorkflowOutboxEntry
+from .reports import ReportDefinitionError, resolve_field
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 3600
+DEFAULT_LOCK_TIMEOUT = 300
+
+UNFINISHED = ('pending', 'processing')
+
+PLACEHOLDER = re.compile(r'{{\s*record\.([A-Za-z_][\w.]*)\s*}}')
+TEMPLATE_TAGS = ('{{', '{%', '{#')
+# Set on records an action creates; crm/signals.py skips their evaluation.
+CREATED_BY_WORKFLOW = '_created_by_workflow'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class PermanentActionError(Exception):
+    """Raised by an action that will fail the same way if retried."""
+
+
+# Enqueueing
+
+def enqueue(rule, instance):
+    """Write an outbox entry for each action of ``rule`` (a WorkflowRuleSpec)."""
+    if not rule.actions:
+        return []
+    trigger_id = uuid.uuid4()
+    content_type = ContentType.objects.get_for_model(instance)
+    entries = [
+        WorkflowOutboxEntry(
+            workflow_rule_id=rule.pk,
+            workflow_action_id=action.pk,
+            trigger_id=trigger_id,
+            action_type=action.action_type,
+            action_config=json.dumps(action.config, cls=DjangoJSONEncoder),
+            order=action.order,
+            content_type=content_type,
+            record_id=instance.pk,
+        )
+        for action in rule.actions
+    ]
+    return WorkflowOutboxEntry.objects.bulk_create(entries)
+
+
+# Actions
+
+def _check_record_path(model, path):
+    lookup = path.replace('.', LOOKUP_SEP)
+    try:
+        field = resolve_field(model, lookup)
+    except ReportDefinitionError as exc:
+        raise PermanentActionError(str(exc).replace(lookup, path))
+    if field.is_relation or field.name != lookup.rsplit(LOOKUP_SEP, 1)[-1]:
+        raise PermanentActionError(f"'record.{path}' is not a field; use one of its fields")
+
+
+def _check_template(model, text):
+    """Check every placeholder of ``text`` against ``model``; refuse any other template syntax."""
+    if not isinstance(text, str):
+        raise PermanentActionError('Templates must be text')
+    if any(tag in PLACEHOLDER.sub('', text) for tag in TEMPLATE_TAGS):
+        raise PermanentActionError('Only {{ record.<field> }} placeholders are supported')
+    for path in PLACEHOLDER.findall(text):
+        _check_record_path(model, path)
+
+
+def _render(text, record):
+    """Substitute the ``{{ record.<path> }}`` placeholders of ``text`` with the record's values."""
+    _check_template(type(record), text)
+
+    def value(match):
+        current = record
+        for name in match.group(1).split('.'):
+            current = getattr(current, name)
+            if current is None:
+                return ''
+        return str(current)
+
+    return PLACEHOLDER.sub(value, text)
+
+
+def _owner(record):
+    for name in ('owner', 'account_owner'):
+        if hasattr(record, name):
+            return getattr(record, name)
+    return None
+
+
+def resolve_field_update(model, config):
+    """Return (field, value) for a field_update action's config on ``model``."""
+    try:
+        field = model._meta.get_field(config.get('field') or '')
+    except FieldDoesNotExist:
+        raise PermanentActionError(f"Unknown field '{config.get('field')}' on {model.__name__}")
+    if not field.concrete or field.primary_key or not field.editable or field.many_to_many:
+        raise PermanentActionError(f"Field '{field.name}' cannot be updated")
+    try:
+        value = field.to_python(config.get('value'))
+    except ValidationError as exc:
+        raise PermanentActionError(f"Invalid value for '{field.name}': {exc.messages[0]}")
+    return field, value
+
+
+def field_update(entry, record, config):
+    """Set ``config['field']`` to ``config['value']`` without re-running save signals.
+
+    The update bumps the ``auto_now`` columns and applies the dashboard
+    metrics delta itself, as the save handlers would.
+    """
+    model = type(record)
+    field, value = resolve_field_update(model, config)
+    tracked = model in metrics.TRACKED_FIELDS
+    old_values = metrics.instance_values(record) if tracked else None
+    setattr(record, field.attname, value)
+    changes = {field.attname: value}
+    for auto_field in model._meta.concrete_fields:
+        if getattr(auto_field, 'auto_now', False):
+            changes[auto_field.attname] = auto_field.pre_save(record, add=False)
+    with transaction.atomic():
+        model._default_manager.filter(pk=record.pk).update(**changes)
+        if tracked:
+            metrics.apply_deltas(model, [(old_values, metrics.instance_values(record))])
+
+
+def email_alert(entry, record, config):
+    """Email the configured recipients; subject and body are templates over ``record``."""
+    recipients = list(config.get('recipients', ()))
+    for name in config.get('recipient_fields', ()):
+        value = getattr(record, name, None)
+        if value:
+            recipients.append(str(value))
+    owner = _owner(record)
+    if config.get('notify_owner') and owner is not None and owner.email:
+        recipients.append(owner.email)
+    if not recipients:
+        raise PermanentActionError('Email alert has no recipients')
+    send_mail(
+        _render(config.get('subject', ''), record),
+        _render(config.get('body', ''), record),
+        None,
+        sorted(set(recipients)),
+    )
+
+
+TASK_RELATIONS = {
+    Account: 'related_to_account',
+    Contact: 'related_to_contact',
+    Opportunity: 'related_to_opportunity',
+}
+
+
+def task_creation(entry, record, config):
+    """Create a follow-up task for the record's owner (or ``config['owner']``)."""
+    if not config.get('subject'):
+        raise PermanentActionError('Task creation needs a subject')
+    task = Task(
+        subject=_render(config['subject'], record)[:200],
+        description=_render(config.get('description', ''), record),
+        priority=config.get('priority', 'medium'),
+        due_date=timezone.now() + timedelta(days=config.get('due_in_days', 0)),
+    )
+    if config.get('owner'):
+        task.owner_id = config['owner']
+    else:
+        task.owner = _owner(record)
+    relation = TASK_RELATIONS.get(type(record))
+    if relation:
+        setattr(task, relation, record)
+    setattr(task, CREATED_BY_WORKFLOW, True)
+    task.save()
+
+
+TEMPLATE_KEYS = {
+    'email_alert': ('subject', 'body'),
+    'task_creation': ('subject', 'description'),
+}
+
+
+def validate_action_config(model, action_type, config):
+    """Check an action's config against its rule's model.
+
+    Raises PermanentActionError, or EndpointConfigError for an outbound
+    message url that is malformed or points at a host it may not reach.
+    """
+    for key in TEMPLATE_KEYS.get(action_type, ()):
+        _check_template(model, config.get(key, ''))
+    if action_type == 'email_alert':
+        for name in config.get('recipient_fields', ()):
+            if not isinstance(name, str) or '.' in name:
+                raise PermanentActionError('recipient_fields must name fields of the record')
+            _check_record_path(model, name)
+    elif action_type == 'field_update':
+        resolve_field_update(model, config)
+    elif action_type == 'outbound_message':
+        parts = urlsplit(endpoint_for(config).url)
+        if not check_host(parts.hostname):
+            try:
+                public_addresses(parts.hostname, parts.port)
+            except socket.gaierror:
+                # Unresolvable for now; the address is checked again on delivery.
+                pass
+
+
+def outbound_payload(entry, record, config):
+    """The JSON document describing ``record`` for an outbound message."""
+    fields = config.get('fields')
+    return {
+        'id': entry.pk,
+        'rule': entry.workflow_rule_id,
+        'action': entry.workflow_action_id,
+        'model': type(record).__name__,
+        'record': {
+            field.attname: field.value_from_object(record)
+            for field in record._meta.concrete_fields
+            if not fields or field.name in fields
+        },
+    }
+
+
+class DeliveryError(Exception):
+    """A retryable outbound delivery failure."""
+
+
+def outbound_message(entry, record, config):
+    """POST the record's fields as JSON to ``config['url']``."""
+    key = entry.pk
+    outcome, error = outbound_dispatcher.send(
+        [(key, endpoint_for(config), outbound_payload(entry, record, config))]
+    )[key]
+    if outcome == 'failed':
+        raise PermanentActionError(error)
+    if outcome == 'retry':
+        raise DeliveryError(error)
+
+
+ACTION_HANDLERS = {
+    'field_update': field_update,
+    'email_alert': email_alert,
+    'task_creation': task_creation,
+    'outbound_message': outbound_message,
+}
+
+
+# Processing
+
+def claim_batch(batch_size=None):
+    """Lock, mark as processing and return up to ``batch_size`` due entries.
+
+    Entries left in processing longer than ``CRM_OUTBOX_LOCK_TIMEOUT``
+    seconds (a worker died mid-batch) are claimed again.
+    """
+    batch_size = batch_size or _setting('CRM_OUTBOX_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    now = timezone.now()
+    stale = now - timedelta(seconds=_setting('CRM_OUTBOX_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT))
+    earlier = WorkflowOutboxEntry.objects.filter(
+        trigger_id=OuterRef('trigger_id'), order__lt=OuterRef('order'), status__in=UNFINISHED
+    )
+    due = WorkflowOutboxEntry.objects.filter(
+        Q(status='pending', available_date__lte=now) | Q(status='processing', locked_date__lt=stale)
+    ).filter(~Exists(earlier)).order_by('available_date', 'pk')
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list('pk', flat=True)[:batch_size])
+        WorkflowOutboxEntry.objects.filter(pk__in=ids).update(
+            status='processing', locked_date=now, attempts=F('attempts') + 1
+        )
+    return list(
+        WorkflowOutboxEntry.objects.filter(pk__in=ids).select_related('content_type').order_by('order', 'pk')
+    )
+
+
+def requeue_failed(action_type=None):
+    """Make dead-lettered entries pending again with fresh attempts; return the count."""
+    failed = WorkflowOutboxEntry.objects.filter(status='failed')
+    if action_type:
+        failed = failed.filter(action_type=action_type)
+    return failed.update(status='pending', attempts=0, available_date=timezone.now(), processed_date=None)
+
+
+def backoff_delay(attempts):
+    """Seconds to wait before retry number ``attempts``, with jitter."""
+    base = _setting('CRM_OUTBOX_BACKOFF_SECONDS', DEFAULT_BACKOFF_SECONDS)
+    delay = min(base * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _finish(entry, **changes):
+    WorkflowOutboxEntry.objects.filter(pk=entry.pk, status='processing').update(**changes)
+
+
+def _record_failure(entry, error, permanent, now):
+    """Reschedule ``entry`` with backoff, or dead-letter it; return the status."""
+    if not permanent and entry.attempts < _setting('CRM_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS):
+        retry_at = now + timedelta(seconds=backoff_delay(entry.attempts))
+        _finish(entry, status='pending', last_error=error, available_date=retry_at, locked_date=None)
+        return 'retry'
+    if permanent:
+        logger.warning('Workflow outbox entry %s failed: %s', entry.pk, error)
+    else:
+        logger.error('Workflow outbox entry %s gave up after %s attempts: %s', entry.pk, entry.attempts, error)
+    _finish(entry, status='failed', last_error=error, processed_date=now)
+    return 'failed'
+
+
+def run_entry(entry):
+    """Run one claimed entry and record its outcome; return the new status."""
+    now = timezone.now()
+    try:
+        record = entry.content_type.get_object_for_this_type(pk=entry.record_id)
+        handler = ACTION_HANDLERS.get(entry.action_type)
+        if handler is None:
+            raise PermanentActionError(f"Unknown action type '{entry.action_type}'")
+        handler(entry, record, entry.get_action_config())
+    except (ObjectDoesNotExist, PermanentActionError, TypeError, ValueError) as exc:
+        return _record_failure(entry, str(exc) or type(exc).__name__, True, now)
+    except Exception as exc:
+        return _record_failure(entry, f'{type(exc).__name__}: {exc}', False, now)
+    _finish(entry, status='done', last_error='', processed_date=now)
+    return 'done'
+
+
+def run_outbound_messages(entries):
+    """Deliver outbound_message entries together through the pooled dispatcher.
+
+    Records are loaded with one query per model, deliveries are marked done
+    in one update and dead letters in one per distinct error; returns the
+    list of resulting statuses.
+    """
+    now = timezone.now()
+    wanted = defaultdict(set)
+    for entry in entries:
+        wanted[entry.content_type_id].add(entry.record_id)
+    records = {}
+    for content_type_id, record_ids in wanted.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        for pk, record in model._default_manager.in_bulk(record_ids).items():
+            records[(content_type_id, pk)] = record
+
+    statuses = []
+    messages = []
+    by_pk = {}
+    for entry in entries:
+        record = records.get((entry.content_type_id, entry.record_id))
+        try:
+            if record is None:
+                raise PermanentActionError(f'{entry.content_type.model} {entry.record_id} no longer exists')
+            config = entry.get_action_config()
+            messages.append((entry.pk, endpoint_for(config), outbound_payload(entry, record, config)))
+        except (PermanentActionError, TypeError, ValueError) as exc:
+            statuses.append(_record_failure(entry, str(exc), True, now))
+            continue
+        by_pk[entry.pk] = entry
+
+    delivered = []
+    dead = defaultdict(list)
+    for pk, (outcome, error) in outbound_dispatcher.send(messages).items():
+        if outcome == 'done':
+            delivered.append(pk)
+        elif outcome == 'failed':
+            dead[error].append(pk)
+        else:
+            statuses.append(_record_failure(by_pk[pk], error, False, now))
+    processing = WorkflowOutboxEntry.objects.filter(status='processing')
+    if delivered:
+        processing.filter(pk__in=delivered).update(status='done', last_error='', processed_date=now)
+    for error, pks in dead.items():
+        logger.warning('%s outbound messages dead-lettered: %s', len(pks), error)
+        processing.filter(pk__in=pks).update(status='failed', last_error=error, processed_date=now)
+        statuses.extend(['failed'] * len(pks))
+    return statuses + ['done'] * len(delivered)
+
+
+def _run_trigger(entries):
+    return [run_entry(entry) for entry in entries]
+
+
+def _run_trigger_in_worker(entries):
+    try:
+        return _run_trigger(entries)
+    finally:
+        # Worker threads get their own connection; don't leak it.
+        connection.close()
+
+
+def process_batch(entries, workers=None):
+    """Run claimed entries, each trigger's entries in order; return status counts.
+
+    Outbound messages are handed to the pooled dispatcher in one go. Other
+    actions run per trigger, concurrently on up to ``workers`` threads; with
+    one worker they run in the calling thread.
+    """
+    outbound = [entry for entry in entries if entry.action_type == 'outbound_message']
+    triggers = defaultdict(list)
+    for entry in entries:
+        if entry.action_type != 'outbound_message':
+            triggers[entry.trigger_id].append(entry)
+    workers = workers or _setting('CRM_OUTBOX_WORKERS', DEFAULT_WORKERS)
+
+    outcomes = [run_outbound_messages(outbound)] if outbound else []
+    if workers > 1 and len(triggers) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(triggers))) as pool:
+            outcomes.extend(pool.map(_run_trigger_in_worker, triggers.values()))
+    else:
+        outcomes.extend(_run_trigger(group) for group in triggers.values())
+
+    counts = {'done': 0, 'retry': 0, 'failed': 0}
+    for statuses in outcomes:
+        for status in statuses:
+            counts[status] += 1
+    return counts
@@ -0,0 +1,241 @@
+"""Keyset pagination for API list endpoints.
+
+``KeysetPagination`` pages through a queryset ordered by a composite key
+such as ``('created_date', 'id')``: the cursor encodes the key of the last
+row on a page and the next page is the rows that sort after it. Unlike
+``PageNumberPagination`` there is no ``COUNT(*)`` and no ``OFFSET``, so
+every page costs one indexed range scan however deep the client reads. The
+ordering must end in a unique column so the key is a total order; it may
+lead with a numeric annotation such as a search rank.
+
+``CRMPagination`` is the API's default pagination class. It keeps page
+numbers unless a client opts into keyset cursors or into skipping the count.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """JSON encoder that keeps full microsecond precision for times.
+
+    DjangoJSONEncoder truncates to milliseconds, which would make a cursor
+    skip or repeat rows whose keys differ only below that.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    """Return an opaque, URL-safe cursor for a row's ordering key."""
+    payload = json.dumps(list(values), cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """Parse a cursor back into ordering key values; raise NotFound if invalid."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise ValueError
+        return [_to_python(model, name.lstrip('-'), value) for name, value in zip(ordering, values)]
+    except (binascii.Error, ValueError, TypeError, DjangoValidationError):
+        raise NotFound('Invalid cursor')
+
+
+def _to_python(model, name, value):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        # An annotation such as a search rank; JSON numbers round-trip exactly.
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise ValueError(name)
+        return value
+    return field.to_python(value)
+
+
+def keyset_filter(ordering, values):
+    """Return a Q selecting rows that sort strictly after ``values``.
+
+    For ordering (a, -b, c) that is ``a > va OR (a = va AND b < vb) OR
+    (a = va AND b = vb AND c > vc)``, which an index on the ordering columns
+    answers as a range scan.
+    """
+    condition = Q()
+    equal = Q()
+    for name, value in zip(ordering, values):
+        field = name.lstrip('-')
+        lookup = 'lt' if name.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{field}__{lookup}': value})
+        equal &= Q(**{field: value})
+    return condition
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over a composite, unique ordering.
+
+    The response is ``{"next": url-or-null, "results": [...]}``; clients
+    follow ``next`` until it is null.
+    """
+    ordering = ('-created_date', '-id')
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def __init__(self, ordering=None):
+        # An ordering given here wins over the view's ``keyset_ordering``.
+        self.explicit_ordering = tuple(ordering) if ordering is not None else None
+        self.page_size = getattr(settings, 'REST_FRAMEWORK', {}).get('PAGE_SIZE') or 10
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, view):
+        return self.explicit_ordering or tuple(getattr(view, 'keyset_ordering', None) or self.ordering)
+
+    def get_keyset_ordering(self, queryset, request, view=None):
+        """Return the ordering whose values are read from each page's last row."""
+        return self.get_ordering(view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = self.get_ordering(view)
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            values = decode_cursor(cursor, queryset.model, ordering)
+            queryset = queryset.filter(keyset_filter(ordering, values))
+
+        # One extra row tells us whether there is a next page.
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.next_cursor = None
+        if self.has_next:
+            last = rows[-1]
+            self.next_cursor = encode_cursor(getattr(last, name.lstrip('-')) for name in ordering)
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+def default_keyset_ordering(model):
+    """Return a stable ordering for syncing ``model``: ``(modified_date, id)`` where it can."""
+    names = {field.name for field in model._meta.concrete_fields}
+    for name in ('modified_date', 'created_date'):
+        if name in names:
+            return (name, 'id')
+    return ('id',)
+
+
+class CRMPagination(PageNumberPagination):
+    """Default pagination of the CRM API.
+
+    Page numbers as before, but with two opt-ins for large tables:
+
+    * ``?pagination=cursor`` switches to ``KeysetPagination`` on the view's
+      ``keyset_ordering``, by default ``(modified_date, id)``. ``?ordering=``
+      does not apply in this mode.
+    * ``?count=false`` keeps page numbers but skips the ``COUNT(*)``; the
+      response has no ``count`` and ``next`` is known from one extra row.
+
+    ``?page_size=`` goes up to 1000 in either mode.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    mode_query_param = 'pagination'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keyset = None
+        self.uncounted = False
+        ordering = self.get_keyset_ordering(queryset, request, view)
+        if ordering:
+            self.keyset = KeysetPagination(ordering=ordering)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        if request.query_params.get(self.count_query_param, '').lower() in ('false', '0'):
+            return self.paginate_uncounted(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_keyset_ordering(self, queryset, request, view=None):
+        """Return the keyset ordering of ``?pagination=cursor``; () in the other modes."""
+        if request.query_params.get(self.mode_query_param) != 'cursor':
+            return ()
+        return tuple(getattr(view, 'keyset_ordering', None) or default_keyset_ordering(queryset.model))
+
+    def paginate_uncounted(self, queryset, request):
+        self.uncounted = True
+        page_size = self.get_page_size(request)
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            raise NotFound('Invalid page.')
+        if self.page_number < 1:
+            raise NotFound('Invalid page.')
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        offset = (self.page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(rows) > page_size
+        return rows[:page_size]
+
+    def get_next_link(self):
+        if not self.uncounted:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if not self.uncounted:
+            return super().get_previous_link()
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        if self.uncounted:
+            return Response({'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data})
+        return super().get_paginated_response(data)
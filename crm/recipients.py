@@ -0,0 +1,73 @@
+"""Normalized sender and recipient index for email communications.
+
+``EmailCommunication.recipients`` is free text ("Ada <ada@x.com>, bob@y.com").
+Every address in it, and the sender, is also stored lower-cased as an
+``EmailRecipient`` row so the ``recipient=`` and ``participant=`` API filters
+resolve through an index instead of a LIKE scan. ``sync_participants`` runs
+from the post_save handler in crm/signals.py; bulk writers, which skip
+signals, call ``index_participants`` themselves.
+"""
+from email.utils import getaddresses
+
+from .models import EmailRecipient
+
+WRITE_BATCH_SIZE = 2000
+
+
+def normalize_address(address):
+    """Lower-case one address, dropping any display name; '' if there is none."""
+    return getaddresses([address or ''])[0][1].strip().lower() if address else ''
+
+
+def parse_addresses(text):
+    """Return the distinct normalized addresses in a comma-separated list, in order."""
+    return list(dict.fromkeys(
+        address.strip().lower() for _, address in getaddresses([text or '']) if address.strip()
+    ))
+
+
+def participant_rows(sender, recipients):
+    """Return the (address, role) pairs for a communication's sender and recipients."""
+    rows = [(address, 'recipient') for address in parse_addresses(recipients)]
+    sender = normalize_address(sender)
+    if sender:
+        rows.insert(0, (sender, 'sender'))
+    return rows
+
+
+def sync_participants(communication, created=False):
+    """Bring one communication's EmailRecipient rows in line with its fields."""
+    wanted = set(participant_rows(communication.sender, communication.recipients))
+    existing = {}
+    if not created:
+        existing = {
+            (address, role): pk for pk, address, role in EmailRecipient.objects.filter(
+                communication=communication
+            ).values_list('pk', 'address', 'role')
+        }
+    stale = [pk for key, pk in existing.items() if key not in wanted]
+    if stale:
+        EmailRecipient.objects.filter(pk__in=stale).delete()
+    missing = wanted.difference(existing)
+    if missing:
+        EmailRecipient.objects.bulk_create(
+            [EmailRecipient(communication=communication, address=address, role=role) for address, role in missing],
+            ignore_conflicts=True,
+        )
+
+
+def index_participants(rows):
+    """Insert EmailRecipient rows for ``(communication_id, sender, recipients)`` tuples.
+
+    For communications that have none yet, e.g. ones just written with
+    bulk_create; rows that already exist are left alone.
+    """
+    EmailRecipient.objects.bulk_create(
+        [
+            EmailRecipient(communication_id=pk, address=address, role=role)
+            for pk, sender, recipients in rows
+            for address, role in participant_rows(sender, recipients)
+        ],
+        batch_size=WRITE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
@@ -0,0 +1,331 @@
+"""Process-wide registry of parsed CRM metadata.
+
+Custom fields, reports, workflow rules (with their actions) and approval
+processes are loaded
+and their JSON columns parsed once per process into immutable structures.
+The registry revalidates against the per-model version counters from
+crm/cache.py at most every ``CRM_SCHEMA_CHECK_INTERVAL`` seconds and reloads
+when any of them moved, so every worker sharing the cache backend picks up
+metadata changes without a restart. A process-local backend (the default
+LocMemCache) cannot carry those counters between workers, so with one the
+stamp is the ``SchemaVersion`` row instead: metadata writes bump it in their
+own transaction and the check is one primary key read
+(``CRM_SCHEMA_VERSIONS`` picks ``cache`` or ``database`` explicitly). Writes in this process invalidate it
+immediately through the handlers in crm/signals.py, so the writer sees its
+own changes inside its transaction. Since that transaction may still roll
+back, a snapshot loaded before it ends is reloaded by the first access made
+outside a transaction. A snapshot is also reloaded once it is
+``CRM_SCHEMA_MAX_AGE`` seconds old, which bounds how long any stale snapshot
+(for instance after a version counter was evicted) can linger.
+
+``load_json`` is the shared parser behind the model ``get_*`` helpers; it is
+keyed by the raw text, so identical definitions are parsed once. Because the
+parsed value is shared, it is immutable: objects come back as ``FrozenDict``
+(a dict subclass) and arrays as tuples, not lists. Callers that need to
+modify a value must copy it first (``dict(value)``, ``list(value)``).
+"""
+import json
+import logging
+import threading
+import time
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+from .cache import cache_is_shared, get_versions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECK_INTERVAL = 1.0
+DEFAULT_MAX_AGE = 300
+SCHEMA_MODEL_NAMES = ('CustomField', 'Report', 'WorkflowRule', 'WorkflowAction', 'ApprovalProcess')
+SCHEMA_VERSION_PK = 1
+
+
+def versions_in_database():
+    """Whether the version stamp is the ``SchemaVersion`` row rather than cache counters."""
+    source = getattr(settings, 'CRM_SCHEMA_VERSIONS', None)
+    if source is None:
+        return not cache_is_shared()
+    return source == 'database'
+
+
+def stored_version():
+    """Return the ``SchemaVersion`` stamp; None before the first bump."""
+    SchemaVersion = apps.get_model('crm', 'SchemaVersion')
+    return SchemaVersion.objects.filter(pk=SCHEMA_VERSION_PK).values_list('version', flat=True).first()
+
+
+def bump_stored_version():
+    """Advance the ``SchemaVersion`` stamp inside the current transaction."""
+    SchemaVersion = apps.get_model('crm', 'SchemaVersion')
+    if not SchemaVersion.objects.filter(pk=SCHEMA_VERSION_PK).update(version=F('version') + 1):
+        _, created = SchemaVersion.objects.get_or_create(pk=SCHEMA_VERSION_PK, defaults={'version': 1})
+        if not created:
+            SchemaVersion.objects.filter(pk=SCHEMA_VERSION_PK).update(version=F('version') + 1)
+
+
+class FrozenDict(dict):
+    """A dict that refuses mutation, so it stays JSON-serialisable everywhere."""
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('FrozenDict is immutable')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _immutable
+
+    def __hash__(self):
+        return hash(tuple(sorted(self.items(), key=repr)))
+
+
+def freeze(value):
+    """Recursively convert parsed JSON into FrozenDicts and tuples."""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+@lru_cache(maxsize=4096)
+def _parse(text):
+    return freeze(json.loads(text))
+
+
+def load_json(text, empty=None):
+    """Parse JSON text into an immutable structure; blank text yields ``empty``.
+
+    Objects become FrozenDicts and arrays tuples (see the module docstring).
+    """
+    if not text:
+        return freeze(empty)
+    return _parse(text)
+
+
+def _safe_load(text, empty, label):
+    try:
+        return load_json(text, empty)
+    except ValueError:
+        logger.warning('Ignoring invalid JSON in %s', label)
+        return freeze(empty)
+
+
+class CustomFieldSpec(NamedTuple):
+    pk: int
+    name: str
+    label: str
+    field_type: str
+    model_name: str
+    required: bool
+    picklist_values: Tuple[str, ...]
+    default_value: str
+
+
+class ReportSpec(NamedTuple):
+    pk: int
+    name: str
+    report_type: str
+    model_name: str
+    fields: tuple
+    filters: FrozenDict
+    grouping_fields: tuple
+    owner_id: Optional[int]
+    is_public: bool
+
+
+class WorkflowActionSpec(NamedTuple):
+    pk: int
+    name: str
+    action_type: str
+    config: FrozenDict
+    order: int
+
+
+class WorkflowRuleSpec(NamedTuple):
+    pk: int
+    name: str
+    model_name: str
+    active: bool
+    evaluation_criteria: str
+    conditions: FrozenDict
+    actions: Tuple[WorkflowActionSpec, ...]
+
+
+class ApprovalProcessSpec(NamedTuple):
+    pk: int
+    name: str
+    model_name: str
+    active: bool
+    entry_criteria: FrozenDict
+
+
+class SchemaSnapshot(NamedTuple):
+    custom_fields: FrozenDict  # pk -> CustomFieldSpec
+    custom_fields_by_model: FrozenDict  # model_name -> {name: CustomFieldSpec}
+    reports: FrozenDict  # pk -> ReportSpec
+    workflow_rules: FrozenDict  # pk -> WorkflowRuleSpec
+    workflow_rules_by_model: FrozenDict  # model_name -> (WorkflowRuleSpec, ...)
+    approval_processes: FrozenDict  # pk -> ApprovalProcessSpec
+
+
+def load_snapshot():
+    """Read and parse all schema metadata; five queries."""
+    CustomField = apps.get_model('crm', 'CustomField')
+    Report = apps.get_model('crm', 'Report')
+    WorkflowRule = apps.get_model('crm', 'WorkflowRule')
+    WorkflowAction = apps.get_model('crm', 'WorkflowAction')
+    ApprovalProcess = apps.get_model('crm', 'ApprovalProcess')
+
+    custom_fields = {}
+    by_model = {}
+    for row in CustomField.objects.values(
+        'pk', 'name', 'label', 'field_type', 'model_name', 'required', 'picklist_values', 'default_value'
+    ).order_by('pk'):
+        picklist = ()
+        if row['field_type'] == 'picklist':
+            picklist = _safe_load(row['picklist_values'], [], f"custom field {row['pk']}")
+        spec = CustomFieldSpec(
+            pk=row['pk'], name=row['name'], label=row['label'], field_type=row['field_type'],
+            model_name=row['model_name'], required=row['required'], picklist_values=picklist,
+            default_value=row['default_value'],
+        )
+        custom_fields[spec.pk] = spec
+        by_model.setdefault(spec.model_name, {})[spec.name] = spec
+
+    reports = {}
+    for row in Report.objects.values(
+        'pk', 'name', 'report_type', 'model_name', 'fields', 'filters', 'grouping_fields', 'owner_id', 'is_public'
+    ):
+        label = f"report {row['pk']}"
+        reports[row['pk']] = ReportSpec(
+            pk=row['pk'], name=row['name'], report_type=row['report_type'], model_name=row['model_name'],
+            fields=_safe_load(row['fields'], [], label),
+            filters=_safe_load(row['filters'], {}, label),
+            grouping_fields=_safe_load(row['grouping_fields'], [], label),
+            owner_id=row['owner_id'], is_public=row['is_public'],
+        )
+
+    actions = {}
+    for row in WorkflowAction.objects.values(
+        'pk', 'workflow_rule_id', 'name', 'action_type', 'action_config', 'order'
+    ).order_by('order', 'pk'):
+        actions.setdefault(row['workflow_rule_id'], []).append(WorkflowActionSpec(
+            pk=row['pk'], name=row['name'], action_type=row['action_type'],
+            config=_safe_load(row['action_config'], {}, f"workflow action {row['pk']}"), order=row['order'],
+        ))
+
+    rules = {}
+    rules_by_model = {}
+    for row in WorkflowRule.objects.values(
+        'pk', 'name', 'model_name', 'active', 'evaluation_criteria', 'conditions'
+    ).order_by('pk'):
+        spec = WorkflowRuleSpec(
+            pk=row['pk'], name=row['name'], model_name=row['model_name'], active=row['active'],
+            evaluation_criteria=row['evaluation_criteria'],
+            conditions=_safe_load(row['conditions'], {}, f"workflow rule {row['pk']}"),
+            actions=tuple(actions.get(row['pk'], ())),
+        )
+        rules[spec.pk] = spec
+        rules_by_model.setdefault(spec.model_name, []).append(spec)
+
+    processes = {}
+    for row in ApprovalProcess.objects.values(
+        'pk', 'name', 'model_name', 'active', 'entry_criteria'
+    ).order_by('pk'):
+        processes[row['pk']] = ApprovalProcessSpec(
+            pk=row['pk'], name=row['name'], model_name=row['model_name'], active=row['active'],
+            entry_criteria=_safe_load(row['entry_criteria'], {}, f"approval process {row['pk']}"),
+        )
+
+    return SchemaSnapshot(
+        custom_fields=FrozenDict(custom_fields),
+        custom_fields_by_model=FrozenDict((name, FrozenDict(fields)) for name, fields in by_model.items()),
+        reports=FrozenDict(reports),
+        workflow_rules=FrozenDict(rules),
+        workflow_rules_by_model=FrozenDict((name, tuple(specs)) for name, specs in rules_by_model.items()),
+        approval_processes=FrozenDict(processes),
+    )
+
+
+class SchemaRegistry:
+    """Holds the current ``SchemaSnapshot`` for this process."""
+
+    def __init__(self, check_interval=None):
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._versions = None
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+        self._in_transaction = False
+        self._lock = threading.Lock()
+
+    def get_check_interval(self):
+        if self.check_interval is not None:
+            return self.check_interval
+        return getattr(settings, 'CRM_SCHEMA_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+
+    def schema_models(self):
+        return [apps.get_model('crm', name) for name in SCHEMA_MODEL_NAMES]
+
+    def current_versions(self):
+        """Return the version stamp the snapshot is checked against."""
+        if versions_in_database():
+            return stored_version()
+        return get_versions(self.schema_models())
+
+    def snapshot(self):
+        """Return the current snapshot, reloading it if the version stamp moved."""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        # A snapshot loaded inside the transaction of a local write may hold
+        # rows that were rolled back since.
+        settled = self._in_transaction and not connection.in_atomic_block
+        if snapshot is not None and not settled and now - self._checked_at < self.get_check_interval():
+            return snapshot
+
+        with self._lock:
+            versions = self.current_versions()
+            max_age = getattr(settings, 'CRM_SCHEMA_MAX_AGE', DEFAULT_MAX_AGE)
+            settled = self._in_transaction and not connection.in_atomic_block
+            if (self._snapshot is None or versions != self._versions or settled
+                    or now - self._loaded_at >= max_age):
+                # Versions are read before loading, so a write racing the
+                # load leaves a newer stamp behind and triggers another one.
+                self._snapshot = load_snapshot()
+                self._versions = versions
+                self._loaded_at = now
+            if settled:
+                self._in_transaction = False
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self):
+        """Drop the local snapshot; the next access reloads it.
+
+        Inside a transaction, the next access outside one reloads it again.
+        """
+        with self._lock:
+            self._snapshot = None
+            self._versions = None
+            if connection.in_atomic_block:
+                self._in_transaction = True
+
+    def custom_fields(self, model_name):
+        """Return {name: CustomFieldSpec} for a record model."""
+        return self.snapshot().custom_fields_by_model.get(model_name, FrozenDict())
+
+    def custom_field(self, pk):
+        return self.snapshot().custom_fields.get(pk)
+
+    def report(self, pk):
+        return self.snapshot().reports.get(pk)
+
+    def workflow_rules(self, model_name):
+        """Return the workflow rules defined on a record model, active or not."""
+        return self.snapshot().workflow_rules_by_model.get(model_name, ())
+
+
+schema_registry = SchemaRegistry()
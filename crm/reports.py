@@ -0,0 +1,208 @@
+"""Report execution engine.
+
+``compile_report`` turns a ``Report`` definition into a single ORM query:
+
+* ``fields`` lists field paths (``name``, ``account__name``,
+  ``close_date__year``). Summary and matrix reports may also list aggregates
+  as ``"<function>:<field path>"`` (``sum:amount``, ``avg:probability``) or
+  plain ``"count"``.
+* ``filters`` is an object of Django lookups (``{"amount__gte": 1000}``).
+* ``grouping_fields`` lists the field paths to group by. Summary reports need
+  at least one; matrix reports need exactly two (rows and columns).
+
+Every path is checked against the model named by ``model_name`` before the
+query is built, and all aggregation happens in the database.
+"""
+from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist, FieldError, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Avg, Count, Max, Min, Sum
+from django.db.models.constants import LOOKUP_SEP
+
+from .models import get_record_model
+
+AGGREGATES = {
+    'count': Count,
+    'sum': Sum,
+    'avg': Avg,
+    'min': Min,
+    'max': Max,
+}
+
+# Reports may traverse into the owner but only see what UserSerializer shows.
+USER_FIELDS = {'id', 'username', 'email', 'first_name', 'last_name'}
+
+ROW_CHUNK_SIZE = 2000
+
+
+class ReportDefinitionError(ValueError):
+    """Raised when a report definition cannot be compiled."""
+
+
+def _check_suffix(field, parts, path, allow_lookup):
+    """Validate transforms (and a trailing lookup) applied to a concrete field."""
+    for index, part in enumerate(parts):
+        is_last = index == len(parts) - 1
+        if field.get_transform(part) is not None:
+            continue
+        if is_last and allow_lookup and field.get_lookup(part) is not None:
+            continue
+        raise ReportDefinitionError(f"Unsupported lookup '{part}' in '{path}'")
+
+
+def resolve_field(model, path, allow_lookup=False):
+    """Check that ``path`` names a reportable field of ``model``.
+
+    Only forward single-valued relations are followed, so a report row always
+    corresponds to one record of the base model.
+    """
+    parts = path.split(LOOKUP_SEP)
+    current = model
+    field = None
+    for index, part in enumerate(parts):
+        if field is not None and not field.is_relation:
+            _check_suffix(field, parts[index:], path, allow_lookup)
+            return field
+        try:
+            candidate = current._meta.get_field(part)
+        except FieldDoesNotExist:
+            if field is not None:
+                _check_suffix(field, parts[index:], path, allow_lookup)
+                return field
+            raise ReportDefinitionError(f"Unknown field '{path}' on {model.__name__}")
+
+        if current is User and part not in USER_FIELDS:
+            raise ReportDefinitionError(f"Field '{path}' is not reportable")
+        if candidate.many_to_many or candidate.one_to_many:
+            raise ReportDefinitionError(f"Multi-valued relation '{path}' is not reportable")
+        field = candidate
+        if field.is_relation:
+            current = field.related_model
+            if current is not User and current._meta.app_label != model._meta.app_label:
+                raise ReportDefinitionError(f"Relation '{path}' is not reportable")
+    return field
+
+
+def _parse_column(spec):
+    """Split a field spec into (function, path); function is None for plain fields."""
+    if spec == 'count':
+        return 'count', 'id'
+    function, sep, path = spec.partition(':')
+    if not sep:
+        return None, spec
+    if function not in AGGREGATES:
+        raise ReportDefinitionError(f"Unknown aggregate '{function}'")
+    return function, path
+
+
+def _alias(function, path):
+    if function == 'count' and path == 'id':
+        return 'record_count'
+    return f"{function}_{path.replace(LOOKUP_SEP, '_')}"
+
+
+class CompiledReport:
+    """A report definition compiled into a single queryset."""
+
+    def __init__(self, report, queryset, columns):
+        self.report = report
+        self.queryset = queryset
+        self.columns = columns
+
+    def rows(self):
+        """Iterate over result rows as tuples ordered like ``columns``."""
+        return self.queryset.iterator(chunk_size=ROW_CHUNK_SIZE)
+
+    def stream_json(self):
+        """Yield the result as a JSON document, a chunk of rows at a time."""
+        encoder = DjangoJSONEncoder()
+        yield '{"report": %s, "report_type": %s, "columns": %s, "rows": [' % (
+            encoder.encode(self.report.pk),
+            encoder.encode(self.report.report_type),
+            encoder.encode(self.columns),
+        )
+        chunk = []
+        separator = ''
+        for row in self.rows():
+            chunk.append(encoder.encode(row))
+            if len(chunk) >= ROW_CHUNK_SIZE:
+                yield separator + ','.join(chunk)
+                separator = ','
+                chunk = []
+        if chunk:
+            yield separator + ','.join(chunk)
+        yield ']}'
+
+
+def compile_report(report, fields=None, filters=None, grouping_fields=None):
+    """Compile a ``Report`` into a ``CompiledReport``.
+
+    ``fields``, ``filters`` and ``grouping_fields`` default to the report's
+    own parsed definition.
+    """
+    try:
+        model = get_record_model(report.model_name)
+    except LookupError as exc:
+        raise ReportDefinitionError(str(exc))
+
+    try:
+        fields = report.get_fields() if fields is None else fields
+        filters = report.get_filters() if filters is None else filters
+        grouping_fields = report.get_grouping_fields() if grouping_fields is None else grouping_fields
+    except ValueError as exc:
+        raise ReportDefinitionError(f'Invalid report definition: {exc}')
+
+    if not isinstance(fields, (list, tuple)) or not all(isinstance(spec, str) for spec in fields):
+        raise ReportDefinitionError('fields must be a list of field names')
+    if not isinstance(filters, dict):
+        raise ReportDefinitionError('filters must be an object of lookups')
+    if not isinstance(grouping_fields, (list, tuple)) or not all(isinstance(path, str) for path in grouping_fields):
+        raise ReportDefinitionError('grouping_fields must be a list of field names')
+
+    for lookup in filters:
+        resolve_field(model, lookup, allow_lookup=True)
+    for path in grouping_fields:
+        resolve_field(model, path)
+
+    plain = []
+    aggregates = {}
+    for spec in fields:
+        function, path = _parse_column(spec)
+        resolve_field(model, path)
+        if function is None:
+            plain.append(path)
+        else:
+            aggregates[_alias(function, path)] = AGGREGATES[function](path)
+
+    if report.report_type == 'tabular':
+        if aggregates:
+            raise ReportDefinitionError('Tabular reports cannot aggregate; use a summary report')
+        if not plain:
+            raise ReportDefinitionError('Tabular reports need at least one field')
+        columns = plain
+    else:
+        if report.report_type == 'matrix' and len(grouping_fields) != 2:
+            raise ReportDefinitionError('Matrix reports need exactly two grouping fields')
+        if not grouping_fields:
+            raise ReportDefinitionError('Summary reports need at least one grouping field')
+        ungrouped = [path for path in plain if path not in grouping_fields]
+        if ungrouped:
+            raise ReportDefinitionError(f"Fields {ungrouped} must be grouped or aggregated")
+        if not aggregates:
+            aggregates['record_count'] = Count('pk')
+        columns = list(grouping_fields) + list(aggregates)
+
+    try:
+        queryset = model._default_manager.filter(**filters)
+        if report.report_type == 'tabular':
+            queryset = queryset.order_by(*grouping_fields, 'pk').values_list(*columns)
+        else:
+            queryset = (
+                queryset.values(*grouping_fields)
+                .annotate(**aggregates)
+                .order_by(*grouping_fields)
+                .values_list(*columns)
+            )
+    except (FieldError, ValidationError, ValueError, TypeError) as exc:
+        raise ReportDefinitionError(str(exc))
+    return CompiledReport(report, queryset, columns)
@@ -0,0 +1,83 @@
+"""Full-text search over email communications.
+
+``search_communications`` filters a queryset of EmailCommunication to the
+rows matching a free-text query and annotates each with a ``rank`` (higher
+is better). It uses the index the 0012 migration keeps up to date: the GIN
+indexed ``search_vector`` column on PostgreSQL, or the FTS5 table on SQLite.
+Subject matches weigh most, then sender and recipients, then the body. On
+other backends every term must appear (``icontains``) and rank is 0.
+"""
+import re
+from functools import reduce
+from operator import and_, or_
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_FIELDS = ('subject', 'body', 'sender', 'recipients')
+FTS_TABLE = 'crm_emailcommunication_fts'
+# bm25 column weights, in FTS table column order: subject, body, sender, recipients.
+FTS_WEIGHTS = '10.0, 1.0, 2.0, 2.0'
+MAX_TERMS = 32
+
+
+def search_terms(query):
+    """Split a free-text query into at most MAX_TERMS whitespace-separated terms."""
+    return query.split()[:MAX_TERMS]
+
+
+def fts5_query(query):
+    """Build an FTS5 MATCH expression that ANDs every term of ``query``.
+
+    Each term is quoted so user input can never be read as FTS5 syntax (the
+    tokenizer turns ``ada@example.com`` into the phrase ``ada example com``);
+    a trailing ``*`` keeps its prefix-match meaning.
+    """
+    parts = []
+    for term in search_terms(query):
+        prefix = term.endswith('*')
+        term = term.rstrip('*')
+        if not re.search(r'\w', term):
+            continue
+        parts.append('"{}"{}'.format(term.replace('"', '""'), '*' if prefix else ''))
+    return ' '.join(parts)
+
+
+def search_communications(queryset, query):
+    """Return ``queryset`` narrowed to rows matching ``query``, annotated with ``rank``."""
+    table = queryset.model._meta.db_table
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        tsquery = "websearch_to_tsquery('english', %s)"
+        return queryset.alias(
+            search_match=RawSQL(f'{table}.search_vector @@ {tsquery}', (query,), output_field=BooleanField()),
+        ).filter(search_match=True).annotate(
+            # ts_rank_cd returns real; as double precision the rank in a
+            # keyset cursor compares equal to the row it came from.
+            rank=RawSQL(
+                f'ts_rank_cd({table}.search_vector, {tsquery})::double precision', (query,),
+                output_field=FloatField(),
+            ),
+        )
+
+    if vendor == 'sqlite':
+        match = fts5_query(query)
+        if not match:
+            return queryset.none().annotate(rank=Value(0.0, output_field=FloatField()))
+        # bm25 is lower-is-better; negate it so rank sorts like ts_rank_cd.
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,)),
+        ).annotate(rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, {FTS_WEIGHTS}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {table}.id',
+            (match,), output_field=FloatField(),
+        ))
+
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none().annotate(rank=Value(0.0, output_field=FloatField()))
+    condition = reduce(and_, (
+        reduce(or_, (Q(**{f'{field}__icontains': term}) for field in SEARCH_FIELDS)) for term in terms
+    ))
+    return queryset.filter(condition).annotate(rank=Value(0.0, output_field=FloatField()))
@@ -4,74 +4,147 @@ from .models import (
     Account, Contact, Lead, Opportunity, Task,
     CustomField, CustomFieldValue, Report, Dashboard, DashboardComponent,
     EmailTemplate, WorkflowRule, WorkflowAction, ApprovalProcess,
-    ApprovalStep, ApprovalRequest
+    ApprovalStep, ApprovalRequest, EmailCommunication, get_record_model
 )
+from .custom_fields import parse_value
+from .dashboards import report_visible_to
+from .outbox import PermanentActionError, validate_action_config
+from .registry import load_json
+from .workflows import compile_conditions
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name']
 
-class AccountSerializer(serializers.ModelSerializer):
+class CustomFieldValuesMixin:
+    """Adds a ``custom_fields`` object when the view supplies preloaded values."""
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        values = self.context.get('custom_field_values')
+        if values is not None:
+            data['custom_fields'] = values.get(instance.pk, {})
+        return data
+
+class SparseFieldsMixin:
+    """Trims the top-level fields to the view's ``sparse_fields`` and ``expand``.
+
+    With ``sparse_fields`` in the context only the named fields are kept;
+    an unknown name is a validation error. Nested serializers not named in
+    ``expand`` are rendered as primary keys instead, so their fields are never
+    built. Nested serializers and contexts without either key are unchanged.
+    """
+
+    def is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if 'expand' not in self.context or not self.is_root():
+            return fields
+        names = self.context.get('sparse_fields')
+        if names is not None:
+            unknown = sorted(set(names) - set(fields))
+            if unknown:
+                raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}"})
+            fields = {name: field for name, field in fields.items() if name in names}
+        expand = self.context['expand']
+        for name, field in fields.items():
+            if name not in expand and isinstance(field, serializers.BaseSerializer):
+                fields[name] = self.collapse(name, field)
+        return fields
+
+    def collapse(self, name, field):
+        """Return a read-only primary key field for the nested serializer ``field``."""
+        kwargs = {'read_only': True}
+        if field.source and field.source != name:
+            kwargs['source'] = field.source
+        if isinstance(field, serializers.ListSerializer):
+            kwargs['many'] = True
+        return serializers.PrimaryKeyRelatedField(**kwargs)
+
+class AccountSerializer(SparseFieldsMixin, CustomFieldValuesMixin, serializers.ModelSerializer):
     account_owner = UserSerializer(read_only=True)
     
     class Meta:
         model = Account
         fields = '__all__'
 
-class ContactSerializer(serializers.ModelSerializer):
+class ContactSerializer(SparseFieldsMixin, CustomFieldValuesMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     
     class Meta:
         model = Contact
         fields = '__all__'
 
-class LeadSerializer(serializers.ModelSerializer):
+class LeadSerializer(SparseFieldsMixin, CustomFieldValuesMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     
     class Meta:
         model = Lead
         fields = '__all__'
 
-class OpportunitySerializer(serializers.ModelSerializer):
+class OpportunitySerializer(SparseFieldsMixin, CustomFieldValuesMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     
     class Meta:
         model = Opportunity
         fields = '__all__'
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(SparseFieldsMixin, CustomFieldValuesMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     
     class Meta:
         model = Task
         fields = '__all__'
 
-class CustomFieldSerializer(serializers.ModelSerializer):
+class CustomFieldSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     created_by = UserSerializer(read_only=True)
     
     class Meta:
         model = CustomField
         fields = '__all__'
 
-class CustomFieldValueSerializer(serializers.ModelSerializer):
+class CustomFieldValueSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = CustomFieldValue
         fields = '__all__'
 
-class ReportSerializer(serializers.ModelSerializer):
+    def validate(self, attrs):
+        custom_field = attrs.get('custom_field') or self.instance.custom_field
+        value = attrs.get('value', self.instance.value if self.instance else '')
+        try:
+            parse_value(custom_field.field_type, value)
+        except ValueError as exc:
+            raise serializers.ValidationError({'value': str(exc)})
+        picklist_values = custom_field.get_picklist_values()
+        if value and picklist_values and value not in picklist_values:
+            raise serializers.ValidationError({'value': f"'{value}' is not one of {list(picklist_values)}"})
+        return attrs
+
+class ReportSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     
     class Meta:
         model = Report
         fields = '__all__'
 
-class DashboardComponentSerializer(serializers.ModelSerializer):
+class DashboardComponentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = DashboardComponent
         fields = '__all__'
 
-class DashboardSerializer(serializers.ModelSerializer):
+    def validate_report(self, report):
+        request = self.context.get('request')
+        if request is not None and not report_visible_to(report, request.user):
+            raise serializers.ValidationError('Report not found')
+        return report
+
+class DashboardSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     components = DashboardComponentSerializer(many=True, read_only=True)
     
@@ -79,19 +152,32 @@ class DashboardSerializer(serializers.ModelSerializer):
         model = Dashboard
         fields = '__all__'
 
-class EmailTemplateSerializer(serializers.ModelSerializer):
+class EmailTemplateSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     
     class Meta:
         model = EmailTemplate
         fields = '__all__'
 
-class WorkflowActionSerializer(serializers.ModelSerializer):
+class WorkflowActionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = WorkflowAction
         fields = '__all__'
 
-class WorkflowRuleSerializer(serializers.ModelSerializer):
+    def validate(self, attrs):
+        rule = attrs.get('workflow_rule') or self.instance.workflow_rule
+        action_type = attrs.get('action_type') or self.instance.action_type
+        action_config = attrs.get('action_config', self.instance.action_config if self.instance else '')
+        try:
+            config = load_json(action_config, empty={})
+            if not isinstance(config, dict):
+                raise ValueError('action_config must be a JSON object')
+            validate_action_config(get_record_model(rule.model_name), action_type, config)
+        except (LookupError, ValueError, PermanentActionError) as exc:
+            raise serializers.ValidationError({'action_config': str(exc)})
+        return attrs
+
+class WorkflowRuleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     actions = WorkflowActionSerializer(many=True, read_only=True)
     
@@ -99,14 +185,23 @@ class WorkflowRuleSerializer(serializers.ModelSerializer):
         model = WorkflowRule
         fields = '__all__'
 
-class ApprovalStepSerializer(serializers.ModelSerializer):
+    def validate(self, attrs):
+        model_name = attrs.get('model_name') or self.instance.model_name
+        conditions = attrs.get('conditions', self.instance.conditions if self.instance else '')
+        try:
+            compile_conditions(get_record_model(model_name), load_json(conditions, empty={}))
+        except (LookupError, ValueError) as exc:
+            raise serializers.ValidationError({'conditions': str(exc)})
+        return attrs
+
+class ApprovalStepSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     approvers = UserSerializer(many=True, read_only=True)
     
     class Meta:
         model = ApprovalStep
         fields = '__all__'
 
-class ApprovalProcessSerializer(serializers.ModelSerializer):
+class ApprovalProcessSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     steps = ApprovalStepSerializer(many=True, read_only=True)
     
@@ -114,9 +209,38 @@ class ApprovalProcessSerializer(serializers.ModelSerializer):
         model = ApprovalProcess
         fields = '__all__'
 
-class ApprovalRequestSerializer(serializers.ModelSerializer):
+    def validate(self, attrs):
+        model_name = attrs.get('model_name') or self.instance.model_name
+        entry_criteria = attrs.get('entry_criteria', self.instance.entry_criteria if self.instance else '')
+        try:
+            compile_conditions(get_record_model(model_name), load_json(entry_criteria, empty={}))
+        except (LookupError, ValueError) as exc:
+            raise serializers.ValidationError({'entry_criteria': str(exc)})
+        return attrs
+
+class ApprovalRequestSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     submitter = UserSerializer(read_only=True)
     
     class Meta:
         model = ApprovalRequest
-        fields = '__all__' 
\ No newline at end of file
+        fields = '__all__' 
+
+    def validate(self, attrs):
+        process = attrs.get('approval_process') or self.instance.approval_process
+        step = attrs.get('current_step') or self.instance.current_step
+        if step.approval_process_id != process.pk:
+            raise serializers.ValidationError({'current_step': 'Step does not belong to the approval process'})
+        return attrs
+
+class EmailCommunicationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    owner = UserSerializer(read_only=True)
+
+    class Meta:
+        model = EmailCommunication
+        fields = '__all__'
+
+class EmailSearchResultSerializer(EmailCommunicationSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+class EmailFollowUpSerializer(EmailCommunicationSerializer):
+    is_follow_up_overdue = serializers.BooleanField(read_only=True)
@@ -0,0 +1,119 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import metrics, outbox, recipients
+from .cache import bump_version
+from .models import (
+    Account, ApprovalProcess, Contact, CustomField, Dashboard, DashboardComponent, EmailCommunication, Lead,
+    Opportunity, Report, Task, WorkflowAction, WorkflowRule,
+)
+from .registry import bump_stored_version, schema_registry, versions_in_database
+from .workflows import rule_triggered, workflow_engine
+
+
+# Dashboard metrics snapshot
+@receiver(pre_save, sender=Account)
+@receiver(pre_save, sender=Opportunity)
+@receiver(pre_save, sender=Lead)
+@receiver(pre_save, sender=Task)
+def capture_dashboard_metrics_state(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._metrics_previous = None
+    if raw or instance._state.adding or not metrics.tracks_update(sender, update_fields):
+        return
+    instance._metrics_previous = metrics.stored_values(sender, instance.pk)
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_save, sender=Opportunity)
+@receiver(post_save, sender=Lead)
+@receiver(post_save, sender=Task)
+def update_dashboard_metrics_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not metrics.tracks_update(sender, update_fields):
+        return
+    old_values = None if created else getattr(instance, '_metrics_previous', None)
+    metrics.apply_delta(sender, old_values, metrics.instance_values(instance))
+
+
+@receiver(post_delete, sender=Account)
+@receiver(post_delete, sender=Opportunity)
+@receiver(post_delete, sender=Lead)
+@receiver(post_delete, sender=Task)
+def update_dashboard_metrics_on_delete(sender, instance, **kwargs):
+    metrics.apply_delta(sender, metrics.instance_values(instance), None)
+
+
+# Model versions for the API response cache and the schema registry
+@receiver(post_save, sender=Report)
+@receiver(post_save, sender=Dashboard)
+@receiver(post_save, sender=DashboardComponent)
+@receiver(post_save, sender=CustomField)
+@receiver(post_save, sender=WorkflowRule)
+@receiver(post_save, sender=WorkflowAction)
+@receiver(post_save, sender=ApprovalProcess)
+@receiver(post_delete, sender=Report)
+@receiver(post_delete, sender=Dashboard)
+@receiver(post_delete, sender=DashboardComponent)
+@receiver(post_delete, sender=CustomField)
+@receiver(post_delete, sender=WorkflowRule)
+@receiver(post_delete, sender=WorkflowAction)
+@receiver(post_delete, sender=ApprovalProcess)
+def bump_model_version(sender, **kwargs):
+    # Bump once the write is visible so a concurrent reader cannot cache the
+    # old rows under the new version.
+    transaction.on_commit(lambda: bump_version(sender))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_user_version(sender, update_fields=None, **kwargs):
+    # Users are nested in cached report and dashboard responses. Logins only
+    # touch last_login, which no response shows.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(lambda: bump_version(sender))
+
+
+@receiver(post_save, sender=Report)
+@receiver(post_save, sender=CustomField)
+@receiver(post_save, sender=WorkflowRule)
+@receiver(post_save, sender=WorkflowAction)
+@receiver(post_save, sender=ApprovalProcess)
+@receiver(post_delete, sender=Report)
+@receiver(post_delete, sender=CustomField)
+@receiver(post_delete, sender=WorkflowRule)
+@receiver(post_delete, sender=WorkflowAction)
+@receiver(post_delete, sender=ApprovalProcess)
+def invalidate_schema_registry(sender, **kwargs):
+    # This process sees its own writes straight away, including inside the
+    # transaction; other workers follow the version bump.
+    schema_registry.invalidate()
+    if versions_in_database():
+        bump_stored_version()
+
+
+# Workflow rules
+@receiver(post_save, sender=Account)
+@receiver(post_save, sender=Contact)
+@receiver(post_save, sender=Lead)
+@receiver(post_save, sender=Opportunity)
+@receiver(post_save, sender=Task)
+def evaluate_workflow_rules(sender, instance, created, raw=False, **kwargs):
+    if raw or getattr(instance, outbox.CREATED_BY_WORKFLOW, False):
+        return
+    workflow_engine.run(instance, created)
+
+
+@receiver(rule_triggered)
+def enqueue_workflow_actions(sender, rule, instance, **kwargs):
+    # Written in the saving transaction; process_workflow_outbox runs them.
+    outbox.enqueue(rule, instance)
+
+
+# Email recipient index
+@receiver(post_save, sender=EmailCommunication)
+def sync_email_participants(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    recipients.sync_participants(instance, created)
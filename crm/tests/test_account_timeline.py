@@ -0,0 +1,64 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from crm.models import Account, EmailCommunication
+from datetime import timedelta
+
+@override_settings(CRM_TIMELINE_PAGE_SIZE=3)
+class AccountTimelineTest(TestCase):
+    """Test cases for the paged email timeline on the account detail page."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='rep', password='pass')
+        self.account = Account.objects.create(name='Acme', account_owner=self.user)
+        other = Account.objects.create(name='Globex', account_owner=self.user)
+        now = timezone.now()
+        # Two emails share a sent_date so paging has to fall back on id.
+        self.emails = [
+            EmailCommunication.objects.create(
+                account=self.account, direction='inbound', subject=f'Email {i}', body=f'Body {i}',
+                sent_date=now - timedelta(hours=min(i, 4)), sender='buyer@acme.com', recipients='rep@ourco.com'
+            )
+            for i in range(7)
+        ]
+        EmailCommunication.objects.create(
+            account=other, direction='inbound', subject='Elsewhere', body='', sent_date=now,
+            sender='x@globex.com', recipients='rep@ourco.com'
+        )
+        self.client.force_login(self.user)
+
+    def expected_order(self):
+        return [email.pk for email in sorted(self.emails, key=lambda e: (e.sent_date, e.pk), reverse=True)]
+
+    def test_detail_renders_first_page_without_bodies(self):
+        """Test the detail page renders one page of subjects and no email bodies."""
+        response = self.client.get(reverse('crm:account_detail', args=[self.account.pk]), secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c.pk for c in response.context['communications']], self.expected_order()[:3])
+        self.assertContains(response, 'load-more-communications')
+        self.assertNotContains(response, 'Body ')
+        self.assertNotContains(response, 'Elsewhere')
+        self.assertEqual(response.context['communications'][0].get_deferred_fields(), {'body'})
+
+    def test_load_more_walks_every_page(self):
+        """Test following the cursor returns every email once, newest first."""
+        url = reverse('crm:account_communications', args=[self.account.pk])
+        response = self.client.get(reverse('crm:account_detail', args=[self.account.pk]), secure=True)
+        seen = [c.pk for c in response.context['communications']]
+        cursor = response.context['next_cursor']
+        while cursor:
+            response = self.client.get(url, {'cursor': cursor}, secure=True)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(c.pk for c in response.context['communications'])
+            self.assertIn('toggle-body', response.json()['html'])
+            cursor = response.json()['next']
+        self.assertEqual(seen, self.expected_order())
+        self.assertEqual(self.client.get(url, {'cursor': 'bogus'}, secure=True).status_code, 404)
+
+    def test_body_loads_on_demand(self):
+        """Test the body endpoint returns one email's body."""
+        email = self.emails[2]
+        response = self.client.get(reverse('crm:communication_body', args=[email.pk]), secure=True)
+        self.assertEqual(response.json(), {'id': email.pk, 'body': 'Body 2'})
+        self.assertEqual(self.client.get(reverse('crm:communication_body', args=[0]), secure=True).status_code, 404)
@@ -0,0 +1,65 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from crm.models import Account, Task
+from crm.pagination import default_keyset_ordering
+
+class ApiPaginationTest(TestCase):
+    """Test cases for the opt-in cursor and count-free API pagination."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='rep', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.account = Account.objects.create(name='Acme', account_owner=self.user)
+        self.tasks = [
+            Task.objects.create(subject=f'Task {i}', due_date=timezone.now(), owner=self.user,
+                                related_to_account=self.account)
+            for i in range(7)
+        ]
+        # Give two tasks the same modified_date so pages must break ties on id.
+        Task.objects.filter(pk__in=[self.tasks[2].pk, self.tasks[5].pk]).update(
+            modified_date=self.tasks[0].modified_date
+        )
+        self.url = reverse('crm:task-list')
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url, secure=True)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_cursor_mode_pages_on_modified_date_and_id(self):
+        """Test ?pagination=cursor walks every row once in (modified_date, id) order without COUNT."""
+        expected = list(Task.objects.order_by('modified_date', 'id').values_list('id', flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.walk(f'{self.url}?pagination=cursor&page_size=3'), expected)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(default_keyset_ordering(Task), ('modified_date', 'id'))
+
+    def test_count_can_be_skipped(self):
+        """Test ?count=false pages by number without COUNT and keeps previous links."""
+        expected = list(Task.objects.order_by('id').values_list('id', flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.walk(f'{self.url}?count=false&page_size=3'), expected)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+        response = self.client.get(self.url, {'count': 'false', 'page': 3, 'page_size': 3}, secure=True)
+        self.assertIsNone(response.data['next'])
+        self.assertIn('page=2', response.data['previous'])
+        self.assertEqual(self.client.get(self.url, {'count': 'false', 'page': 0}, secure=True).status_code, 404)
+
+    def test_page_numbers_remain_the_default(self):
+        """Test plain requests still get counted page-number pages, up to 1000 rows."""
+        response = self.client.get(self.url, {'page_size': 5000}, secure=True)
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 7)
+        response = self.client.get(self.url, {'page_size': 5}, secure=True)
+        self.assertEqual((response.data['count'], len(response.data['results'])), (7, 5))
@@ -0,0 +1,293 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from crm.approvals import approval_matcher
+from crm.models import Account, ApprovalProcess, ApprovalRequest, ApprovalResponse, ApprovalStep, Opportunity
+from crm.registry import schema_registry
+from datetime import date, timedelta
+from decimal import Decimal
+
+class ApprovalInboxTest(TestCase):
+    """Test cases for the approver inbox endpoint."""
+
+    def setUp(self):
+        self.approver = User.objects.create_user(username='approver', password='pass')
+        self.other = User.objects.create_user(username='other', password='pass')
+        self.submitter = User.objects.create_user(username='rep', password='pass')
+        self.process = ApprovalProcess.objects.create(
+            name='Discounts', model_name='Opportunity', active=True, entry_criteria='{}'
+        )
+        self.first = self.add_step(1, [self.approver])
+        self.second = self.add_step(2, [self.other])
+        self.client = APIClient()
+        self.client.force_authenticate(self.approver)
+        self.url = reverse('crm:approvalrequest-inbox')
+
+    def add_step(self, number, approvers):
+        step = ApprovalStep.objects.create(
+            approval_process=self.process, name=f'Step {number}', step_number=number,
+            approval_type='first_response', reject_behavior='{}', approval_actions='{}', rejection_actions='{}'
+        )
+        step.approvers.set(approvers)
+        return step
+
+    def add_request(self, step, status='pending', age=0):
+        return ApprovalRequest.objects.create(
+            approval_process=self.process, current_step=step, record_id=1, status=status,
+            submitter=self.submitter, created_date=timezone.now() - timedelta(minutes=age)
+        )
+
+    def test_lists_pending_requests_for_current_step_approvers(self):
+        """Test only pending requests at a step the caller approves are listed, oldest first."""
+        newer = self.add_request(self.first, age=1)
+        older = self.add_request(self.first, age=5)
+        self.add_request(self.first, status='approved')
+        self.add_request(self.second)
+        response = self.client.get(self.url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], [older.pk, newer.pk])
+        self.assertEqual(response.data['results'][0]['submitter']['username'], 'rep')
+        self.assertIsNone(response.data['next'])
+
+    def test_keyset_pages_in_constant_queries(self):
+        """Test the inbox follows cursors and each page is a single query."""
+        expected = [self.add_request(self.first, age=30 - i).pk for i in range(25)]
+        seen = []
+        url = f'{self.url}?page_size=10'
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url, secure=True)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+    def test_rejects_bad_cursor(self):
+        """Test a malformed cursor is a 404 rather than a server error."""
+        response = self.client.get(f'{self.url}?cursor=not-a-cursor', secure=True)
+        self.assertEqual(response.status_code, 404)
+
+class ApprovalBulkActionTest(TestCase):
+    """Test cases for bulk approve, reject and recall."""
+
+    def setUp(self):
+        self.approver = User.objects.create_user(username='approver', password='pass')
+        self.peer = User.objects.create_user(username='peer', password='pass')
+        self.submitter = User.objects.create_user(username='rep', password='pass')
+        self.process = ApprovalProcess.objects.create(
+            name='Discounts', model_name='Opportunity', active=True, entry_criteria='{}'
+        )
+        self.first = self.add_step(1, 'first_response', [self.approver])
+        self.final = self.add_step(2, 'unanimous', [self.approver, self.peer])
+        self.url = reverse('crm:approvalrequest-bulk')
+
+    def add_step(self, number, approval_type, approvers):
+        step = ApprovalStep.objects.create(
+            approval_process=self.process, name=f'Step {number}', step_number=number,
+            approval_type=approval_type, reject_behavior='{}', approval_actions='{}', rejection_actions='{}'
+        )
+        step.approvers.set(approvers)
+        return step
+
+    def add_requests(self, count, step=None):
+        return [
+            ApprovalRequest.objects.create(
+                approval_process=self.process, current_step=step or self.first, record_id=i,
+                submitter=self.submitter
+            ).pk
+            for i in range(count)
+        ]
+
+    def post(self, user, action, ids, **extra):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(self.url, {'action': action, 'ids': ids, **extra}, format='json', secure=True)
+
+    def statuses(self, response):
+        return [result['status'] for result in response.data['results']]
+
+    def test_approvals_walk_steps(self):
+        """Test first-response steps advance at once and unanimous steps wait for everyone."""
+        ids = self.add_requests(3)
+        response = self.post(self.approver, 'approve', ids, comments='OK for Q4')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.statuses(response), ['advanced'] * 3)
+        self.assertEqual(response.data['results'][0]['current_step'], self.final.pk)
+        self.assertEqual(ApprovalRequest.objects.get(pk=ids[0]).comments, 'OK for Q4')
+
+        self.assertEqual(self.statuses(self.post(self.approver, 'approve', ids)), ['recorded'] * 3)
+        self.assertEqual(set(ApprovalRequest.objects.values_list('status', flat=True)), {'pending'})
+        response = self.post(self.approver, 'approve', ids[:1])
+        self.assertEqual(response.data['results'][0]['errors'], {'id': 'You have already responded to this step'})
+
+        self.assertEqual(self.statuses(self.post(self.peer, 'approve', ids)), ['approved'] * 3)
+        self.assertEqual(set(ApprovalRequest.objects.values_list('status', flat=True)), {'approved'})
+        self.assertEqual(ApprovalResponse.objects.filter(step=self.final, decision='approved').count(), 6)
+
+    def test_reject_recall_and_errors(self):
+        """Test rejection, recall permissions and per-row errors."""
+        rejected, recalled, untouched = self.add_requests(3)
+        response = self.post(self.approver, 'reject', [rejected, 999, rejected])
+        self.assertEqual(self.statuses(response), ['rejected', 'error', 'error'])
+        self.assertEqual(response.data['results'][2]['errors'], {'id': 'Duplicate of row 0'})
+
+        response = self.post(self.peer, 'approve', [untouched])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['results'][0]['errors'], {'id': 'You are not an approver of the current step'})
+
+        self.assertEqual(self.statuses(self.post(self.approver, 'reject', [rejected])), ['error'])
+        self.assertEqual(self.statuses(self.post(self.approver, 'recall', [recalled])), ['error'])
+        self.assertEqual(self.statuses(self.post(self.submitter, 'recall', [recalled])), ['recalled'])
+        self.assertEqual(
+            dict(ApprovalRequest.objects.values_list('pk', 'status')),
+            {rejected: 'rejected', recalled: 'recalled', untouched: 'pending'}
+        )
+
+    def test_steps_of_other_processes_are_per_row_errors(self):
+        """Test a request whose current step belongs to another process fails alone and is refused by the API."""
+        other = ApprovalProcess.objects.create(name='Refunds', model_name='Opportunity', entry_criteria='{}')
+        stray = ApprovalStep.objects.create(
+            approval_process=other, name='Stray', step_number=1, approval_type='first_response',
+            reject_behavior='{}', approval_actions='{}', rejection_actions='{}'
+        )
+        stray.approvers.set([self.approver])
+        mismatched = ApprovalRequest.objects.create(
+            approval_process=self.process, current_step=stray, record_id=1, submitter=self.submitter
+        ).pk
+        valid, = self.add_requests(1)
+        response = self.post(self.approver, 'approve', [mismatched, valid])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.statuses(response), ['error', 'advanced'])
+        self.assertIn('does not belong', response.data['results'][0]['errors']['id'])
+
+        client = APIClient()
+        client.force_authenticate(self.submitter)
+        data = {'approval_process': self.process.pk, 'current_step': stray.pk, 'record_id': 1}
+        response = client.post(reverse('crm:approvalrequest-list'), data, format='json', secure=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('current_step', response.data)
+        data['current_step'] = self.first.pk
+        response = client.post(reverse('crm:approvalrequest-list'), data, format='json', secure=True)
+        self.assertEqual(response.status_code, 201)
+
+    def test_queries_do_not_grow_with_batch_size(self):
+        """Test a batch costs the same number of queries whatever its size."""
+        small, large = self.add_requests(2), self.add_requests(40)
+        unanimous_small, unanimous_large = self.add_requests(2, self.final), self.add_requests(40, self.final)
+        # savepoint, lock, steps, approvers, prior responses, insert, update, release
+        with self.assertNumQueries(8):
+            self.post(self.approver, 'approve', small + unanimous_small)
+        with self.assertNumQueries(8):
+            self.post(self.approver, 'approve', large + unanimous_large)
+
+    def test_validates_payload(self):
+        """Test unknown actions and malformed ids are rejected outright."""
+        self.assertEqual(self.post(self.approver, 'escalate', [1]).status_code, 400)
+        self.assertEqual(self.post(self.approver, 'approve', []).status_code, 400)
+        self.assertEqual(self.post(self.approver, 'approve', ['1']).status_code, 400)
+        client = APIClient()
+        client.force_authenticate(self.approver)
+        self.assertEqual(client.post(self.url, [{'action': 'approve'}], format='json', secure=True).status_code, 400)
+
+class ApprovalMatcherTest(TestCase):
+    """Test cases for matching records to approval processes and bulk submission."""
+
+    def setUp(self):
+        schema_registry.invalidate()
+        self.user = User.objects.create_user(username='rep', password='pass')
+        self.account = Account.objects.create(name='Acme', account_owner=self.user)
+        self.large = self.add_process('Large deals', '{"stage": "negotiation", "amount__gte": 50000}')
+        self.late = self.add_process('Late stage', '{"stage__in": ["negotiation", "value_proposition"]}')
+        self.any_big = self.add_process('Any big deal', '{"amount__gte": 250000}')
+        self.add_process('Retired', '{}', active=False)
+
+    def add_process(self, name, criteria, active=True, model_name='Opportunity'):
+        process = ApprovalProcess.objects.create(
+            name=name, model_name=model_name, active=active, entry_criteria=criteria
+        )
+        for number in (2, 1):
+            ApprovalStep.objects.create(
+                approval_process=process, name=f'{name} {number}', step_number=number,
+                approval_type='first_response', reject_behavior='{}', approval_actions='{}', rejection_actions='{}'
+            )
+        return process
+
+    def opportunity(self, stage, amount):
+        return Opportunity.objects.create(
+            name=f'{stage} {amount}', account=self.account, amount=Decimal(amount), stage=stage,
+            close_date=date(2026, 12, 31), owner=self.user
+        )
+
+    def test_oldest_matching_process_wins(self):
+        """Test records enter the oldest active process whose criteria they meet."""
+        cases = [
+            (self.opportunity('negotiation', 75000), self.large),
+            (self.opportunity('negotiation', 1000), self.late),
+            (self.opportunity('value_proposition', 300000), self.late),
+            (self.opportunity('prospecting', 300000), self.any_big),
+            (self.opportunity('prospecting', 1000), None),
+        ]
+        matched = approval_matcher.match_many([record for record, _ in cases])
+        self.assertEqual([spec and spec.pk for spec in matched], [process and process.pk for _, process in cases])
+        self.assertEqual(approval_matcher.match(cases[0][0]).name, 'Large deals')
+
+    def test_indexes_on_equality_lookups(self):
+        """Test processes are bucketed by the attribute most of them compare for equality."""
+        index = approval_matcher.index_for('Opportunity')
+        self.assertEqual(index.attname, 'stage')
+        self.assertEqual(
+            [p.spec.pk for p in index.buckets['negotiation']], [self.large.pk, self.late.pk, self.any_big.pk]
+        )
+        self.assertEqual([p.spec.pk for p in index.fallback], [self.any_big.pk])
+        self.assertIsNone(approval_matcher.index_for('Lead'))
+
+    def test_saving_a_process_refreshes_the_matcher(self):
+        """Test edits to a process apply to the next match."""
+        record = self.opportunity('negotiation', 75000)
+        self.assertEqual(approval_matcher.match(record).pk, self.large.pk)
+        self.large.active = False
+        self.large.save()
+        self.assertEqual(approval_matcher.match(record).pk, self.late.pk)
+
+    def test_bulk_submit(self):
+        """Test records are submitted at the first step of their process in a fixed number of queries."""
+        records = [self.opportunity('negotiation', 75000 + i) for i in range(20)]
+        small = [self.opportunity('prospecting', 1000 + i) for i in range(2)]
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('crm:approvalrequest-submit')
+        approval_matcher.index_for('Opportunity')
+
+        ids = [record.pk for record in records] + [small[0].pk, 999999, records[0].pk]
+        # savepoint, records, first steps, pending requests, insert, release
+        with self.assertNumQueries(6):
+            response = client.post(url, {'model_name': 'Opportunity', 'record_ids': ids}, format='json', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['submitted'], 20)
+        errors = [result['errors']['record_id'] for result in response.data['results'][20:]]
+        self.assertEqual(errors, [
+            'No active approval process applies to this record',
+            'Opportunity 999999 does not exist',
+            'Duplicate of row 0',
+        ])
+        request = ApprovalRequest.objects.get(pk=response.data['results'][0]['id'])
+        self.assertEqual((request.approval_process, request.current_step.step_number), (self.large, 1))
+        self.assertEqual(request.submitter, self.user)
+
+        response = client.post(url, {'model_name': 'Opportunity', 'record_ids': ids[:1]}, format='json', secure=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data['results'][0]['errors'], {'record_id': 'Record already has a pending approval request'}
+        )
+        self.assertEqual(client.post(url, ids, format='json', secure=True).status_code, 400)
+
+    def test_api_validates_entry_criteria(self):
+        """Test the API rejects criteria the matcher could not compile."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(reverse('crm:approvalprocess-list'), {
+            'name': 'Broken', 'model_name': 'Opportunity', 'entry_criteria': '{"nope": 1}',
+        }, format='json', secure=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('entry_criteria', response.data)
@@ -0,0 +1,120 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.test import APIClient
+from crm.metrics import compute_dashboard_metrics, get_dashboard_metrics
+from crm.models import Account, Contact, Opportunity, Lead, WorkflowAction, WorkflowOutboxEntry, WorkflowRule
+from decimal import Decimal
+
+class BulkRecordsTest(TestCase):
+    """Test cases for the bulk create, update and delete endpoints of core records."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='rep', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.acme = Account.objects.create(name='Acme', account_owner=self.user)
+        self.globex = Account.objects.create(name='Globex', account_owner=self.user)
+        get_dashboard_metrics()
+
+    def test_bulk_create_validates_each_row_and_sets_the_owner(self):
+        """Test valid rows are inserted owned by the caller and invalid ones reported."""
+        rows = [
+            {'account': self.acme.pk, 'first_name': 'Ada', 'last_name': 'Lovelace', 'email': 'ada@acme.com'},
+            {'account': 999999, 'first_name': 'Bob', 'last_name': 'Byte', 'email': 'bob@acme.com'},
+            {'account': self.globex.pk, 'first_name': 'Cy', 'last_name': 'Cole', 'email': 'not-an-email'},
+            'nope',
+            {'account': str(self.globex.pk), 'first_name': 'Di', 'last_name': 'Dee', 'email': 'di@globex.com'},
+        ]
+        with self.assertNumQueries(4):
+            # accounts, then one insert wrapped in a savepoint
+            response = self.client.post(reverse('crm:contact-bulk'), {'records': rows}, format='json', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['errors']), (2, 3))
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['created', 'error', 'error', 'error', 'created'])
+        self.assertIn('account', results[1]['errors'])
+        self.assertIn('email', results[2]['errors'])
+        contacts = Contact.objects.order_by('pk')
+        self.assertEqual([c.pk for c in contacts], [results[0]['id'], results[4]['id']])
+        self.assertEqual({c.owner for c in contacts}, {self.user})
+        self.assertEqual(contacts[1].account, self.globex)
+
+        response = self.client.post(
+            reverse('crm:account-bulk'), [{'name': 'Initech'}], format='json', secure=True
+        )
+        self.assertEqual(Account.objects.get(pk=response.data['results'][0]['id']).account_owner, self.user)
+        self.assertEqual(get_dashboard_metrics(), compute_dashboard_metrics())
+
+    def test_bulk_update_applies_partial_rows(self):
+        """Test rows update the named records, bump modified_date and keep metrics current."""
+        deals = [
+            Opportunity.objects.create(
+                name=f'Deal {i}', account=self.acme, amount=Decimal('100.00'), stage='prospecting',
+                close_date='2026-12-01', owner=self.user
+            )
+            for i in range(2)
+        ]
+        before = deals[0].modified_date
+        rows = [
+            {'id': deals[0].pk, 'stage': 'closed_won', 'amount': '250.00'},
+            {'id': deals[1].pk, 'account': self.globex.pk},
+            {'id': deals[1].pk, 'name': 'Again'},
+            {'id': 999999, 'name': 'Ghost'},
+            {'name': 'No id'},
+            {'id': deals[0].pk, 'amount': 'lots'},
+        ]
+        response = self.client.patch(reverse('crm:opportunity-bulk'), rows, format='json', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.data['results']],
+                         ['updated', 'updated', 'error', 'error', 'error', 'error'])
+        self.assertEqual([r['index'] for r in response.data['results']], list(range(6)))
+        deals[0].refresh_from_db()
+        deals[1].refresh_from_db()
+        self.assertEqual((deals[0].stage, deals[0].amount, deals[0].name), ('closed_won', Decimal('250.00'), 'Deal 0'))
+        self.assertGreater(deals[0].modified_date, before)
+        self.assertEqual((deals[1].account, deals[1].name), (self.globex, 'Deal 1'))
+        self.assertEqual(get_dashboard_metrics(), compute_dashboard_metrics())
+
+    def test_bulk_writes_trigger_workflows(self):
+        """Test records created in bulk are evaluated against workflow rules."""
+        rule = WorkflowRule.objects.create(
+            name='Web leads', model_name='Lead', active=True, evaluation_criteria='created',
+            conditions='{"source": "Web"}'
+        )
+        WorkflowAction.objects.create(
+            workflow_rule=rule, name='Follow up', action_type='task_creation', action_config='{"subject": "Call"}'
+        )
+        rows = [
+            {'first_name': 'Ann', 'last_name': 'A', 'email': 'ann@x.com', 'company': 'X', 'source': 'Web'},
+            {'first_name': 'Ben', 'last_name': 'B', 'email': 'ben@x.com', 'company': 'X', 'source': 'Referral'},
+        ]
+        response = self.client.post(reverse('crm:lead-bulk'), rows, format='json', secure=True)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(
+            list(WorkflowOutboxEntry.objects.values_list('record_id', flat=True)), [response.data['results'][0]['id']]
+        )
+        self.assertEqual(Lead.objects.filter(owner=self.user).count(), 2)
+
+    def test_bulk_delete(self):
+        """Test ids are deleted together, with unknown and repeated ids reported."""
+        response = self.client.delete(
+            reverse('crm:account-bulk'), {'ids': [self.acme.pk, 999999, self.acme.pk]}, format='json', secure=True
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.data['results']], ['deleted', 'error', 'error'])
+        self.assertEqual(list(Account.objects.all()), [self.globex])
+        self.assertEqual(get_dashboard_metrics(), compute_dashboard_metrics())
+
+    def test_rejects_empty_oversized_and_all_failed_batches(self):
+        """Test empty and oversized batches are refused and all-failed batches are a 400."""
+        url = reverse('crm:account-bulk')
+        self.assertEqual(self.client.post(url, [], format='json', secure=True).status_code, 400)
+        self.assertEqual(self.client.delete(url, {'ids': ['x']}, format='json', secure=True).status_code, 400)
+        with self.settings(CRM_BULK_MAX_ROWS=1):
+            rows = [{'name': 'A'}, {'name': 'B'}]
+            self.assertEqual(self.client.post(url, rows, format='json', secure=True).status_code, 400)
+        response = self.client.post(url, [{'website': 'x'}], format='json', secure=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], 1)
+        self.assertEqual(Account.objects.count(), 2)
@@ -0,0 +1,188 @@
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.urls import reverse
+from rest_framework.test import APIClient
+from crm.models import Account, CustomField, CustomFieldValue
+from datetime import date
+from decimal import Decimal
+
+class TypedCustomFieldValueTest(TestCase):
+    """Test cases for typed, indexed custom field value storage."""
+
+    def setUp(self):
+        """Create custom fields of several types on Account."""
+        self.user = User.objects.create_user(username='admin', password='pass')
+        self.accounts = [Account.objects.create(name=f'Account {i}', account_owner=self.user) for i in range(3)]
+        self.score = CustomField.objects.create(name='score', label='Score', field_type='number', model_name='Account')
+        self.renewal = CustomField.objects.create(name='renewal', label='Renewal', field_type='date', model_name='Account')
+        self.vip = CustomField.objects.create(name='vip', label='VIP', field_type='boolean', model_name='Account')
+        self.tier = CustomField.objects.create(
+            name='tier', label='Tier', field_type='picklist', model_name='Account',
+            picklist_values='["Gold", "Silver"]'
+        )
+
+    def test_save_fills_typed_columns(self):
+        """Test saving a value parses it into the column for its type."""
+        account = self.accounts[0]
+        score = CustomFieldValue.objects.create(custom_field=self.score, record_id=account.pk, value='81.5')
+        renewal = CustomFieldValue.objects.create(custom_field=self.renewal, record_id=account.pk, value='2025-06-30')
+        vip = CustomFieldValue.objects.create(custom_field=self.vip, record_id=account.pk, value='yes')
+        score.refresh_from_db()
+        self.assertEqual(score.value_number, Decimal('81.5'))
+        self.assertIsNone(score.value_text)
+        self.assertEqual(score.content_type, ContentType.objects.get_for_model(Account))
+        self.assertEqual(score.record, account)
+        self.assertEqual(CustomFieldValue.objects.get(pk=renewal.pk).value_date, date(2025, 6, 30))
+        self.assertIs(CustomFieldValue.objects.get(pk=vip.pk).value_boolean, True)
+
+        score.value = '42'
+        score.save(update_fields=['value'])
+        self.assertEqual(CustomFieldValue.objects.get(pk=score.pk).value_number, Decimal('42'))
+
+    def test_range_query_on_typed_column(self):
+        """Test numeric range filters and ordering run on the typed column."""
+        for account, value in zip(self.accounts, ['95', '79.99', '120']):
+            CustomFieldValue.objects.create(custom_field=self.score, record_id=account.pk, value=value)
+        high = CustomFieldValue.objects.filter(custom_field=self.score, value_number__gt=80).order_by('value_number')
+        self.assertEqual([v.value for v in high], ['95', '120'])
+
+    def test_api_validates_value_type(self):
+        """Test the API rejects values that do not parse for the field type."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('crm:customfieldvalue-list')
+        record_id = self.accounts[0].pk
+        response = client.post(url, {'custom_field': self.score.pk, 'record_id': record_id, 'value': 'high'}, secure=True)
+        self.assertEqual(response.status_code, 400)
+        response = client.post(url, {'custom_field': self.tier.pk, 'record_id': record_id, 'value': 'Bronze'}, secure=True)
+        self.assertEqual(response.status_code, 400)
+        response = client.post(url, {'custom_field': self.score.pk, 'record_id': record_id, 'value': '88'}, secure=True)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.data['value_number']), Decimal('88'))
+
+class CustomFieldApiTest(TestCase):
+    """Test cases for custom field filtering, ordering and inlining on record endpoints."""
+
+    def setUp(self):
+        """Create accounts with score and tier custom field values."""
+        self.user = User.objects.create_user(username='admin', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('crm:account-list')
+        score = CustomField.objects.create(name='score', label='Score', field_type='number', model_name='Account')
+        tier = CustomField.objects.create(name='tier', label='Tier', field_type='text', model_name='Account')
+        self.accounts = {}
+        for name, score_value, tier_value in [('Low', '40', 'Bronze'), ('Mid', '80', 'Silver'), ('High', '95', 'Gold')]:
+            account = Account.objects.create(name=name, account_owner=self.user)
+            CustomFieldValue.objects.create(custom_field=score, record_id=account.pk, value=score_value)
+            CustomFieldValue.objects.create(custom_field=tier, record_id=account.pk, value=tier_value)
+            self.accounts[name] = account
+        Account.objects.create(name='Blank', account_owner=self.user)
+
+    def names(self, params):
+        response = self.client.get(self.url, params, secure=True)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [item['name'] for item in response.data['results']]
+
+    def test_filter_by_custom_field(self):
+        """Test ?cf.<name> filters with typed lookups."""
+        self.assertEqual(sorted(self.names({'cf.score__gt': '80'})), ['High'])
+        self.assertEqual(sorted(self.names({'cf.score__gte': '80'})), ['High', 'Mid'])
+        self.assertEqual(self.names({'cf.tier': 'Gold'}), ['High'])
+        self.assertEqual(sorted(self.names({'cf.tier__in': 'Gold,Bronze'})), ['High', 'Low'])
+        self.assertEqual(self.names({'cf.score__isnull': 'true'}), ['Blank'])
+
+    def test_invalid_custom_field_filters(self):
+        """Test unknown fields, lookups and unparseable values return 400."""
+        for params in [{'cf.nope': '1'}, {'cf.score__regex': '1'}, {'cf.score__gt': 'lots'}, {'cf.score__icontains': '1'}]:
+            response = self.client.get(self.url, params, secure=True)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_order_by_custom_field(self):
+        """Test ?ordering=cf.<name> sorts by the typed value with nulls last."""
+        self.assertEqual(self.names({'ordering': 'cf.score'}), ['Low', 'Mid', 'High', 'Blank'])
+        self.assertEqual(self.names({'ordering': '-cf.score'}), ['High', 'Mid', 'Low', 'Blank'])
+        self.assertEqual(self.names({'ordering': 'cf.tier,name'})[:3], ['Low', 'High', 'Mid'])
+
+    def test_inline_custom_fields_in_one_query(self):
+        """Test ?custom_fields=true inlines values with one extra query per page."""
+        with CaptureQueriesContext(connection) as plain:
+            response = self.client.get(self.url, {'ordering': 'name'}, secure=True)
+        self.assertNotIn('custom_fields', response.data['results'][0])
+
+        with self.assertNumQueries(len(plain) + 1):
+            response = self.client.get(self.url, {'custom_fields': 'true', 'ordering': 'name'}, secure=True)
+        results = {item['name']: item for item in response.data['results']}
+        self.assertEqual(results['High']['custom_fields'], {'score': Decimal('95'), 'tier': 'Gold'})
+        self.assertEqual(results['Blank']['custom_fields'], {})
+
+class CustomFieldValueBulkUpsertTest(TestCase):
+    """Test cases for the bulk custom field value upsert endpoint."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('crm:customfieldvalue-bulk')
+        self.accounts = [Account.objects.create(name=f'Account {i}', account_owner=self.user) for i in range(3)]
+        self.score = CustomField.objects.create(name='score', label='Score', field_type='number', model_name='Account')
+        self.tier = CustomField.objects.create(
+            name='tier', label='Tier', field_type='picklist', model_name='Account',
+            picklist_values='["Gold", "Silver"]'
+        )
+
+    def test_bulk_upsert_inserts_and_updates(self):
+        """Test new rows are inserted and existing ones updated in place."""
+        first, second, third = (account.pk for account in self.accounts)
+        CustomFieldValue.objects.create(custom_field=self.score, record_id=first, value='10')
+        values = [
+            [self.score.pk, first, 90],
+            {'custom_field': self.score.pk, 'record_id': second, 'value': '75.5'},
+            [self.tier.pk, third, 'Gold'],
+        ]
+        with self.assertNumQueries(5):
+            # custom fields, accounts, then one upsert wrapped in a savepoint
+            response = self.client.post(self.url, {'values': values}, format='json', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['upserted'], 3)
+        self.assertEqual(CustomFieldValue.objects.count(), 3)
+        updated = CustomFieldValue.objects.get(custom_field=self.score, record_id=first)
+        self.assertEqual(updated.value, '90')
+        self.assertEqual(updated.value_number, Decimal('90'))
+        self.assertEqual(CustomFieldValue.objects.get(custom_field=self.tier).value_text, 'Gold')
+
+    def test_bulk_upsert_reports_row_errors(self):
+        """Test invalid rows are reported individually and valid rows still written."""
+        first = self.accounts[0].pk
+        values = [
+            [self.score.pk, first, 'lots'],
+            [self.tier.pk, first, 'Bronze'],
+            [self.score.pk, 999999, '1'],
+            [424242, first, '1'],
+            ['x', first, '1'],
+            [self.score.pk, first, '5'],
+            [self.score.pk, first, '6'],
+        ]
+        response = self.client.post(self.url, values, format='json', secure=True)
+        self.assertEqual(response.status_code, 200)
+        statuses = [(r['status'], sorted(r.get('errors', {}))) for r in response.data['results']]
+        self.assertEqual(statuses, [
+            ('error', ['value']),
+            ('error', ['value']),
+            ('error', ['record_id']),
+            ('error', ['custom_field']),
+            ('error', ['custom_field']),
+            ('upserted', []),
+            ('error', ['non_field_errors']),
+        ])
+        self.assertEqual(CustomFieldValue.objects.get().value, '5')
+
+    def test_bulk_upsert_rejects_oversized_and_empty_batches(self):
+        """Test empty batches and batches over the row limit are rejected."""
+        self.assertEqual(self.client.post(self.url, [], format='json', secure=True).status_code, 400)
+        with self.settings(CRM_BULK_MAX_ROWS=1):
+            values = [[self.score.pk, a.pk, '1'] for a in self.accounts]
+            self.assertEqual(self.client.post(self.url, values, format='json', secure=True).status_code, 400)
@@ -0,0 +1,117 @@
+from django.test import TestCase
+from django.core.management import CommandError, call_command
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from crm.metrics import compute_dashboard_metrics, get_dashboard_metrics
+from crm.models import Account, DashboardMetrics, Lead, Opportunity, Task
+from io import StringIO
+from datetime import timedelta
+from decimal import Decimal
+
+class DashboardMetricsTest(TestCase):
+    """Test cases for the incrementally maintained dashboard snapshot."""
+
+    def setUp(self):
+        """Seed a few records and build the snapshot."""
+        self.user = User.objects.create_user(username='metrics', password='pass')
+        self.account = Account.objects.create(name='Acme Corp', account_owner=self.user)
+        Opportunity.objects.create(
+            name='Acme Deal', account=self.account, amount=Decimal('1000.00'),
+            stage='prospecting', close_date=timezone.now().date(), owner=self.user
+        )
+        Lead.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com', company='Lee Co')
+        get_dashboard_metrics()
+
+    def assertSnapshotIsLive(self):
+        self.assertEqual(get_dashboard_metrics(), compute_dashboard_metrics())
+
+    def test_snapshot_built_on_first_read(self):
+        """Test the snapshot row matches live queries after a rebuild."""
+        self.assertEqual(DashboardMetrics.objects.count(), 1)
+        metrics = get_dashboard_metrics()
+        self.assertEqual(metrics['total_accounts'], 1)
+        self.assertEqual(metrics['open_opportunities_count'], 1)
+        self.assertEqual(metrics['total_opportunity_value'], Decimal('1000.00'))
+        self.assertSnapshotIsLive()
+
+    def test_snapshot_read_is_single_query(self):
+        """Test a fresh snapshot is served from one row."""
+        with self.assertNumQueries(1):
+            get_dashboard_metrics()
+
+    def test_saves_update_snapshot(self):
+        """Test creates and edits move the snapshot like live queries."""
+        account = Account.objects.create(name='Globex', account_owner=self.user)
+        opp = Opportunity.objects.create(
+            name='Globex Deal', account=account, amount='250.50',
+            stage='qualification', close_date=timezone.now().date(), owner=self.user
+        )
+        self.assertSnapshotIsLive()
+
+        opp.amount = Decimal('300.00')
+        opp.save()
+        self.assertSnapshotIsLive()
+
+        opp.stage = 'closed_won'
+        opp.save()
+        self.assertSnapshotIsLive()
+
+        lead = Lead.objects.get()
+        lead.status = 'converted'
+        lead.save()
+        self.assertSnapshotIsLive()
+        self.assertEqual(get_dashboard_metrics()['converted_leads_count'], 1)
+
+    def test_task_metrics(self):
+        """Test due-today and overdue task counts follow task changes."""
+        now = timezone.now()
+        overdue = Task.objects.create(subject='Call back', due_date=now - timedelta(days=3), owner=self.user)
+        Task.objects.create(subject='Send quote', due_date=now, owner=self.user)
+        self.assertSnapshotIsLive()
+        self.assertEqual(get_dashboard_metrics()['overdue_tasks_count'], 1)
+
+        overdue.status = 'completed'
+        overdue.save(update_fields=['status'])
+        self.assertSnapshotIsLive()
+        self.assertEqual(get_dashboard_metrics()['overdue_tasks_count'], 0)
+
+    def test_deletes_update_snapshot(self):
+        """Test deletes, including cascades, are subtracted from the snapshot."""
+        Task.objects.create(subject='Review', due_date=timezone.now(), related_to_account=self.account)
+        self.account.delete()
+        self.assertSnapshotIsLive()
+        self.assertEqual(get_dashboard_metrics()['total_accounts'], 0)
+        self.assertEqual(get_dashboard_metrics()['open_opportunities_count'], 0)
+
+    def test_stale_snapshot_is_rebuilt(self):
+        """Test a snapshot from an earlier day is rebuilt on read."""
+        DashboardMetrics.objects.update(period=timezone.localdate() - timedelta(days=1), total_accounts=99)
+        self.assertEqual(get_dashboard_metrics()['total_accounts'], 1)
+        self.assertEqual(DashboardMetrics.objects.get().period, timezone.localdate())
+
+    def test_rebuild_command(self):
+        """Test the management command rebuilds and checks the snapshot."""
+        DashboardMetrics.objects.update(total_accounts=42)
+        stdout = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_dashboard_metrics', '--check', stdout=stdout)
+        self.assertIn('total_accounts: snapshot=42 live=1', stdout.getvalue())
+
+        call_command('rebuild_dashboard_metrics', stdout=stdout)
+        self.assertIn('Successfully rebuilt dashboard metrics', stdout.getvalue())
+        self.assertEqual(DashboardMetrics.objects.get().total_accounts, 1)
+        call_command('rebuild_dashboard_metrics', '--check', stdout=stdout)
+        self.assertIn('Snapshot matches live metrics', stdout.getvalue())
+
+        DashboardMetrics.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_dashboard_metrics', '--check', stdout=stdout)
+
+    def test_dashboard_view_uses_snapshot(self):
+        """Test the dashboard page renders the snapshot metrics."""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('crm:dashboard'), secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_accounts'], 1)
+        self.assertEqual(response.context['open_opportunities_count'], 1)
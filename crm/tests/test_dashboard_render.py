@@ -0,0 +1,129 @@
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from crm.dashboards import render_dashboard
+from crm.models import Account, Dashboard, DashboardComponent, Opportunity, Report
+from crm.reports import compile_report
+from unittest import mock
+from decimal import Decimal
+
+def create_dashboard(user):
+    """Create a dashboard with three components over two reports and one broken report."""
+    account = Account.objects.create(name='Acme Corp', account_owner=user)
+    for stage, amount in [('prospecting', '100.00'), ('negotiation', '300.00')]:
+        Opportunity.objects.create(
+            name=f'Acme {stage}', account=account, amount=Decimal(amount),
+            stage=stage, close_date=timezone.now().date(), owner=user
+        )
+    by_stage = Report.objects.create(
+        name='By stage', report_type='summary', model_name='Opportunity',
+        fields='["sum:amount"]', grouping_fields='["stage"]', owner=user
+    )
+    accounts = Report.objects.create(
+        name='Accounts', report_type='tabular', model_name='Account', fields='["name"]', owner=user
+    )
+    broken = Report.objects.create(
+        name='Broken', report_type='tabular', model_name='Account', fields='["nope"]', owner=user
+    )
+    dashboard = Dashboard.objects.create(name='Sales', owner=user, is_public=True)
+    DashboardComponent.objects.create(dashboard=dashboard, title='Pipeline bar', report=by_stage, chart_type='bar', position=0)
+    DashboardComponent.objects.create(
+        dashboard=dashboard, title='Pipeline pie', report=by_stage, chart_type='pie', position=1,
+        chart_config='{"legend": true}'
+    )
+    DashboardComponent.objects.create(dashboard=dashboard, title='Accounts', report=accounts, chart_type='table', position=2)
+    DashboardComponent.objects.create(dashboard=dashboard, title='Broken', report=broken, chart_type='table', position=3)
+    return dashboard
+
+class DashboardRenderTest(TestCase):
+    """Test cases for batched dashboard rendering."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='viewer', password='pass')
+        self.dashboard = create_dashboard(self.user)
+
+    def test_each_report_runs_once(self):
+        """Test components sharing a report reuse one execution."""
+        # One query for the components, one per distinct valid report.
+        with self.assertNumQueries(3):
+            payload = render_dashboard(self.dashboard)
+        self.assertEqual(payload['reports_executed'], 3)
+        bar, pie, accounts, broken = payload['components']
+        self.assertEqual(bar['rows'], pie['rows'])
+        self.assertEqual(pie['chart_config'], {'legend': True})
+        self.assertEqual(accounts['rows'], [['Acme Corp']])
+        self.assertIn('error', broken)
+
+    def test_component_errors_stay_per_component(self):
+        """Test bad chart configs and failing reports only fail their own component."""
+        DashboardComponent.objects.filter(title='Pipeline pie').update(chart_config='{not json')
+        payload = render_dashboard(self.dashboard)
+        bar, pie, accounts, broken = payload['components']
+        self.assertIn('Invalid chart_config', pie['error'])
+        self.assertNotIn('error', bar)
+
+        def failing(report, *args, **kwargs):
+            if report.name == 'Accounts':
+                raise RuntimeError('boom')
+            return compile_report(report, *args, **kwargs)
+
+        with mock.patch('crm.dashboards.compile_report', failing), self.assertLogs('crm.dashboards', 'ERROR'):
+            payload = render_dashboard(self.dashboard)
+        self.assertEqual(payload['components'][2]['error'], 'The report could not be run')
+        self.assertIn('rows', payload['components'][0])
+
+    def test_rows_are_capped(self):
+        """Test reports return at most CRM_DASHBOARD_MAX_ROWS rows."""
+        Account.objects.create(name='Globex', account_owner=self.user)
+        with self.settings(CRM_DASHBOARD_MAX_ROWS=1):
+            accounts = render_dashboard(self.dashboard)['components'][2]
+        self.assertEqual((len(accounts['rows']), accounts['truncated']), (1, True))
+        accounts = render_dashboard(self.dashboard)['components'][2]
+        self.assertEqual((len(accounts['rows']), accounts['truncated']), (2, False))
+
+    def test_render_endpoint(self):
+        """Test the render endpoint returns all chart data in one payload."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse('crm:dashboard-render', args=[self.dashboard.pk]), secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['title'] for c in response.data['components']],
+                         ['Pipeline bar', 'Pipeline pie', 'Accounts', 'Broken'])
+
+    def test_private_reports_of_other_users_are_not_run(self):
+        """Test components over another user's private report fail and cannot be attached."""
+        other = User.objects.create_user(username='other', password='pass')
+        secret = Report.objects.create(
+            name='Secret', report_type='tabular', model_name='Account', fields='["name"]', owner=other
+        )
+        mine = Dashboard.objects.create(name='Mine', owner=self.user)
+        DashboardComponent.objects.create(dashboard=mine, title='Leak', report=secret, chart_type='table', position=0)
+        payload = render_dashboard(mine, user=self.user)
+        self.assertEqual(payload['components'][0]['error'], 'Report not found')
+        self.assertNotIn('rows', payload['components'][0])
+        self.assertEqual(payload['reports_executed'], 0)
+        self.assertIn('rows', render_dashboard(mine, user=other)['components'][0])
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        data = {'dashboard': mine.pk, 'title': 'Leak', 'report': secret.pk, 'chart_type': 'table'}
+        response = client.post(reverse('crm:dashboardcomponent-list'), data, format='json', secure=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('report', response.data)
+        secret.is_public = True
+        secret.save()
+        response = client.post(reverse('crm:dashboardcomponent-list'), data, format='json', secure=True)
+        self.assertEqual(response.status_code, 201)
+
+class ConcurrentDashboardRenderTest(TransactionTestCase):
+    """Test rendering distinct reports on the thread pool."""
+
+    def test_concurrent_matches_sequential(self):
+        user = User.objects.create_user(username='viewer', password='pass')
+        dashboard = create_dashboard(user)
+        self.assertEqual(
+            render_dashboard(dashboard, concurrent=True, max_workers=2),
+            render_dashboard(dashboard),
+        )
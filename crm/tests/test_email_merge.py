@@ -0,0 +1,84 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.test import APIClient
+from crm.merge import MergeTemplateError, compile_template, merge_template
+from crm.models import Account, Contact, EmailTemplate
+import json
+
+class EmailMergeTest(TestCase):
+    """Test cases for the compiled EmailTemplate merge engine."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='rep', password='pass', email='rep@ourco.com')
+        self.acme = Account.objects.create(name='Acme & Sons', account_owner=self.user)
+        self.ada = Contact.objects.create(
+            account=self.acme, first_name='Ada', last_name='Lovelace', email='ada@acme.com', owner=self.user
+        )
+        self.bob = Contact.objects.create(account=self.acme, first_name='Bob', last_name='{x}', email='bob@acme.com')
+        self.template = EmailTemplate.objects.create(
+            name='Intro', model_name='Contact', owner=self.user, is_html=True,
+            subject='Hi {{first_name}} from {{ account.name }}',
+            body='<p>Dear {{ first_name }} {{ last_name }},</p><p>{{ owner.email }} at {literal}</p>',
+            available_merge_fields=json.dumps(['first_name', 'last_name', 'account.name', 'owner.email']),
+        )
+
+    def test_merges_related_fields_in_one_query(self):
+        """Test every record merges from one query, escaping values in HTML bodies only."""
+        compile_template(self.template)
+        with self.assertNumQueries(1):
+            messages = list(merge_template(self.template))
+        self.assertEqual(messages[0], (
+            self.ada.pk, 'Hi Ada from Acme & Sons',
+            '<p>Dear Ada Lovelace,</p><p>rep@ourco.com at {literal}</p>',
+        ))
+        self.assertEqual(messages[1].subject, 'Hi Bob from Acme & Sons')
+        self.assertEqual(messages[1].body, '<p>Dear Bob {x},</p><p> at {literal}</p>')
+        self.assertEqual(
+            compile_template(self.template).lookups, ('first_name', 'account__name', 'last_name', 'owner__email')
+        )
+
+        self.template.is_html = False
+        message = next(merge_template(self.template, Contact.objects.filter(pk=self.ada.pk)))
+        self.assertEqual(message.body, '<p>Dear Ada Lovelace,</p><p>rep@ourco.com at {literal}</p>')
+
+    def test_plans_are_cached_until_the_template_changes(self):
+        """Test compiling the same template text twice reuses the plan."""
+        plan = compile_template(self.template)
+        self.assertIs(compile_template(EmailTemplate.objects.get(pk=self.template.pk)), plan)
+        self.template.subject = 'Hello {{ first_name }}'
+        self.assertIsNot(compile_template(self.template), plan)
+
+    def test_rejects_unmergeable_fields(self):
+        """Test unknown, unlisted, relation and private user fields are refused."""
+        cases = {
+            '{{ nickname }}': "Unknown field 'nickname'",
+            '{{ email }}': "'email' is not one of the template's merge fields",
+            '{{ account }}': "'account' is a relation",
+            '{{ owner.password }}': "'owner.password' is not reportable",
+        }
+        self.template.subject = 'Hi'
+        for body, message in cases.items():
+            self.template.body = body
+            self.template.available_merge_fields = '["first_name"]' if body == '{{ email }}' else ''
+            with self.subTest(body=body), self.assertRaisesMessage(MergeTemplateError, message):
+                compile_template(self.template)
+
+    def test_merge_endpoint_streams_selected_records(self):
+        """Test the API streams merged messages for the requested records."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('crm:emailtemplate-merge', args=[self.template.pk])
+        response = client.post(url, {'ids': [self.bob.pk, self.ada.pk]}, format='json', secure=True)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(data['template'], self.template.pk)
+        self.assertEqual([m['record_id'] for m in data['messages']], [self.ada.pk, self.bob.pk])
+
+        response = client.post(url, {'filters': {'first_name__startswith': 'B'}}, format='json', secure=True)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([m['subject'] for m in data['messages']], ['Hi Bob from Acme & Sons'])
+        response = client.post(url, {'filters': {'password': 'x'}}, format='json', secure=True)
+        self.assertEqual(response.status_code, 400)
+        response = client.post(url, [self.ada.pk], format='json', secure=True)
+        self.assertEqual(response.status_code, 400)
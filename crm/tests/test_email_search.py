@@ -0,0 +1,122 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from crm.models import Account, EmailCommunication, EmailRecipient
+from crm.search import fts5_query
+
+class EmailSearchTest(TestCase):
+    """Test cases for full-text search over email communications."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='rep', password='pass')
+        self.acme = Account.objects.create(name='Acme', account_owner=self.user)
+        self.globex = Account.objects.create(name='Globex', account_owner=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('crm:emailcommunication-search')
+
+    def email(self, subject, body='', account=None, sender='rep@example.com', recipients='buyer@acme.com'):
+        return EmailCommunication.objects.create(
+            account=account or self.acme, direction='outbound', subject=subject, body=body,
+            sent_date=timezone.now(), sender=sender, recipients=recipients, owner=self.user
+        )
+
+    def search(self, **params):
+        response = self.client.get(self.url, params, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_ranks_subject_matches_first(self):
+        """Test every term must match and subject hits outrank body hits."""
+        in_body = self.email('Quarterly check-in', 'Can we schedule the contract review next week?')
+        in_subject = self.email('Contract review', 'Agenda attached.')
+        self.email('Contract signed', 'All done.')
+        self.assertEqual(self.search(q='contract review'), [in_subject.pk, in_body.pk])
+        response = self.client.get(self.url, {'q': 'contract review'}, secure=True)
+        self.assertGreater(response.data['results'][0]['rank'], response.data['results'][1]['rank'])
+
+    def test_index_follows_writes(self):
+        """Test saves and deletes are reflected in the index straight away."""
+        email = self.email('Pricing', 'Draft proposal')
+        self.assertEqual(self.search(q='proposal'), [email.pk])
+        email.body = 'Final quote'
+        email.save()
+        self.assertEqual(self.search(q='proposal'), [])
+        self.assertEqual(self.search(q='quote'), [email.pk])
+        email.delete()
+        self.assertEqual(self.search(q='quote'), [])
+
+    def test_searches_addresses_and_scopes_to_account(self):
+        """Test sender and recipient addresses are searchable and ?account= scopes results."""
+        acme = self.email('Hello', recipients='ada@lovelace.dev, bob@acme.com')
+        globex = self.email('Hello', account=self.globex, sender='ada@lovelace.dev')
+        self.assertEqual(sorted(self.search(q='ada@lovelace.dev')), sorted([acme.pk, globex.pk]))
+        self.assertEqual(self.search(q='ada@lovelace.dev', account=self.globex.pk), [globex.pk])
+
+    def test_pages_with_cursor(self):
+        """Test results page by rank then id without repeats."""
+        expected = {self.email(f'Renewal {i}', 'renewal ' * (i % 3 + 1)).pk for i in range(12)}
+        seen = []
+        url = f'{self.url}?q=renewal&page_size=5'
+        while url:
+            response = self.client.get(url, secure=True)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 12)
+        self.assertEqual(set(seen), expected)
+
+    def test_query_syntax_is_escaped(self):
+        """Test user input cannot inject FTS syntax."""
+        self.email('Contract review')
+        self.assertEqual(fts5_query('contract" OR body:x rev*'), '"contract""" "OR" "body:x" "rev"*')
+        self.assertEqual(len(self.search(q='contract" OR')), 0)
+        self.assertEqual(len(self.search(q='rev*')), 1)
+        self.assertEqual(self.client.get(self.url, {'q': ' '}, secure=True).status_code, 400)
+
+class EmailRecipientIndexTest(TestCase):
+    """Test cases for the normalized sender and recipient index."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='rep', password='pass')
+        self.account = Account.objects.create(name='Acme', account_owner=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('crm:emailcommunication-list')
+
+    def email(self, sender, recipients):
+        return EmailCommunication.objects.create(
+            account=self.account, direction='outbound', subject='Hi', body='', sent_date=timezone.now(),
+            sender=sender, recipients=recipients, owner=self.user
+        )
+
+    def ids(self, **params):
+        response = self.client.get(self.url, params, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return sorted(item['id'] for item in response.data['results'])
+
+    def test_saves_keep_index_in_sync(self):
+        """Test addresses are normalized on save and stale ones removed on edit."""
+        email = self.email('Rep <Rep@OurCo.com>', 'Ada Lovelace <ADA@lovelace.dev>, bob@acme.com,  ')
+        self.assertEqual(
+            sorted(EmailRecipient.objects.filter(communication=email).values_list('address', 'role')),
+            [('ada@lovelace.dev', 'recipient'), ('bob@acme.com', 'recipient'), ('rep@ourco.com', 'sender')]
+        )
+        email.recipients = 'bob@acme.com, carol@acme.com'
+        email.save()
+        self.assertEqual(
+            sorted(EmailRecipient.objects.filter(
+                communication=email, role='recipient'
+            ).values_list('address', flat=True)),
+            ['bob@acme.com', 'carol@acme.com']
+        )
+
+    def test_recipient_and_participant_filters(self):
+        """Test ?recipient= matches recipients only and ?participant= either side."""
+        sent_to_ada = self.email('rep@ourco.com', 'ada@lovelace.dev')
+        from_ada = self.email('ada@lovelace.dev', 'rep@ourco.com')
+        self.email('rep@ourco.com', 'bob@acme.com')
+        self.assertEqual(self.ids(recipient='ADA@lovelace.dev'), [sent_to_ada.pk])
+        self.assertEqual(self.ids(participant='Ada <ada@lovelace.dev>'), sorted([sent_to_ada.pk, from_ada.pk]))
+        self.assertEqual(self.ids(recipient='nobody@example.com'), [])
@@ -0,0 +1,97 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from crm.follow_ups import follow_up_digest
+from crm.models import Account, EmailCommunication
+from datetime import timedelta
+from io import StringIO
+
+class FollowUpTest(TestCase):
+    """Test cases for the follow-up queue and digest."""
+
+    def setUp(self):
+        self.ada = User.objects.create_user(username='ada', password='pass', email='ada@ourco.com')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.account = Account.objects.create(name='Acme', account_owner=self.ada)
+        self.today = timezone.localdate()
+        self.client = APIClient()
+        self.client.force_authenticate(self.ada)
+        self.url = reverse('crm:emailcommunication-follow-ups')
+
+    def email(self, owner, days, subject='Check in', completed=False, required=True):
+        return EmailCommunication.objects.create(
+            account=self.account, direction='outbound', subject=subject, body='', sent_date=timezone.now(),
+            sender='rep@ourco.com', recipients='buyer@acme.com', owner=owner, requires_follow_up=required,
+            follow_up_date=self.today + timedelta(days=days), follow_up_completed=completed
+        )
+
+    def test_digest_groups_by_owner_in_one_query(self):
+        """Test counts cover every open follow-up while items stop at the limit."""
+        late = [self.email(self.ada, -3), self.email(self.ada, -1)]
+        soon = self.email(self.ada, 2)
+        self.email(self.ada, 30)
+        self.email(self.ada, -5, completed=True)
+        self.email(self.ada, -5, required=False)
+        bob_late = self.email(self.bob, -2)
+        unowned = self.email(None, 1)
+
+        with self.assertNumQueries(1):
+            digest = follow_up_digest(today=self.today, days=7, limit=2)
+            [entry.owner for entry in digest]
+        self.assertEqual([entry.owner_id for entry in digest], [self.ada.pk, self.bob.pk, None])
+        ada, bob, nobody = digest
+        self.assertEqual((ada.overdue, ada.upcoming), (2, 1))
+        self.assertEqual([item.pk for item in ada.items], [late[0].pk, late[1].pk])
+        self.assertEqual((bob.overdue, bob.upcoming, [i.pk for i in bob.items]), (1, 0, [bob_late.pk]))
+        self.assertEqual([item.pk for item in nobody.items], [unowned.pk])
+        digest = follow_up_digest(today=self.today, days=7, limit=5, owner_ids=[self.ada.pk])
+        self.assertEqual([item.pk for item in digest[0].items], [late[0].pk, late[1].pk, soon.pk])
+
+    def test_queue_pages_by_due_date(self):
+        """Test the queue defaults to the caller and filters by due state."""
+        late = self.email(self.ada, -1)
+        soon = [self.email(self.ada, days) for days in (0, 3, 3, 6)]
+        self.email(self.ada, 10)
+        self.email(self.bob, -1)
+
+        seen = []
+        url = f'{self.url}?page_size=2'
+        while url:
+            response = self.client.get(url, secure=True)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, [late.pk] + [email.pk for email in soon])
+
+        response = self.client.get(self.url, {'due': 'overdue'}, secure=True)
+        self.assertEqual([item['id'] for item in response.data['results']], [late.pk])
+        self.assertTrue(response.data['results'][0]['is_follow_up_overdue'])
+        response = self.client.get(self.url, {'due': 'upcoming', 'days': 1}, secure=True)
+        self.assertEqual([item['id'] for item in response.data['results']], [soon[0].pk])
+        response = self.client.get(self.url, {'owner': self.bob.pk}, secure=True)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(self.client.get(self.url, {'due': 'later'}, secure=True).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'days': '99999999999'}, secure=True).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'days': '367'}, secure=True).status_code, 400)
+
+    def test_digest_command(self):
+        """Test the command prints every owner and emails those with an address."""
+        self.email(self.ada, -1, subject='Send the quote')
+        self.email(self.bob, 1)
+        out = StringIO()
+        call_command('follow_up_digest', stdout=out)
+        self.assertIn('ada: 1 overdue, 0 upcoming', out.getvalue())
+        self.assertIn('Acme: Send the quote', out.getvalue())
+        self.assertIn('bob: 0 overdue, 1 upcoming', out.getvalue())
+
+        call_command('follow_up_digest', '--send', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['ada@ourco.com'])
+        self.assertEqual(mail.outbox[0].subject, 'Follow-ups: 1 overdue, 0 upcoming')
+        with self.assertRaises(CommandError):
+            call_command('follow_up_digest', '--days', '99999999999', stdout=StringIO())
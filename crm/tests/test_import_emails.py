@@ -0,0 +1,128 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from crm.mail_import import iter_mbox
+from crm.models import Account, Contact, EmailCommunication
+from io import BytesIO, StringIO
+import os
+import tempfile
+
+MBOX = b"""From ada@lovelace.dev Mon Jan  6 09:00:00 2025
+From: Ada Lovelace <Ada@Lovelace.dev>
+To: rep@ourco.com
+Subject: Contract review
+Date: Mon, 06 Jan 2025 09:00:00 +0000
+Message-ID: <one@lovelace.dev>
+
+Can we go through the contract?
+>From the legal side it looks fine.
+
+From rep@ourco.com Mon Jan  6 10:00:00 2025
+From: rep@ourco.com
+To: Buyer <buyer@globex.com>, ada@lovelace.dev
+Subject: Re: Contract review
+Date: Mon, 06 Jan 2025 10:00:00 +0000
+Message-ID: <two@ourco.com>
+Content-Type: text/html; charset=utf-8
+
+<p>Sure, <b>Thursday</b>?</p>
+
+From ada@lovelace.dev Mon Jan  6 09:00:00 2025
+From: Ada Lovelace <ada@lovelace.dev>
+To: rep@ourco.com
+Subject: Contract review
+Date: Mon, 06 Jan 2025 09:00:00 +0000
+Message-ID: <ONE@lovelace.dev>
+
+Duplicate delivery.
+
+From stranger@nowhere.example Mon Jan  6 11:00:00 2025
+From: stranger@nowhere.example
+To: someone@else.example
+Subject: Spam
+Date: Mon, 06 Jan 2025 11:00:00 +0000
+
+Buy now.
+
+From broken@example.com Mon Jan  6 11:00:00 2025
+Subject: No sender or date
+
+Nothing.
+"""
+
+EML = b"""From: buyer@globex.com
+To: rep@ourco.com
+Subject: Purchase order
+Date: Tue, 07 Jan 2025 08:30:00 -0500
+
+PO attached.
+"""
+
+class ImportEmailsTest(TestCase):
+    """Test cases for the streaming mailbox importer."""
+
+    def setUp(self):
+        self.rep = User.objects.create_user(username='rep', password='pass', email='rep@ourco.com')
+        self.lovelace = Account.objects.create(name='Lovelace Ltd', account_owner=self.rep)
+        self.globex = Account.objects.create(name='Globex', website='https://www.globex.com/', account_owner=self.rep)
+        self.ada = Contact.objects.create(
+            account=self.lovelace, first_name='Ada', last_name='Lovelace', email='ada@lovelace.dev', owner=self.rep
+        )
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        with open(os.path.join(self.tmp.name, 'archive.mbox'), 'wb') as fh:
+            fh.write(MBOX)
+        os.mkdir(os.path.join(self.tmp.name, 'eml'))
+        with open(os.path.join(self.tmp.name, 'eml', 'po.eml'), 'wb') as fh:
+            fh.write(EML)
+
+    def run_import(self, *args):
+        out = StringIO()
+        call_command('import_emails', self.tmp.name, '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_imports_and_matches_addresses(self):
+        """Test messages are matched to contacts and accounts and duplicates skipped."""
+        output = self.run_import()
+        self.assertIn('Imported 3 of 6 messages', output)
+        self.assertIn('1 duplicates, 1 without an account, 1 without a sender or date', output)
+        self.assertIn('msg/s', output)
+
+        inbound = EmailCommunication.objects.get(subject='Contract review')
+        self.assertEqual((inbound.direction, inbound.contact, inbound.account), ('inbound', self.ada, self.lovelace))
+        self.assertEqual(inbound.owner, self.rep)
+        self.assertIn('From the legal side', inbound.body)
+
+        reply = EmailCommunication.objects.get(subject='Re: Contract review')
+        self.assertEqual((reply.direction, reply.contact, reply.account), ('outbound', self.ada, self.lovelace))
+        self.assertEqual(reply.recipients, 'buyer@globex.com, ada@lovelace.dev')
+        self.assertEqual(reply.body, 'Sure, Thursday?')
+        self.assertEqual(
+            sorted(reply.participants.values_list('address', 'role')),
+            [('ada@lovelace.dev', 'recipient'), ('buyer@globex.com', 'recipient'), ('rep@ourco.com', 'sender')]
+        )
+
+        order = EmailCommunication.objects.get(subject='Purchase order')
+        self.assertEqual((order.account, order.contact), (self.globex, None))
+        self.assertEqual(order.sent_date.utcoffset().total_seconds(), 0)
+
+    def test_rerun_imports_nothing_new(self):
+        """Test a second run recognises every message already imported."""
+        self.run_import()
+        output = self.run_import('--default-account', str(self.globex.pk))
+        self.assertIn('Imported 1 of 6 messages', output)
+        self.assertEqual(EmailCommunication.objects.get(subject='Spam').account, self.globex)
+        self.assertEqual(EmailCommunication.objects.count(), 4)
+
+    def test_dry_run_writes_nothing(self):
+        """Test --dry-run reports without inserting."""
+        # The duplicate lands in a later batch than the original, and nothing
+        # was written for it to be checked against.
+        self.assertIn('would have imported 4 of 6', self.run_import('--dry-run'))
+        self.assertFalse(EmailCommunication.objects.exists())
+
+    def test_mbox_is_split_on_from_lines(self):
+        """Test only From_ lines after a blank line start a new message."""
+        messages = list(iter_mbox(BytesIO(MBOX)))
+        self.assertEqual(len(messages), 5)
+        self.assertEqual(messages[0]['Message-ID'], '<one@lovelace.dev>')
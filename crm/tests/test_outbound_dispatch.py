@@ -0,0 +1,207 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.test import APIClient
+from crm.dispatch import Endpoint, EndpointConfigError, OutboundDispatcher, endpoint_for, public_addresses
+from crm.models import Lead, WorkflowAction, WorkflowOutboxEntry, WorkflowRule
+from crm.outbox import claim_batch, process_batch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import socket
+from unittest import mock
+import threading
+import time
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server.lock:
+            server.requests.append((self.path, body))
+            server.client_ports.add(self.client_address[1])
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+        status = {'/fail': 503, '/bad': 400}.get(self.path, 200)
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+class StubServerMixin:
+    """Run a local HTTP/1.1 keep-alive server that records what it receives."""
+
+    def setUp(self):
+        super().setUp()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.client_ports = set()
+        self.server.in_flight = self.server.max_in_flight = 0
+        self.server.delay = 0
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.dispatcher = OutboundDispatcher(workers=8)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(self.dispatcher.close)
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.server.server_port}{path}'
+
+@override_settings(CRM_OUTBOUND_ALLOWED_HOSTS=['127.0.0.1'])
+class OutboundDispatcherTest(StubServerMixin, SimpleTestCase):
+    """Test cases for pooled, batched outbound delivery."""
+
+    def test_batches_and_reuses_connections(self):
+        """Test batch endpoints get several messages per request over kept-alive connections."""
+        endpoint = Endpoint(self.url('/hook'), batch_size=10, concurrency=2)
+        outcomes = self.dispatcher.send([(i, endpoint, {'n': i}) for i in range(95)])
+        self.assertEqual(outcomes, {i: ('done', '') for i in range(95)})
+        self.assertEqual(len(self.server.requests), 10)
+        received = sorted(m['n'] for _, body in self.server.requests for m in body['messages'])
+        self.assertEqual(received, list(range(95)))
+        self.assertLessEqual(len(self.server.client_ports), 2)
+
+        self.dispatcher.send([(i, endpoint, {'n': i}) for i in range(20)])
+        self.assertLessEqual(len(self.server.client_ports), 2)
+
+    def test_caps_concurrency_per_endpoint(self):
+        """Test no more than ``concurrency`` requests are in flight to one endpoint."""
+        self.server.delay = 0.02
+        endpoint = Endpoint(self.url('/hook'), concurrency=3)
+        self.dispatcher.send([(i, endpoint, {'n': i}) for i in range(24)])
+        self.assertEqual(len(self.server.requests), 24)
+        self.assertLessEqual(self.server.max_in_flight, 3)
+
+    def test_classifies_failures(self):
+        """Test 5xx and connection errors retry while other 4xx responses fail."""
+        outcomes = self.dispatcher.send([
+            ('fail', Endpoint(self.url('/fail')), {}),
+            ('bad', Endpoint(self.url('/bad')), {}),
+            ('down', Endpoint('http://127.0.0.1:9/hook', timeout=1), {}),
+        ])
+        self.assertEqual(outcomes['fail'], ('retry', 'HTTP 503'))
+        self.assertEqual(outcomes['bad'], ('failed', 'HTTP 400'))
+        self.assertEqual(outcomes['down'][0], 'retry')
+
+    def test_unsendable_requests_fail_only_their_endpoint(self):
+        """Test bad ports and header values dead-letter their messages without stopping the others."""
+        outcomes = self.dispatcher.send([
+            ('port', Endpoint('http://127.0.0.1:99999/hook'), {}),
+            ('header', Endpoint(self.url('/hook'), headers=(('X-Token', 'a\nb'),)), {}),
+            ('ok', Endpoint(self.url('/hook')), {}),
+        ])
+        self.assertEqual(outcomes['port'][0], 'failed')
+        self.assertEqual(outcomes['header'][0], 'failed')
+        self.assertEqual(outcomes['ok'], ('done', ''))
+
+    @override_settings(CRM_OUTBOUND_ALLOWED_HOSTS=['example.com'])
+    def test_endpoint_config(self):
+        """Test endpoint configs are validated."""
+        self.assertEqual(endpoint_for({'url': 'https://example.com/h', 'batch_size': 5}).batch_size, 5)
+        for config in [{}, {'url': 'ftp://example.com'}, {'url': 'https://example.com', 'batch_size': 0},
+                       {'url': 'https://example.com', 'concurrency': 'many'}, {'url': 'https://example.com:99999/h'}]:
+            with self.assertRaises(EndpointConfigError):
+                endpoint_for(config)
+
+    @override_settings(CRM_OUTBOUND_ALLOWED_HOSTS=None)
+    def test_only_public_addresses_are_contacted(self):
+        """Test loopback, private and link-local destinations are refused before and after resolution."""
+        outcomes = self.dispatcher.send([('local', Endpoint(self.url('/hook')), {})])
+        self.assertEqual(outcomes['local'][0], 'failed')
+        self.assertIn('not a public address', outcomes['local'][1])
+        self.assertEqual(self.server.requests, [])
+        for url in ['http://10.0.0.5/h', 'http://169.254.169.254/latest', 'http://[::1]:8000/h']:
+            with self.assertRaises(EndpointConfigError):
+                endpoint_for({'url': url})
+        self.assertEqual(endpoint_for({'url': 'https://93.184.216.34/h'}).url, 'https://93.184.216.34/h')
+        internal = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('192.168.1.10', 443))]
+        with mock.patch('socket.getaddrinfo', return_value=internal):
+            with self.assertRaises(EndpointConfigError):
+                public_addresses('hooks.example.com', 443)
+
+    @override_settings(CRM_OUTBOUND_ALLOWED_HOSTS=['.example.com'])
+    def test_allowed_hosts_restrict_destinations(self):
+        """Test CRM_OUTBOUND_ALLOWED_HOSTS admits only the hosts it matches."""
+        self.assertEqual(endpoint_for({'url': 'https://hooks.example.com/h'}).url, 'https://hooks.example.com/h')
+        with self.assertRaises(EndpointConfigError):
+            endpoint_for({'url': 'https://example.org/h'})
+        outcomes = self.dispatcher.send([('local', Endpoint(self.url('/hook')), {})])
+        self.assertEqual(outcomes['local'][0], 'failed')
+        self.assertEqual(self.server.requests, [])
+
+@override_settings(CRM_OUTBOUND_ALLOWED_HOSTS=['127.0.0.1'])
+class OutboundOutboxTest(StubServerMixin, TestCase):
+    """Test cases for delivering outbox outbound messages through the dispatcher."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='admin', password='pass')
+        self.rule = WorkflowRule.objects.create(
+            name='Web leads', model_name='Lead', active=True,
+            evaluation_criteria='created', conditions='{"source": "Web"}'
+        )
+
+    def add_action(self, path, **config):
+        WorkflowAction.objects.create(
+            workflow_rule=self.rule, name=path, action_type='outbound_message',
+            action_config=json.dumps({'url': self.url(path), 'fields': ['email'], **config})
+        )
+
+    def create_leads(self, count):
+        for i in range(count):
+            Lead.objects.create(
+                first_name='Lead', last_name=str(i), email=f'lead{i}@example.com', company='Acme',
+                owner=self.user, source='Web'
+            )
+
+    def test_outbox_delivers_in_batches(self):
+        """Test claimed outbound entries are delivered together and dead-lettered on 4xx."""
+        self.add_action('/hook', batch_size=25)
+        self.add_action('/bad')
+        self.create_leads(30)
+        entries = self.claim()
+        self.assertEqual(len(entries), 60)
+        with self.assertNumQueries(3):
+            # leads, then one update for the delivered and one for the dead letters
+            counts = process_batch(entries, workers=1)
+        self.assertEqual(counts, {'done': 30, 'retry': 0, 'failed': 30})
+        hook_requests = [body for path, body in self.server.requests if path == '/hook']
+        self.assertEqual(len(hook_requests), 2)
+        emails = sorted(m['record']['email'] for body in hook_requests for m in body['messages'])
+        self.assertEqual(emails, sorted(f'lead{i}@example.com' for i in range(30)))
+        self.assertEqual(WorkflowOutboxEntry.objects.filter(status='done').count(), 30)
+        failed = WorkflowOutboxEntry.objects.filter(status='failed')
+        self.assertEqual(failed.count(), 30)
+        self.assertEqual(failed.first().last_error, 'HTTP 400')
+
+    @override_settings(CRM_OUTBOUND_ALLOWED_HOSTS=None)
+    def test_api_rejects_internal_destinations(self):
+        """Test outbound message urls are checked when the action is saved."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('crm:workflowaction-list')
+        for target in ['http://localhost:8000/hook', 'http://127.0.0.1/hook', 'http://example.com:99999/hook']:
+            data = {'workflow_rule': self.rule.pk, 'name': 'Hook', 'action_type': 'outbound_message',
+                    'action_config': json.dumps({'url': target})}
+            response = client.post(url, data, format='json', secure=True)
+            self.assertEqual(response.status_code, 400, target)
+            self.assertIn('action_config', response.data)
+        public = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('93.184.216.34', 443))]
+        with mock.patch('socket.getaddrinfo', return_value=public):
+            data['action_config'] = json.dumps({'url': 'https://hooks.example.com/lead'})
+            self.assertEqual(client.post(url, data, format='json', secure=True).status_code, 201)
+
+    def claim(self):
+        patcher = mock.patch('crm.outbox.outbound_dispatcher', self.dispatcher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return claim_batch()
@@ -0,0 +1,146 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from crm.cache import response_cache, visibility_cache
+from crm.models import (
+    Account, Contact, Lead, Opportunity, Task, CustomField, CustomFieldValue, Report, Dashboard,
+    DashboardComponent, EmailTemplate, WorkflowRule, WorkflowAction, ApprovalProcess, ApprovalStep,
+    ApprovalRequest, EmailCommunication
+)
+from crm.optimizer import related_lookups
+from crm.serializers import ApprovalProcessSerializer, TaskSerializer
+from decimal import Decimal
+
+# Queries per list page (COUNT + rows + one per prefetch + the owns-private
+# check of cached viewsets) and per retrieve (row + one per prefetch), for any
+# number of rows.
+BUDGETS = {
+    'account': (2, 1),
+    'contact': (2, 1),
+    'lead': (2, 1),
+    'opportunity': (2, 1),
+    'task': (2, 1),
+    'customfield': (2, 1),
+    'customfieldvalue': (2, 1),
+    'report': (3, 2),
+    'dashboard': (4, 3),
+    'dashboardcomponent': (2, 1),
+    'emailtemplate': (2, 1),
+    'workflowrule': (3, 2),
+    'workflowaction': (2, 1),
+    'approvalprocess': (4, 3),
+    'approvalstep': (3, 2),
+    'approvalrequest': (2, 1),
+    'emailcommunication': (2, 1),
+}
+
+@override_settings(CRM_RESPONSE_CACHE_ENABLED=True)
+class QueryBudgetTest(TestCase):
+    """Test cases for query counts of every list and retrieve endpoint."""
+
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='viewer', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        self.records = {}
+        self.populate(2)
+
+    def populate(self, count):
+        """Create ``count`` records of every model, each owned by its own user."""
+        start = len(self.records.get('account', []))
+        for i in range(start, start + count):
+            user = User.objects.create_user(username=f'user{i}', password='pass')
+            other = User.objects.create_user(username=f'other{i}', password='pass')
+            account = Account.objects.create(name=f'Account {i}', account_owner=user)
+            field = CustomField.objects.create(
+                name=f'field{i}', label='Field', field_type='text', model_name='Account', created_by=user
+            )
+            report = Report.objects.create(
+                name=f'Report {i}', report_type='tabular', model_name='Account', fields='["name"]', owner=user,
+                is_public=True
+            )
+            dashboard = Dashboard.objects.create(name=f'Dashboard {i}', owner=user, is_public=True)
+            rule = WorkflowRule.objects.create(
+                name=f'Rule {i}', model_name='Lead', evaluation_criteria='created', conditions='{}', owner=user
+            )
+            process = ApprovalProcess.objects.create(
+                name=f'Process {i}', model_name='Opportunity', entry_criteria='{}', owner=user
+            )
+            step = ApprovalStep.objects.create(
+                approval_process=process, name='Step', step_number=1, approval_type='first_response',
+                reject_behavior='{}', approval_actions='{}', rejection_actions='{}'
+            )
+            step.approvers.set([user, other])
+            created = {
+                'account': account,
+                'contact': Contact.objects.create(
+                    account=account, first_name='Ada', last_name=str(i), email=f'ada{i}@x.com', owner=user
+                ),
+                'lead': Lead.objects.create(
+                    first_name='Bob', last_name=str(i), email=f'bob{i}@x.com', company='X', owner=user
+                ),
+                'opportunity': Opportunity.objects.create(
+                    name=f'Deal {i}', account=account, amount=Decimal('10.00'), stage='prospecting',
+                    close_date=timezone.now().date(), owner=user
+                ),
+                'task': Task.objects.create(
+                    subject=f'Task {i}', due_date=timezone.now(), owner=user, related_to_account=account
+                ),
+                'customfield': field,
+                'customfieldvalue': CustomFieldValue.objects.create(
+                    custom_field=field, record_id=account.pk, value='x'
+                ),
+                'report': report,
+                'dashboard': dashboard,
+                'dashboardcomponent': DashboardComponent.objects.create(
+                    dashboard=dashboard, title='Chart', report=report, chart_type='table'
+                ),
+                'emailtemplate': EmailTemplate.objects.create(
+                    name=f'Template {i}', subject='Hi', body='Hello', model_name='Contact', owner=user,
+                    available_merge_fields='[]'
+                ),
+                'workflowrule': rule,
+                'workflowaction': WorkflowAction.objects.create(
+                    workflow_rule=rule, name='Alert', action_type='email_alert', action_config='{}'
+                ),
+                'approvalprocess': process,
+                'approvalstep': step,
+                'approvalrequest': ApprovalRequest.objects.create(
+                    approval_process=process, current_step=step, record_id=i, submitter=user
+                ),
+                'emailcommunication': EmailCommunication.objects.create(
+                    account=account, direction='outbound', subject='Hi', body='', sent_date=timezone.now(),
+                    sender='rep@ourco.com', recipients='ada@x.com', owner=user
+                ),
+            }
+            for name, record in created.items():
+                self.records.setdefault(name, []).append(record)
+
+    def assertQueries(self, budget, url, rows=None):
+        response_cache.clear()
+        visibility_cache.clear()
+        with self.assertNumQueries(budget):
+            response = self.client.get(url, {'page_size': 100}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        if rows is not None:
+            self.assertEqual(len(response.data['results']), rows)
+
+    def test_list_and_retrieve_stay_within_budget(self):
+        """Test every endpoint runs a fixed number of queries however many rows it returns."""
+        for name, (list_budget, retrieve_budget) in BUDGETS.items():
+            with self.subTest(endpoint=name, action='list'):
+                self.assertQueries(list_budget, reverse(f'crm:{name}-list'), rows=len(self.records[name]))
+            with self.subTest(endpoint=name, action='retrieve'):
+                self.assertQueries(retrieve_budget, reverse(f'crm:{name}-detail', args=[self.records[name][0].pk]))
+
+        self.populate(3)
+        for name, (list_budget, _) in BUDGETS.items():
+            with self.subTest(endpoint=name, action='list', rows=5):
+                self.assertQueries(list_budget, reverse(f'crm:{name}-list'), rows=len(self.records[name]))
+
+    def test_lookups_follow_nested_serializers(self):
+        """Test forward relations are joined and many-valued ones prefetched with their children."""
+        self.assertEqual(related_lookups(TaskSerializer), (('owner',), ()))
+        self.assertEqual(related_lookups(ApprovalProcessSerializer), (('owner',), ('steps', 'steps__approvers')))
@@ -0,0 +1,96 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from crm.models import Account, Opportunity, Report
+from crm.reports import ReportDefinitionError, compile_report
+from decimal import Decimal
+import json
+
+class ReportEngineTest(TestCase):
+    """Test cases for compiling and running report definitions."""
+
+    def setUp(self):
+        """Create opportunities across two accounts and stages."""
+        self.user = User.objects.create_user(username='reporter', password='pass')
+        acme = Account.objects.create(name='Acme Corp', account_owner=self.user)
+        globex = Account.objects.create(name='Globex', account_owner=self.user)
+        close_date = timezone.now().date()
+        for account, stage, amount in [
+            (acme, 'prospecting', '100.00'),
+            (acme, 'prospecting', '200.00'),
+            (acme, 'closed_won', '500.00'),
+            (globex, 'prospecting', '50.00'),
+        ]:
+            Opportunity.objects.create(
+                name=f'{account.name} {stage}', account=account, amount=Decimal(amount),
+                stage=stage, close_date=close_date, owner=self.user
+            )
+
+    def make_report(self, report_type, fields, filters=None, grouping_fields=None):
+        return Report.objects.create(
+            name='Pipeline', report_type=report_type, model_name='Opportunity',
+            fields=json.dumps(fields),
+            filters=json.dumps(filters) if filters is not None else '',
+            grouping_fields=json.dumps(grouping_fields) if grouping_fields is not None else '',
+            owner=self.user,
+        )
+
+    def test_tabular_report(self):
+        """Test tabular reports return filtered rows with related fields."""
+        report = self.make_report('tabular', ['name', 'account__name', 'amount'], {'amount__gte': 150})
+        compiled = compile_report(report)
+        self.assertEqual(compiled.columns, ['name', 'account__name', 'amount'])
+        rows = list(compiled.rows())
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0][1], 'Acme Corp')
+
+    def test_summary_report_aggregates_in_one_query(self):
+        """Test summary reports group and aggregate in a single query."""
+        report = self.make_report('summary', ['count', 'sum:amount'], grouping_fields=['stage'])
+        compiled = compile_report(report)
+        with self.assertNumQueries(1):
+            rows = list(compiled.rows())
+        self.assertEqual(compiled.columns, ['stage', 'record_count', 'sum_amount'])
+        self.assertEqual(rows, [('closed_won', 1, Decimal('500.00')), ('prospecting', 3, Decimal('350.00'))])
+
+    def test_matrix_report(self):
+        """Test matrix reports group by two fields."""
+        report = self.make_report('matrix', ['sum:amount'], grouping_fields=['account__name', 'stage'])
+        rows = list(compile_report(report).rows())
+        self.assertIn(('Acme Corp', 'prospecting', Decimal('300.00')), rows)
+        self.assertEqual(len(rows), 3)
+
+        report.grouping_fields = json.dumps(['stage'])
+        with self.assertRaises(ReportDefinitionError):
+            compile_report(report)
+
+    def test_invalid_fields_rejected(self):
+        """Test unknown fields, hidden user fields and bad lookups are rejected."""
+        for fields, filters in [
+            (['nope'], None),
+            (['owner__password'], None),
+            (['name'], {'amount__nope': 1}),
+            (['name'], {'amount__gte': 'abc'}),
+            (['sum:amount'], None),
+        ]:
+            report = self.make_report('tabular', fields, filters)
+            with self.assertRaises(ReportDefinitionError):
+                compile_report(report)
+
+    def test_run_endpoint_streams_rows(self):
+        """Test the run endpoint streams a JSON document."""
+        report = self.make_report('summary', ['sum:amount'], grouping_fields=['stage'])
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse('crm:report-run', args=[report.pk]), secure=True)
+        self.assertEqual(response.status_code, 200)
+        payload = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(payload['columns'], ['stage', 'sum_amount'])
+        rows = [(stage, Decimal(total)) for stage, total in payload['rows']]
+        self.assertEqual(rows, [('closed_won', Decimal('500')), ('prospecting', Decimal('350'))])
+
+        bad = self.make_report('summary', ['sum:amount'])
+        response = client.get(reverse('crm:report-run', args=[bad.pk]), secure=True)
+        self.assertEqual(response.status_code, 400)
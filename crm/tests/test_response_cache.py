@@ -0,0 +1,114 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.test import APIClient
+from crm.cache import LRUCache, response_cache, response_cache_enabled, visibility_cache
+from crm.models import Dashboard, DashboardComponent, Report
+
+@override_settings(CRM_RESPONSE_CACHE_ENABLED=True)
+class ResponseCacheTest(TestCase):
+    """Test cases for the version-invalidated report/dashboard response cache."""
+
+    def setUp(self):
+        """Create public and private dashboards for two users."""
+        response_cache.clear()
+        visibility_cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.admin = User.objects.create_superuser(username='admin', password='pass', email='admin@example.com')
+        self.public = Dashboard.objects.create(name='Wallboard', owner=self.alice, is_public=True)
+        self.private = Dashboard.objects.create(name='Alice only', owner=self.alice)
+        self.url = reverse('crm:dashboard-list')
+
+    def get(self, user, url=None):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(url or self.url, secure=True)
+
+    def names(self, response):
+        return sorted(item['name'] for item in response.data['results'])
+
+    def test_repeat_polls_are_served_from_cache(self):
+        """Test a second identical poll runs no list or serializer queries."""
+        self.get(self.bob)
+        with self.assertNumQueries(0):
+            response = self.get(self.bob)
+        self.assertEqual(self.names(response), ['Wallboard'])
+        self.assertEqual(response_cache.stats()['hits'], 1)
+
+    def test_users_without_private_objects_share_entries(self):
+        """Test users in the public visibility class share one entry."""
+        carol = User.objects.create_user(username='carol', password='pass')
+        self.get(self.bob)
+        self.get(carol)
+        self.assertEqual(response_cache.stats()['hits'], 1)
+
+    def test_owner_sees_private_objects(self):
+        """Test owners of private objects get their own entry."""
+        self.get(self.bob)
+        response = self.get(self.alice)
+        self.assertEqual(self.names(response), ['Alice only', 'Wallboard'])
+
+    def test_save_and_delete_invalidate(self):
+        """Test writes to dashboards and components bump the version."""
+        report = Report.objects.create(
+            name='Pipeline', report_type='tabular', model_name='Opportunity',
+            fields='["name"]', owner=self.alice
+        )
+        self.get(self.bob)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.public.name = 'Sales wallboard'
+            self.public.save()
+        self.assertEqual(self.names(self.get(self.bob)), ['Sales wallboard'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DashboardComponent.objects.create(dashboard=self.public, title='Pipeline', report=report, chart_type='bar')
+        response = self.get(self.bob)
+        self.assertEqual(len(response.data['results'][0]['components']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.public.delete()
+        self.assertEqual(self.names(self.get(self.bob)), [])
+
+    def test_owner_edits_invalidate(self):
+        """Test edits to nested users bump the version but logins do not."""
+        self.get(self.bob)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            self.get(self.bob)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice.email = 'alice@example.com'
+            self.alice.save()
+        response = self.get(self.bob)
+        self.assertEqual(response.data['results'][0]['owner']['email'], 'alice@example.com')
+
+    @override_settings(CRM_RESPONSE_CACHE_ENABLED=None)
+    def test_process_local_backend_disables_cache(self):
+        """Test responses are not cached with a backend other workers cannot see."""
+        self.get(self.bob)
+        self.get(self.bob)
+        self.assertEqual(response_cache.stats()['size'], 0)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'x'}}
+        with self.settings(CACHES=shared):
+            self.assertTrue(response_cache_enabled())
+
+    def test_lru_eviction(self):
+        """Test the LRU evicts the least recently used entry."""
+        lru = LRUCache(max_size=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(lru.stats()['evictions'], 1)
+
+    def test_stats_endpoint(self):
+        """Test cache counters are exposed to admins only."""
+        self.get(self.bob)
+        stats_url = reverse('crm:cache-stats')
+        self.assertEqual(self.get(self.bob, stats_url).status_code, 403)
+        response = self.get(self.admin, stats_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['misses'], 1)
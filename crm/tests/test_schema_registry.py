@@ -0,0 +1,127 @@
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from crm.cache import bump_version
+from crm.models import CustomField, Report, WorkflowAction, WorkflowRule
+from crm.registry import FrozenDict, SchemaRegistry, load_json, schema_registry, versions_in_database
+
+class LoadJsonTest(TestCase):
+    """Test cases for the shared JSON parser behind the model helpers."""
+
+    def test_parsed_values_are_frozen_and_shared(self):
+        """Test identical text is parsed once into an immutable structure."""
+        first = load_json('{"stage": ["Prospecting", "Closed Won"], "amount__gte": 1000}')
+        second = load_json('{"stage": ["Prospecting", "Closed Won"], "amount__gte": 1000}')
+        self.assertIs(first, second)
+        self.assertEqual(first, {'stage': ('Prospecting', 'Closed Won'), 'amount__gte': 1000})
+        self.assertIsInstance(first, dict)
+        with self.assertRaises(TypeError):
+            first['amount__gte'] = 0
+        self.assertEqual(load_json('', empty=[]), ())
+        self.assertEqual(load_json(None, empty={}), FrozenDict())
+
+    def test_model_helpers_use_shared_parser(self):
+        """Test the model get_* helpers return the cached parse."""
+        report = Report(fields='["name", "sum:amount"]', filters='', model_name='Opportunity')
+        self.assertIs(report.get_fields(), load_json('["name", "sum:amount"]'))
+        self.assertEqual(report.get_filters(), {})
+        self.assertEqual(CustomField(field_type='picklist', picklist_values='["A", "B"]').get_picklist_values(), ('A', 'B'))
+
+class SchemaRegistryTest(TestCase):
+    """Test cases for the process-wide schema registry."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass')
+        self.tier = CustomField.objects.create(
+            name='tier', label='Tier', field_type='picklist', model_name='Account',
+            picklist_values='["Gold", "Silver"]'
+        )
+        self.rule = WorkflowRule.objects.create(
+            name='Big deals', model_name='Opportunity', active=True,
+            evaluation_criteria='created', conditions='{"amount__gte": 100000}'
+        )
+        WorkflowAction.objects.create(
+            workflow_rule=self.rule, name='Alert', action_type='email_alert', action_config='{"to": "vp"}', order=2
+        )
+        WorkflowAction.objects.create(
+            workflow_rule=self.rule, name='Flag', action_type='field_update', action_config='{"field": "x"}', order=1
+        )
+        self.report = Report.objects.create(
+            name='Pipeline', report_type='summary', model_name='Opportunity', owner=self.user,
+            fields='["stage", "sum:amount"]', filters='{"amount__gt": 0}', grouping_fields='["stage"]'
+        )
+        schema_registry.invalidate()
+
+    def test_snapshot_is_parsed_once(self):
+        """Test metadata is loaded once and served from memory afterwards."""
+        with self.assertNumQueries(5):
+            snapshot = schema_registry.snapshot()
+        with self.assertNumQueries(0):
+            self.assertIs(schema_registry.snapshot(), snapshot)
+            fields = schema_registry.custom_fields('Account')
+            rules = schema_registry.workflow_rules('Opportunity')
+            report = schema_registry.report(self.report.pk)
+
+        self.assertEqual(fields['tier'].picklist_values, ('Gold', 'Silver'))
+        self.assertEqual(rules[0].conditions, {'amount__gte': 100000})
+        self.assertEqual([action.name for action in rules[0].actions], ['Flag', 'Alert'])
+        self.assertEqual(report.fields, ('stage', 'sum:amount'))
+        self.assertEqual(report.grouping_fields, ('stage',))
+        self.assertEqual(schema_registry.workflow_rules('Lead'), ())
+
+    def test_saves_invalidate_local_snapshot(self):
+        """Test saving schema metadata is visible to the next access."""
+        schema_registry.snapshot()
+        self.tier.picklist_values = '["Gold", "Silver", "Bronze"]'
+        self.tier.save()
+        self.assertEqual(schema_registry.custom_fields('Account')['tier'].picklist_values, ('Gold', 'Silver', 'Bronze'))
+        self.rule.delete()
+        self.assertEqual(schema_registry.workflow_rules('Opportunity'), ())
+
+    @override_settings(CRM_SCHEMA_VERSIONS='cache')
+    def test_other_processes_follow_the_version_stamp(self):
+        """Test a registry that saw no signal reloads once the version moves."""
+        registry = SchemaRegistry(check_interval=0)
+        registry.snapshot()
+        # A write made elsewhere: no local signal, only the shared version bump.
+        CustomField.objects.filter(pk=self.tier.pk).update(label='Level')
+        with self.assertNumQueries(0):
+            self.assertEqual(registry.custom_field(self.tier.pk).label, 'Tier')
+        bump_version(CustomField)
+        self.assertEqual(registry.custom_field(self.tier.pk).label, 'Level')
+
+        slow = SchemaRegistry(check_interval=3600)
+        slow.snapshot()
+        CustomField.objects.filter(pk=self.tier.pk).update(label='Rank')
+        bump_version(CustomField)
+        self.assertEqual(slow.custom_field(self.tier.pk).label, 'Level')
+
+    @override_settings(CRM_SCHEMA_VERSIONS='database')
+    def test_process_local_caches_follow_the_database_stamp(self):
+        """Test with database versions a registry reloads once a metadata write bumps the SchemaVersion row."""
+        registry = SchemaRegistry(check_interval=0)
+        registry.snapshot()
+        CustomField.objects.filter(pk=self.tier.pk).update(label='Level')
+        bump_version(CustomField)
+        with self.assertNumQueries(1):
+            self.assertEqual(registry.custom_field(self.tier.pk).label, 'Tier')
+        self.tier.label = 'Rank'
+        self.tier.save()
+        self.assertEqual(registry.custom_field(self.tier.pk).label, 'Rank')
+
+        with self.settings(CRM_SCHEMA_VERSIONS=None):
+            self.assertTrue(versions_in_database())
+            with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache'}}):
+                self.assertFalse(versions_in_database())
+
+class SchemaRegistryRollbackTest(TransactionTestCase):
+    """Test cases for registry snapshots read inside a transaction that rolls back."""
+
+    def test_rolled_back_writes_do_not_linger(self):
+        """Test a snapshot loaded inside a rolled-back write is reloaded afterwards."""
+        schema_registry.invalidate()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            CustomField.objects.create(name='ghost', label='Ghost', field_type='text', model_name='Account')
+            self.assertIn('ghost', schema_registry.custom_fields('Account'))
+            raise RuntimeError('roll back')
+        self.assertNotIn('ghost', schema_registry.custom_fields('Account'))
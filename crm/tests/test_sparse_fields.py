@@ -0,0 +1,86 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from crm.models import Account, Opportunity, ApprovalProcess, ApprovalStep
+from decimal import Decimal
+
+class SparseFieldsTest(TestCase):
+    """Test cases for ?fields= and ?expand= on the API."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='rep', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.account = Account.objects.create(name='Acme', account_owner=self.user)
+        for i in range(3):
+            Opportunity.objects.create(
+                name=f'Deal {i}', account=self.account, amount=Decimal('10.00'), stage='prospecting',
+                close_date=timezone.now().date(), owner=self.user, description='Long notes'
+            )
+        self.url = reverse('crm:opportunity-list')
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params, secure=True)
+        self.assertEqual(response.status_code, 200)
+        rows_sql = [query['sql'] for query in queries.captured_queries if 'FROM "crm_opportunity"' in query['sql']
+                    and 'COUNT(' not in query['sql']]
+        return response, rows_sql
+
+    def test_fields_select_only_the_requested_columns(self):
+        """Test ?fields= trims the payload and the SELECT, collapsing nested objects to ids."""
+        response, rows_sql = self.get(self.url, {'fields': 'id,name,amount,owner'})
+        row = response.data['results'][0]
+        self.assertEqual(set(row), {'id', 'name', 'amount', 'owner'})
+        self.assertEqual(row['owner'], self.user.pk)
+        self.assertEqual(len(rows_sql), 1)
+        self.assertNotIn('description', rows_sql[0])
+        self.assertNotIn('auth_user', rows_sql[0])
+
+        response, rows_sql = self.get(self.url, {'fields': 'id,owner', 'expand': 'owner'})
+        self.assertEqual(response.data['results'][0]['owner']['username'], 'rep')
+        self.assertIn('auth_user', rows_sql[0])
+        self.assertNotIn('description', rows_sql[0])
+
+    def test_cursor_pages_load_their_keyset_columns(self):
+        """Test ?fields= with cursor pagination still selects the keyset columns in the one page query."""
+        response, rows_sql = self.get(self.url, {'fields': 'id,name', 'pagination': 'cursor', 'page_size': 2})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name'})
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(len(rows_sql), 1)
+        self.assertIn('modified_date', rows_sql[0])
+        self.assertNotIn('description', rows_sql[0])
+
+    def test_expand_alone_keeps_every_field(self):
+        """Test ?expand= without ?fields= keeps all fields but only embeds what is expanded."""
+        plain = self.client.get(self.url, secure=True).data['results'][0]
+        self.assertEqual(plain['owner']['username'], 'rep')
+        collapsed = self.client.get(self.url, {'expand': ''}, secure=True).data['results'][0]
+        self.assertEqual(set(collapsed), set(plain))
+        self.assertEqual(collapsed['owner'], self.user.pk)
+
+    def test_many_valued_nested_serializers_collapse_to_id_lists(self):
+        """Test unexpanded many=True serializers render as id lists and skip nested prefetches."""
+        process = ApprovalProcess.objects.create(
+            name='Discounts', model_name='Opportunity', entry_criteria='{}', owner=self.user
+        )
+        step = ApprovalStep.objects.create(
+            approval_process=process, name='Manager', step_number=1, approval_type='first_response',
+            reject_behavior='{}', approval_actions='{}', rejection_actions='{}'
+        )
+        url = reverse('crm:approvalprocess-detail', args=[process.pk])
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'fields': 'id,steps'}, secure=True)
+        self.assertEqual(response.data, {'id': process.pk, 'steps': [step.pk]})
+        response = self.client.get(url, {'fields': 'id,steps', 'expand': 'steps'}, secure=True)
+        self.assertEqual(response.data['steps'][0]['name'], 'Manager')
+
+    def test_unknown_fields_are_rejected(self):
+        """Test naming a field the serializer does not have is a 400."""
+        response = self.client.get(self.url, {'fields': 'id,secret'}, secure=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', str(response.data['fields']))
@@ -0,0 +1,168 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+from crm.metrics import compute_dashboard_metrics, get_dashboard_metrics
+from crm.models import Lead, Task, WorkflowAction, WorkflowOutboxEntry, WorkflowRule
+from crm.dispatch import outbound_dispatcher
+from crm.outbox import claim_batch, process_batch, requeue_failed
+from django.urls import reverse
+from rest_framework.test import APIClient
+from io import StringIO
+from unittest import mock
+import json
+
+class WorkflowOutboxTest(TestCase):
+    """Test cases for queuing and running workflow actions through the outbox."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass', email='admin@example.com')
+        self.rule = WorkflowRule.objects.create(
+            name='Web leads', model_name='Lead', active=True,
+            evaluation_criteria='created', conditions='{"source": "Web"}'
+        )
+        self.add_action('Qualify', 'field_update', '{"field": "status", "value": "contacted"}', order=1)
+        self.add_action('Follow up', 'task_creation', '{"subject": "Call {{ record.first_name }}", "due_in_days": 2}', order=2)
+        self.add_action('Alert', 'email_alert', '{"notify_owner": true, "subject": "New lead {{ record.company }}"}', order=2)
+
+    def add_action(self, name, action_type, config, order):
+        return WorkflowAction.objects.create(
+            workflow_rule=self.rule, name=name, action_type=action_type, action_config=config, order=order
+        )
+
+    def create_lead(self, **kwargs):
+        return Lead.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com', company='Acme',
+            owner=self.user, source='Web', **kwargs
+        )
+
+    def test_save_enqueues_actions_without_running_them(self):
+        """Test a matching save writes one entry per action and runs nothing."""
+        lead = self.create_lead()
+        entries = WorkflowOutboxEntry.objects.order_by('order', 'pk')
+        self.assertEqual([e.action_type for e in entries], ['field_update', 'task_creation', 'email_alert'])
+        self.assertEqual(len({e.trigger_id for e in entries}), 1)
+        self.assertEqual(entries[0].record, lead)
+        self.assertEqual(Lead.objects.get(pk=lead.pk).status, 'new')
+        self.assertFalse(Task.objects.exists())
+
+    def test_entries_roll_back_with_the_record(self):
+        """Test outbox entries share the saving transaction."""
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.create_lead()
+                raise RuntimeError
+        self.assertFalse(WorkflowOutboxEntry.objects.exists())
+
+    def test_actions_run_in_order(self):
+        """Test later actions of a trigger wait for earlier ones to finish."""
+        lead = self.create_lead()
+        first = claim_batch()
+        self.assertEqual([e.action_type for e in first], ['field_update'])
+        self.assertEqual(claim_batch(), [])
+        self.assertEqual(process_batch(first, workers=1), {'done': 1, 'retry': 0, 'failed': 0})
+
+        second = claim_batch()
+        self.assertEqual(sorted(e.action_type for e in second), ['email_alert', 'task_creation'])
+        self.assertEqual(process_batch(second, workers=1)['done'], 2)
+
+        self.assertEqual(Lead.objects.get(pk=lead.pk).status, 'contacted')
+        task = Task.objects.get()
+        self.assertEqual((task.subject, task.owner), ('Call Ada', self.user))
+        self.assertEqual(mail.outbox[0].subject, 'New lead Acme')
+        self.assertEqual(mail.outbox[0].to, ['admin@example.com'])
+        self.assertFalse(WorkflowOutboxEntry.objects.exclude(status='done').exists())
+
+    def test_failures_retry_with_backoff(self):
+        """Test transient failures are rescheduled and permanent ones fail at once."""
+        self.rule.actions.all().delete()
+        self.add_action('Notify', 'outbound_message', '{"url": "https://hooks.example.com/lead"}', order=1)
+        self.add_action('Broken', 'field_update', '{"field": "nope"}', order=1)
+        self.create_lead()
+
+        with mock.patch.object(outbound_dispatcher, 'post', side_effect=ConnectionRefusedError('down')):
+            counts = process_batch(claim_batch(), workers=1)
+        self.assertEqual(counts, {'done': 0, 'retry': 1, 'failed': 1})
+        retry = WorkflowOutboxEntry.objects.get(action_type='outbound_message')
+        self.assertEqual((retry.status, retry.attempts), ('pending', 1))
+        self.assertGreater(retry.available_date, timezone.now())
+        self.assertIn('down', retry.last_error)
+        self.assertEqual(claim_batch(), [])
+
+        WorkflowOutboxEntry.objects.filter(pk=retry.pk).update(available_date=timezone.now(), attempts=4)
+        with mock.patch.object(outbound_dispatcher, 'post', side_effect=ConnectionRefusedError('down')):
+            self.assertEqual(process_batch(claim_batch(), workers=1)['failed'], 1)
+        self.assertEqual(WorkflowOutboxEntry.objects.get(pk=retry.pk).status, 'failed')
+
+        self.assertEqual(requeue_failed('outbound_message'), 1)
+        with mock.patch.object(outbound_dispatcher, 'post', return_value=200):
+            self.assertEqual(process_batch(claim_batch(), workers=1)['done'], 1)
+
+    def test_field_updates_keep_metrics_and_modified_date_current(self):
+        """Test field_update actions move the dashboard snapshot and bump modified_date."""
+        self.rule.actions.all().delete()
+        self.add_action('Convert', 'field_update', '{"field": "status", "value": "converted"}', order=1)
+        lead = self.create_lead()
+        get_dashboard_metrics()
+        before = Lead.objects.get(pk=lead.pk).modified_date
+        self.assertEqual(process_batch(claim_batch(), workers=1)['done'], 1)
+        lead.refresh_from_db()
+        self.assertEqual(lead.status, 'converted')
+        self.assertGreater(lead.modified_date, before)
+        self.assertEqual(get_dashboard_metrics(), compute_dashboard_metrics())
+        self.assertEqual(get_dashboard_metrics()['converted_leads_count'], 1)
+
+    def test_templates_only_substitute_reportable_fields(self):
+        """Test placeholders render record fields as text and private or other template syntax fails."""
+        self.rule.actions.all().delete()
+        self.add_action('Alert', 'email_alert', json.dumps({
+            'recipients': ['ops@example.com'], 'subject': '{{ record.owner.username }} & {{record.company}}',
+            'body': 'Owner: {{ record.owner.email }}',
+        }), order=1)
+        self.add_action('Leak', 'email_alert', json.dumps({
+            'recipients': ['ops@example.com'], 'subject': '{{ record.owner.password }}',
+        }), order=1)
+        self.add_action('Tags', 'task_creation', '{"subject": "{% now \'Y\' %}"}', order=1)
+        self.create_lead()
+        self.assertEqual(process_batch(claim_batch(), workers=1), {'done': 1, 'retry': 0, 'failed': 2})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual((mail.outbox[0].subject, mail.outbox[0].body), ('admin & Acme', 'Owner: admin@example.com'))
+        errors = WorkflowOutboxEntry.objects.filter(status='failed').order_by('pk').values_list('last_error', flat=True)
+        self.assertIn('not reportable', errors[0])
+        self.assertIn('placeholders', errors[1])
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('crm:workflowaction-list')
+        for config in ['{"subject": "{{ record.owner.password }}"}', '{"subject": "{{ record.owner }}"}',
+                       '{"subject": "{{ record.company|upper }}"}', '{"recipient_fields": ["owner.email"]}']:
+            data = {'workflow_rule': self.rule.pk, 'name': 'Bad', 'action_type': 'email_alert', 'action_config': config}
+            response = client.post(url, data, format='json', secure=True)
+            self.assertEqual(response.status_code, 400, config)
+            self.assertIn('action_config', response.data)
+        data = {'workflow_rule': self.rule.pk, 'name': 'Good', 'action_type': 'email_alert',
+                'action_config': '{"subject": "New lead {{ record.company }}", "recipient_fields": ["email"]}'}
+        self.assertEqual(client.post(url, data, format='json', secure=True).status_code, 201)
+
+    def test_tasks_created_by_actions_do_not_retrigger_rules(self):
+        """Test a task_creation action on a Task rule does not loop."""
+        rule = WorkflowRule.objects.create(
+            name='Every task', model_name='Task', active=True, evaluation_criteria='created', conditions='{}'
+        )
+        WorkflowAction.objects.create(
+            workflow_rule=rule, name='Echo', action_type='task_creation',
+            action_config='{"subject": "Re: {{ record.subject }}"}'
+        )
+        Task.objects.create(subject='Call', due_date=timezone.now(), owner=self.user)
+        self.assertEqual(process_batch(claim_batch(), workers=1)['done'], 1)
+        self.assertEqual(sorted(Task.objects.values_list('subject', flat=True)), ['Call', 'Re: Call'])
+        self.assertEqual(claim_batch(), [])
+
+    def test_command_drains_outbox(self):
+        """Test the worker command processes every due entry with --once."""
+        self.create_lead()
+        out = StringIO()
+        call_command('process_workflow_outbox', '--once', '--workers', '1', stdout=out)
+        self.assertIn('3 done', out.getvalue())
@@ -0,0 +1,203 @@
+from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from crm.metrics import compute_dashboard_metrics, get_dashboard_metrics
+from crm.models import Account, Lead, Opportunity, Task, WorkflowAction, WorkflowOutboxEntry, WorkflowRule
+from crm.registry import schema_registry
+from crm.workflows import WorkflowConditionError, compile_conditions, rule_triggered, workflow_engine
+from datetime import date, datetime
+from io import StringIO
+import json
+import os
+import tempfile
+from decimal import Decimal
+
+class CompileConditionsTest(TestCase):
+    """Test cases for compiling workflow conditions into predicates."""
+
+    def test_lookups(self):
+        """Test supported lookups against an unsaved record."""
+        opportunity = Opportunity(
+            name='Big Deal', amount=Decimal('150000.00'), stage='negotiation',
+            close_date=date(2025, 3, 31), probability=60, account_id=7
+        )
+        matching = [
+            {'amount__gte': 100000, 'stage': 'negotiation'},
+            {'stage__in': ['negotiation', 'closed_won']},
+            {'close_date__lt': '2025-04-01', 'name__icontains': 'big'},
+            {'account': 7, 'owner__isnull': True},
+            {},
+        ]
+        for conditions in matching:
+            self.assertTrue(compile_conditions(Opportunity, conditions)(opportunity), conditions)
+        for conditions in [{'amount__gt': 150000}, {'stage__in': ['closed_won']}, {'name__startswith': 'big'}]:
+            self.assertFalse(compile_conditions(Opportunity, conditions)(opportunity), conditions)
+
+    def test_naive_datetimes_compare_in_current_timezone(self):
+        """Test naive datetime conditions are made aware instead of failing every evaluation."""
+        task = Task(subject='Call', due_date=timezone.make_aware(datetime(2024, 6, 1, 12)))
+        self.assertTrue(compile_conditions(Task, {'due_date__gte': '2020-01-01T00:00:00'})(task))
+        self.assertFalse(compile_conditions(Task, {'due_date__lt': '2020-01-01T00:00:00'})(task))
+        task.due_date = datetime(2024, 6, 1, 12)
+        self.assertTrue(compile_conditions(Task, {'due_date__gte': '2020-01-01'})(task))
+
+    def test_invalid_conditions(self):
+        """Test unknown fields, lookups and values are rejected at compile time."""
+        for conditions in [{'nope': 1}, {'amount__regex': '1'}, {'amount__gte': 'lots'},
+                           {'stage__in': 'closed_won'}, {'owner__isnull': 'yes'}, []]:
+            with self.assertRaises(WorkflowConditionError):
+                compile_conditions(Opportunity, conditions)
+
+class WorkflowEngineTest(TestCase):
+    """Test cases for evaluating workflow rules on save."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass')
+        self.account = Account.objects.create(name='Acme', account_owner=self.user)
+        WorkflowRule.objects.create(
+            name='Web leads', model_name='Lead', active=True,
+            evaluation_criteria='created', conditions='{"source": "Web"}'
+        )
+        WorkflowRule.objects.create(
+            name='Qualified leads', model_name='Lead', active=True,
+            evaluation_criteria='created_edited', conditions='{"status": "qualified"}'
+        )
+        WorkflowRule.objects.create(
+            name='Inactive', model_name='Lead', active=False,
+            evaluation_criteria='created_edited', conditions='{}'
+        )
+        WorkflowRule.objects.create(
+            name='Broken', model_name='Lead', active=True,
+            evaluation_criteria='created_edited', conditions='{"nope": 1}'
+        )
+        self.triggered = []
+        rule_triggered.connect(self.record, dispatch_uid='test_workflows')
+        self.addCleanup(rule_triggered.disconnect, dispatch_uid='test_workflows')
+
+    def record(self, sender, rule, instance, created, **kwargs):
+        self.triggered.append((rule.name, instance.pk, created))
+
+    def create_lead(self, **kwargs):
+        return Lead.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com', company='Acme', owner=self.user, **kwargs
+        )
+
+    def test_rules_fire_by_criteria(self):
+        """Test created-only rules skip edits and inactive or invalid rules never fire."""
+        lead = self.create_lead(source='Web')
+        self.assertEqual(self.triggered, [('Web leads', lead.pk, True)])
+
+        self.triggered.clear()
+        lead.status = 'qualified'
+        lead.save()
+        self.assertEqual(self.triggered, [('Qualified leads', lead.pk, False)])
+
+    def test_rule_changes_apply_to_next_save(self):
+        """Test saved rule edits are picked up without a restart."""
+        rule = WorkflowRule.objects.get(name='Web leads')
+        rule.conditions = '{"source": "Referral"}'
+        rule.save()
+        self.create_lead(source='Web')
+        self.assertEqual(self.triggered, [])
+        self.create_lead(source='Referral')
+        self.assertEqual([name for name, _, _ in self.triggered], ['Web leads'])
+
+    def test_evaluation_needs_no_queries(self):
+        """Test evaluating a save loads no rules from the database once compiled."""
+        lead = self.create_lead(source='Web')
+        schema_registry.snapshot()
+        with self.assertNumQueries(0):
+            for _ in range(100):
+                matched = workflow_engine.evaluate(lead, created=True)
+        self.assertEqual([rule.name for rule in matched], ['Web leads'])
+
+    def test_api_rejects_invalid_conditions(self):
+        """Test the workflow rule API validates conditions against the model."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('crm:workflowrule-list')
+        payload = {'name': 'Hot', 'model_name': 'Lead', 'evaluation_criteria': 'created', 'active': True}
+        response = client.post(url, {**payload, 'conditions': '{"rating__gte": "hot"}'}, format='json', secure=True)
+        self.assertEqual(response.status_code, 400)
+        response = client.post(url, {**payload, 'conditions': '{"status": "new"}'}, format='json', secure=True)
+        self.assertEqual(response.status_code, 201, response.data)
+
+class ReevaluateWorkflowRulesTest(TestCase):
+    """Test cases for the reevaluate_workflow_rules command."""
+
+    def setUp(self):
+        schema_registry.invalidate()
+        self.user = User.objects.create_user(username='admin', password='pass')
+        self.leads = [
+            Lead.objects.create(
+                first_name='Lead', last_name=str(i), email=f'lead{i}@example.com', company='Acme',
+                owner=self.user, source='Web' if i % 2 else 'Referral'
+            )
+            for i in range(10)
+        ]
+        self.rule = WorkflowRule.objects.create(
+            name='Web leads', model_name='Lead', active=True,
+            evaluation_criteria='created', conditions='{"source": "Web"}'
+        )
+        WorkflowAction.objects.create(
+            workflow_rule=self.rule, name='Qualify', action_type='field_update',
+            action_config='{"field": "status", "value": "contacted"}'
+        )
+        WorkflowAction.objects.create(
+            workflow_rule=self.rule, name='Alert', action_type='email_alert', action_config='{"recipients": ["a@b.c"]}'
+        )
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('reevaluate_workflow_rules', str(self.rule.pk), '--processes', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def statuses(self):
+        return [lead.status for lead in Lead.objects.order_by('pk')]
+
+    def test_applies_field_updates_in_chunks(self):
+        """Test matching records are updated chunk by chunk and actions are not replayed."""
+        output = self.run_command('--chunk-size', '3')
+        self.assertIn('Re-evaluated 10 Lead records: 5 matched, 5 updated', output)
+        self.assertEqual(self.statuses(), ['new', 'contacted'] * 5)
+        self.assertFalse(WorkflowOutboxEntry.objects.exists())
+        self.assertIn('0 updated', self.run_command())
+
+    def test_keeps_metrics_and_modified_date_current(self):
+        """Test re-evaluated records move the dashboard snapshot and bump modified_date."""
+        self.rule.actions.filter(action_type='field_update').update(
+            action_config='{"field": "status", "value": "converted"}'
+        )
+        schema_registry.invalidate()
+        get_dashboard_metrics()
+        before = self.leads[1].modified_date
+        self.run_command('--chunk-size', '3')
+        self.assertGreater(Lead.objects.get(pk=self.leads[1].pk).modified_date, before)
+        self.assertEqual(get_dashboard_metrics(), compute_dashboard_metrics())
+        self.assertEqual(get_dashboard_metrics()['converted_leads_count'], 5)
+
+    def test_resumes_from_checkpoint(self):
+        """Test a checkpoint skips records already processed and is removed when done."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'checkpoint.json')
+            with open(path, 'w') as fh:
+                json.dump({'rule_ids': [self.rule.pk], 'last_pk': self.leads[5].pk,
+                           'scanned': 6, 'matched': 3, 'updated': 3}, fh)
+            output = self.run_command('--checkpoint', path)
+            self.assertFalse(os.path.exists(path))
+        self.assertIn('Re-evaluated 10 Lead records: 5 matched, 5 updated', output)
+        self.assertEqual(self.statuses(), ['new'] * 6 + ['new', 'contacted'] * 2)
+
+    def test_rejects_invalid_rules(self):
+        """Test rules that cannot run are reported before any record is touched."""
+        WorkflowAction.objects.create(
+            workflow_rule=self.rule, name='Broken', action_type='field_update', action_config='{"field": "nope"}'
+        )
+        with self.assertRaises(CommandError):
+            self.run_command()
+        with self.assertRaises(CommandError):
+            call_command('reevaluate_workflow_rules', '424242', stdout=StringIO())
@@ -0,0 +1,47 @@
+"""Paged communication timeline for the account detail page.
+
+An account can have tens of thousands of emails, so the page renders only
+the newest ``CRM_TIMELINE_PAGE_SIZE`` and fetches older ones on demand.
+Pages are keyset-paginated on ``(-sent_date, -id)``, which the
+``crm_email_timeline_idx`` index on ``(account, -sent_date, -id)`` serves
+as a range scan however far back the reader scrolls. ``body`` is deferred
+in the page query and is loaded one message at a time when it is expanded.
+"""
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.http import Http404
+from rest_framework.exceptions import NotFound
+
+from .models import EmailCommunication
+from .pagination import decode_cursor, encode_cursor, keyset_filter
+
+TIMELINE_ORDERING = ('-sent_date', '-id')
+
+
+def timeline_page_size():
+    return getattr(settings, 'CRM_TIMELINE_PAGE_SIZE', 25)
+
+
+def timeline_page(account_id, cursor=None, page_size=None) -> Tuple[List[EmailCommunication], Optional[str]]:
+    """Return one page of an account's communications, newest first, and the next cursor.
+
+    The cursor is None on the last page; an invalid cursor raises Http404.
+    """
+    page_size = page_size or timeline_page_size()
+    queryset = EmailCommunication.objects.filter(account_id=account_id).select_related(
+        'contact'
+    ).defer('body').order_by(*TIMELINE_ORDERING)
+    if cursor:
+        try:
+            values = decode_cursor(cursor, EmailCommunication, TIMELINE_ORDERING)
+        except NotFound:
+            raise Http404('Invalid cursor')
+        queryset = queryset.filter(keyset_filter(TIMELINE_ORDERING, values))
+
+    # One extra row tells us whether there is an older page.
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor([rows[-1].sent_date, rows[-1].id])
@@ -25,6 +25,7 @@ router.register(r'workflow-actions', views.WorkflowActionViewSet)
 router.register(r'approval-processes', views.ApprovalProcessViewSet)
 router.register(r'approval-steps', views.ApprovalStepViewSet)
 router.register(r'approval-requests', views.ApprovalRequestViewSet)
+router.register(r'communications', views.EmailCommunicationViewSet)
 
 # Authentication URLs
 urlpatterns = [
@@ -43,6 +44,8 @@ urlpatterns += [
     path('accounts/<int:pk>/', views.account_detail, name='account_detail'),
     path('accounts/<int:pk>/edit/', views.account_edit, name='account_edit'),
     path('accounts/<int:pk>/delete/', views.account_delete, name='account_delete'),
+    path('accounts/<int:pk>/communications/', views.account_communications, name='account_communications'),
+    path('communications/<int:pk>/body/', views.communication_body, name='communication_body'),
     
     # Contacts
     path('contacts/new/', views.contact_create, name='contact_create'),
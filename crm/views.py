@@ -1,19 +1,27 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
 from django.views.decorators.http import require_http_methods
 from django.db.models import Count, Sum, Q
-from django.utils import timezone
 from datetime import timedelta
 import json
 from rest_framework import viewsets, permissions, filters
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db import models
+from django.db import models, transaction
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldError, ValidationError as DjangoValidationError
 from .models import (
     Account, Contact, Lead, Opportunity, Task,
     CustomField, CustomFieldValue, Report, Dashboard, DashboardComponent,
     EmailTemplate, WorkflowRule, WorkflowAction, ApprovalProcess,
-    ApprovalStep, ApprovalRequest, EmailCommunication
+    ApprovalStep, ApprovalRequest, EmailCommunication, get_record_model
 )
 from .serializers import (
     AccountSerializer, ContactSerializer, LeadSerializer,
@@ -22,33 +30,33 @@ from .serializers import (
     DashboardComponentSerializer, EmailTemplateSerializer,
     WorkflowRuleSerializer, WorkflowActionSerializer,
     ApprovalProcessSerializer, ApprovalStepSerializer,
-    ApprovalRequestSerializer
+    ApprovalRequestSerializer, EmailCommunicationSerializer, EmailFollowUpSerializer,
+    EmailSearchResultSerializer
 )
 from .forms import AccountForm, ContactForm  # We'll create these form classes next
+from .approvals import BULK_ACTIONS, apply_bulk_action, submit_records
+from .bulk import bulk_max_rows, create_records, delete_records, update_records, upsert_custom_field_values
+from .cache import CachedResponseMixin, response_cache
+from .dashboards import render_dashboard
+from .filters import CustomFieldFilterBackend, CustomFieldOrderingFilter, EmailCommunicationFilter
+from .follow_ups import DEFAULT_DAYS as FOLLOW_UP_DAYS, DUE_CHOICES, MAX_DAYS as FOLLOW_UP_MAX_DAYS, due_follow_ups
+from .metrics import compute_dashboard_metrics, get_dashboard_metrics
+from .optimizer import QueryOptimizerMixin
+from .pagination import KeysetPagination
+from .merge import MergeTemplateError, compile_template
+from .reports import ReportDefinitionError, compile_report, resolve_field
+from .search import search_communications
+from .timeline import timeline_page
 
 # Template-based views
 @login_required
 def dashboard(request):
-    # Get the first day of current month
-    today = timezone.now()
-    first_day_of_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-    # Account metrics
-    total_accounts = Account.objects.count()
-    new_accounts_count = Account.objects.filter(created_date__gte=first_day_of_month).count()
-
-    # Opportunity metrics
-    open_opportunities = Opportunity.objects.exclude(stage__in=['closed_won', 'closed_lost'])
-    open_opportunities_count = open_opportunities.count()
-    total_opportunity_value = open_opportunities.aggregate(total=Sum('amount'))['total'] or 0
-
-    # Lead metrics
-    active_leads_count = Lead.objects.exclude(status='converted').count()
-    converted_leads_count = Lead.objects.filter(status='converted', modified_date__gte=first_day_of_month).count()
-
-    # Task metrics
-    tasks_due_count = Task.objects.filter(due_date__date=today.date()).count()
-    overdue_tasks_count = Task.objects.filter(due_date__lt=today, status__in=['not_started', 'in_progress']).count()
+    # Headline metrics come from the incrementally maintained snapshot;
+    # staff can pass ?live=1 to compare against live queries.
+    if request.GET.get('live') and request.user.is_staff:
+        metrics = compute_dashboard_metrics()
+    else:
+        metrics = get_dashboard_metrics()
 
     # Pipeline data for funnel
     stage_display = dict(Opportunity.STAGE_CHOICES)
@@ -94,14 +102,7 @@ def dashboard(request):
     recent_activities = recent_activities[:5]  # Keep only 5 most recent
 
     context = {
-        'total_accounts': total_accounts,
-        'new_accounts_count': new_accounts_count,
-        'open_opportunities_count': open_opportunities_count,
-        'total_opportunity_value': total_opportunity_value,
-        'active_leads_count': active_leads_count,
-        'converted_leads_count': converted_leads_count,
-        'tasks_due_count': tasks_due_count,
-        'overdue_tasks_count': overdue_tasks_count,
+        **metrics,
         'funnel_stages': json.dumps(funnel_stages),
         'funnel_counts': json.dumps(funnel_counts),
         'funnel_values': json.dumps(funnel_values),
@@ -119,14 +120,11 @@ def account_list(request):
 def account_detail(request, pk):
     account = get_object_or_404(Account, pk=pk)
     
-    # Get email communications
-    communications = account.communications.select_related('contact', 'owner').all()
-    
     # Get pending follow-ups
-    pending_follow_ups = communications.filter(
+    pending_follow_ups = account.communications.filter(
         requires_follow_up=True,
         follow_up_completed=False
-    ).order_by('follow_up_date')
+    ).defer('body').order_by('follow_up_date')
 
     # Mark follow-up as complete
     if request.method == 'POST' and request.POST.get('action') == 'complete_follow_up':
@@ -138,14 +136,43 @@ def account_detail(request, pk):
             messages.success(request, 'Follow-up marked as completed.')
             return redirect('crm:account_detail', pk=account.pk)
 
+    # First page of the email timeline; older pages load from account_communications
+    communications, next_cursor = timeline_page(account.pk)
+
     context = {
         'account': account,
         'communications': communications,
+        'next_cursor': next_cursor,
         'pending_follow_ups': pending_follow_ups,
     }
     return render(request, 'crm/accounts/detail.html', context)
 
 @login_required
+def account_communications(request, pk):
+    """JSON page of an account's email timeline for the "Load more" button.
+
+    Returns the rendered messages as ``html`` and the ``next`` cursor, which
+    is null on the oldest page.
+    """
+    account = get_object_or_404(Account.objects.only('pk'), pk=pk)
+    communications, next_cursor = timeline_page(account.pk, request.GET.get('cursor'))
+    html = render_to_string(
+        'crm/accounts/_communications.html',
+        {'communications': communications},
+        request=request,
+    )
+    return JsonResponse({'html': html, 'next': next_cursor})
+
+@login_required
+def communication_body(request, pk):
+    """JSON body of one email, fetched when it is expanded on the timeline."""
+    body = EmailCommunication.objects.filter(pk=pk).values_list('body', flat=True).first()
+    if body is None:
+        raise Http404('No communication found')
+    return JsonResponse({'id': pk, 'body': body})
+
+@login_required
+@transaction.atomic
 def account_create(request):
     if request.method == 'POST':
         form = AccountForm(request.POST)
@@ -164,6 +191,7 @@ def account_create(request):
     })
 
 @login_required
+@transaction.atomic
 def account_edit(request, pk):
     account = get_object_or_404(Account, pk=pk)
     if request.method == 'POST':
@@ -189,6 +217,7 @@ def account_delete(request, pk):
     return redirect('crm:account_list')
 
 @login_required
+@transaction.atomic
 def contact_create(request):
     account = None
     if request.GET.get('account'):
@@ -219,6 +248,7 @@ def contact_detail(request, pk):
     return render(request, 'crm/contacts/detail.html', {'contact': contact})
 
 @login_required
+@transaction.atomic
 def opportunity_intake(request):
     if request.method == 'POST':
         # Create or get the account based on company name
@@ -271,67 +301,151 @@ def opportunity_intake(request):
     return render(request, 'crm/opportunities/intake.html')
 
 # API ViewSets
-class AccountViewSet(viewsets.ModelViewSet):
+class AtomicWriteMixin:
+    """Run create, update and destroy in one transaction.
+
+    Workflow outbox entries enqueued by the save (crm/outbox.py) then commit
+    or roll back together with the record.
+    """
+
+    def create(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().create(request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().update(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().destroy(request, *args, **kwargs)
+
+class CustomFieldsMixin:
+    """Inline custom field values with ``?custom_fields=true``.
+
+    Values for every record being serialized are fetched in one query and
+    handed to the serializer through its context.
+    """
+    custom_fields_param = 'custom_fields'
+
+    def wants_custom_fields(self):
+        return self.request.query_params.get(self.custom_fields_param) in ('1', 'true')
+
+    def get_custom_field_values(self, instances):
+        values = {instance.pk: {} for instance in instances}
+        if not values:
+            return values
+        content_type = ContentType.objects.get_for_model(self.queryset.model)
+        field_values = CustomFieldValue.objects.filter(
+            content_type=content_type, record_id__in=list(values)
+        ).select_related('custom_field')
+        for field_value in field_values:
+            values[field_value.record_id][field_value.custom_field.name] = field_value.typed_value
+        return values
+
+    def get_serializer(self, *args, **kwargs):
+        if args and self.request.method == 'GET' and self.wants_custom_fields():
+            instances = args[0] if kwargs.get('many') else [args[0]]
+            kwargs['context'] = {
+                **self.get_serializer_context(),
+                'custom_field_values': self.get_custom_field_values(instances),
+            }
+        return super().get_serializer(*args, **kwargs)
+
+class BulkWriteMixin:
+    """Create, update and delete many records per request at ``bulk/``.
+
+    POST creates from ``{"records": [...]}`` (or a bare list), PATCH applies
+    partial updates to the records named by each row's ``id``, and DELETE
+    removes ``{"ids": [...]}``. Every row gets its own result; the response
+    is a 400 only when every row failed. New records are owned by the
+    requesting user through ``owner_field``, in ``perform_create`` too.
+    """
+    owner_field = 'owner'
+
+    def get_owner_defaults(self):
+        return {self.owner_field: self.request.user}
+
+    def perform_create(self, serializer):
+        serializer.save(**self.get_owner_defaults())
+
+    def get_bulk_rows(self, key, description):
+        rows = self.request.data.get(key) if isinstance(self.request.data, dict) else self.request.data
+        if not isinstance(rows, list) or not rows:
+            raise ValidationError({key: f'Expected a non-empty list of {description}'})
+        if len(rows) > bulk_max_rows():
+            raise ValidationError({key: f'At most {bulk_max_rows()} {description} per request'})
+        return rows
+
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def bulk(self, request):
+        """Create (POST), update (PATCH) or delete (DELETE) many records at once."""
+        if request.method == 'DELETE':
+            ids = self.get_bulk_rows('ids', 'ids')
+            if not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+                raise ValidationError({'ids': 'Ids must be integers'})
+            results, outcome = delete_records(self.get_queryset(), ids), 'deleted'
+        elif request.method == 'PATCH':
+            rows = self.get_bulk_rows('records', 'records')
+            results = update_records(self.get_queryset(), self.get_serializer_class(), rows,
+                                     self.get_serializer_context())
+            outcome = 'updated'
+        else:
+            rows = self.get_bulk_rows('records', 'records')
+            results = create_records(self.get_serializer_class(), rows, self.get_serializer_context(),
+                                     self.get_owner_defaults())
+            outcome = 'created'
+        failed = sum(1 for result in results if result['status'] == 'error')
+        payload = {outcome: len(results) - failed, 'errors': failed, 'results': results}
+        return Response(payload, status=400 if failed == len(results) else 200)
+
+class AccountViewSet(BulkWriteMixin, AtomicWriteMixin, CustomFieldsMixin, QueryOptimizerMixin, viewsets.ModelViewSet):
     queryset = Account.objects.all()
     serializer_class = AccountSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
+    filter_backends = [filters.SearchFilter, CustomFieldOrderingFilter, DjangoFilterBackend, CustomFieldFilterBackend]
     search_fields = ['name', 'industry', 'website']
     ordering_fields = ['name', 'created_date', 'modified_date']
     filterset_fields = ['industry']
+    owner_field = 'account_owner'
 
-    def perform_create(self, serializer):
-        serializer.save(account_owner=self.request.user)
-
-class ContactViewSet(viewsets.ModelViewSet):
+class ContactViewSet(BulkWriteMixin, AtomicWriteMixin, CustomFieldsMixin, QueryOptimizerMixin, viewsets.ModelViewSet):
     queryset = Contact.objects.all()
     serializer_class = ContactSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
+    filter_backends = [filters.SearchFilter, CustomFieldOrderingFilter, DjangoFilterBackend, CustomFieldFilterBackend]
     search_fields = ['first_name', 'last_name', 'email']
     ordering_fields = ['last_name', 'created_date']
     filterset_fields = ['account']
 
-    def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
-
-class LeadViewSet(viewsets.ModelViewSet):
+class LeadViewSet(BulkWriteMixin, AtomicWriteMixin, CustomFieldsMixin, QueryOptimizerMixin, viewsets.ModelViewSet):
     queryset = Lead.objects.all()
     serializer_class = LeadSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
+    filter_backends = [filters.SearchFilter, CustomFieldOrderingFilter, DjangoFilterBackend, CustomFieldFilterBackend]
     search_fields = ['first_name', 'last_name', 'company']
     ordering_fields = ['created_date', 'status']
     filterset_fields = ['status', 'source']
 
-    def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
-
-class OpportunityViewSet(viewsets.ModelViewSet):
+class OpportunityViewSet(BulkWriteMixin, AtomicWriteMixin, CustomFieldsMixin, QueryOptimizerMixin, viewsets.ModelViewSet):
     queryset = Opportunity.objects.all()
     serializer_class = OpportunitySerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
+    filter_backends = [filters.SearchFilter, CustomFieldOrderingFilter, DjangoFilterBackend, CustomFieldFilterBackend]
     search_fields = ['name', 'account__name']
     ordering_fields = ['amount', 'close_date', 'probability']
     filterset_fields = ['stage', 'account']
 
-    def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
-
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(BulkWriteMixin, AtomicWriteMixin, CustomFieldsMixin, QueryOptimizerMixin, viewsets.ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
+    filter_backends = [filters.SearchFilter, CustomFieldOrderingFilter, DjangoFilterBackend, CustomFieldFilterBackend]
     search_fields = ['subject', 'description']
     ordering_fields = ['due_date', 'priority', 'status']
     filterset_fields = ['status', 'priority']
 
-    def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
-
-class CustomFieldViewSet(viewsets.ModelViewSet):
+class CustomFieldViewSet(QueryOptimizerMixin, viewsets.ModelViewSet):
     queryset = CustomField.objects.all()
     serializer_class = CustomFieldSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -343,16 +457,31 @@ class CustomFieldViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
-class CustomFieldValueViewSet(viewsets.ModelViewSet):
+class CustomFieldValueViewSet(QueryOptimizerMixin, viewsets.ModelViewSet):
     queryset = CustomFieldValue.objects.all()
     serializer_class = CustomFieldValueSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['custom_field', 'record_id']
 
-class ReportViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Upsert many values at once from ``{"values": [...]}`` or a bare list."""
+        rows = request.data.get('values') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not rows:
+            raise ValidationError({'values': 'Expected a non-empty list of values'})
+        if len(rows) > bulk_max_rows():
+            raise ValidationError({'values': f'At most {bulk_max_rows()} values per request'})
+
+        results = upsert_custom_field_values(rows)
+        failed = sum(1 for result in results if result['status'] == 'error')
+        payload = {'upserted': len(results) - failed, 'errors': failed, 'results': results}
+        return Response(payload, status=400 if failed == len(results) else 200)
+
+class ReportViewSet(CachedResponseMixin, QueryOptimizerMixin, viewsets.ModelViewSet):
     queryset = Report.objects.all()
     serializer_class = ReportSerializer
+    cache_models = (Report, User)
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
     search_fields = ['name', 'description']
@@ -367,9 +496,20 @@ class ReportViewSet(viewsets.ModelViewSet):
             models.Q(owner=self.request.user) | models.Q(is_public=True)
         )
 
-class DashboardViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'])
+    def run(self, request, pk=None):
+        """Execute the report as one aggregate query and stream its rows."""
+        report = self.get_object()
+        try:
+            compiled = compile_report(report)
+        except ReportDefinitionError as exc:
+            raise ValidationError({'detail': str(exc)})
+        return StreamingHttpResponse(compiled.stream_json(), content_type='application/json')
+
+class DashboardViewSet(CachedResponseMixin, QueryOptimizerMixin, viewsets.ModelViewSet):
     queryset = Dashboard.objects.all()
     serializer_class = DashboardSerializer
+    cache_models = (Dashboard, DashboardComponent, Report, User)
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
     search_fields = ['name', 'description']
@@ -384,7 +524,14 @@ class DashboardViewSet(viewsets.ModelViewSet):
             models.Q(owner=self.request.user) | models.Q(is_public=True)
         )
 
-class DashboardComponentViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'], url_path='render', url_name='render')
+    def render_components(self, request, pk=None):
+        """Return every component's chart data, running each report once."""
+        dashboard = self.get_object()
+        concurrent = request.query_params.get('concurrent') in ('1', 'true')
+        return Response(render_dashboard(dashboard, concurrent=concurrent, user=request.user))
+
+class DashboardComponentViewSet(QueryOptimizerMixin, viewsets.ModelViewSet):
     queryset = DashboardComponent.objects.all()
     serializer_class = DashboardComponentSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -392,7 +539,7 @@ class DashboardComponentViewSet(viewsets.ModelViewSet):
     ordering_fields = ['position']
     filterset_fields = ['dashboard', 'chart_type']
 
-class EmailTemplateViewSet(viewsets.ModelViewSet):
+class EmailTemplateViewSet(QueryOptimizerMixin, viewsets.ModelViewSet):
     queryset = EmailTemplate.objects.all()
     serializer_class = EmailTemplateSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -404,7 +551,39 @@ class EmailTemplateViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
-class WorkflowRuleViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['post'])
+    def merge(self, request, pk=None):
+        """Stream the template merged with records of its model.
+
+        The body may narrow the records with ``{"ids": [...]}`` and/or
+        ``{"filters": {lookup: value}}``; without either every record is merged.
+        """
+        template = self.get_object()
+        try:
+            plan = compile_template(template)
+        except MergeTemplateError as exc:
+            raise ValidationError({'detail': str(exc)})
+
+        if not isinstance(request.data, dict):
+            raise ValidationError({'detail': 'Expected a JSON object'})
+        queryset = plan.model._default_manager.all()
+        ids = request.data.get('ids')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+                raise ValidationError({'ids': 'Expected a list of record ids'})
+            queryset = queryset.filter(pk__in=ids)
+        record_filters = request.data.get('filters', {})
+        if not isinstance(record_filters, dict):
+            raise ValidationError({'filters': 'Expected an object of lookups'})
+        try:
+            for lookup in record_filters:
+                resolve_field(plan.model, lookup, allow_lookup=True)
+            queryset = queryset.filter(**record_filters)
+        except (ReportDefinitionError, FieldError, DjangoValidationError, ValueError, TypeError) as exc:
+            raise ValidationError({'filters': str(exc)})
+        return StreamingHttpResponse(plan.stream_json(queryset, template.pk), content_type='application/json')
+
+class WorkflowRuleViewSet(QueryOptimizerMixin, viewsets.ModelViewSet):
     queryset = WorkflowRule.objects.all()
     serializer_class = WorkflowRuleSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -416,7 +595,7 @@ class WorkflowRuleViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
-class WorkflowActionViewSet(viewsets.ModelViewSet):
+class WorkflowActionViewSet(QueryOptimizerMixin, viewsets.ModelViewSet):
     queryset = WorkflowAction.objects.all()
     serializer_class = WorkflowActionSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -424,7 +603,7 @@ class WorkflowActionViewSet(viewsets.ModelViewSet):
     ordering_fields = ['order']
     filterset_fields = ['workflow_rule', 'action_type']
 
-class ApprovalProcessViewSet(viewsets.ModelViewSet):
+class ApprovalProcessViewSet(QueryOptimizerMixin, viewsets.ModelViewSet):
     queryset = ApprovalProcess.objects.all()
     serializer_class = ApprovalProcessSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -436,7 +615,7 @@ class ApprovalProcessViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
-class ApprovalStepViewSet(viewsets.ModelViewSet):
+class ApprovalStepViewSet(QueryOptimizerMixin, viewsets.ModelViewSet):
     queryset = ApprovalStep.objects.all()
     serializer_class = ApprovalStepSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -444,7 +623,7 @@ class ApprovalStepViewSet(viewsets.ModelViewSet):
     ordering_fields = ['step_number']
     filterset_fields = ['approval_process', 'approval_type']
 
-class ApprovalRequestViewSet(viewsets.ModelViewSet):
+class ApprovalRequestViewSet(QueryOptimizerMixin, viewsets.ModelViewSet):
     queryset = ApprovalRequest.objects.all()
     serializer_class = ApprovalRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -455,3 +634,124 @@ class ApprovalRequestViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         serializer.save(submitter=self.request.user)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Approve, reject or recall many requests from ``{"action", "ids", "comments"}``."""
+        if not isinstance(request.data, dict):
+            raise ValidationError({'detail': 'Expected a JSON object'})
+        action_name = request.data.get('action')
+        if action_name not in BULK_ACTIONS:
+            raise ValidationError({'action': f"Expected one of {', '.join(BULK_ACTIONS)}"})
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            raise ValidationError({'ids': 'Expected a non-empty list of approval request ids'})
+        if len(ids) > bulk_max_rows():
+            raise ValidationError({'ids': f'At most {bulk_max_rows()} ids per request'})
+        if not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+            raise ValidationError({'ids': 'Ids must be integers'})
+
+        results = apply_bulk_action(request.user, action_name, ids, str(request.data.get('comments') or ''))
+        failed = sum(1 for result in results if result['status'] == 'error')
+        payload = {'updated': len(results) - failed, 'errors': failed, 'results': results}
+        return Response(payload, status=400 if failed == len(results) else 200)
+
+    @action(detail=False, methods=['post'])
+    def submit(self, request):
+        """Submit many records for approval from ``{"model_name", "record_ids", "comments"}``."""
+        if not isinstance(request.data, dict):
+            raise ValidationError({'detail': 'Expected a JSON object'})
+        model_name = request.data.get('model_name')
+        try:
+            get_record_model(model_name)
+        except LookupError:
+            raise ValidationError({'model_name': f'Expected one of {", ".join(dict(CustomField.MODEL_CHOICES))}'})
+        record_ids = request.data.get('record_ids')
+        if not isinstance(record_ids, list) or not record_ids:
+            raise ValidationError({'record_ids': 'Expected a non-empty list of record ids'})
+        if len(record_ids) > bulk_max_rows():
+            raise ValidationError({'record_ids': f'At most {bulk_max_rows()} ids per request'})
+        if not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in record_ids):
+            raise ValidationError({'record_ids': 'Ids must be integers'})
+
+        results = submit_records(request.user, model_name, record_ids, str(request.data.get('comments') or ''))
+        failed = sum(1 for result in results if result['status'] == 'error')
+        payload = {'submitted': len(results) - failed, 'errors': failed, 'results': results}
+        return Response(payload, status=400 if failed == len(results) else 200)
+
+    @action(detail=False, methods=['get'])
+    def inbox(self, request):
+        """Pending requests whose current step the caller can approve, oldest first."""
+        # Semi-join straight from current_step_id to the approvers table,
+        # skipping crm_approvalstep; crm_approval_inbox_idx covers the rest.
+        approver_steps = ApprovalStep.approvers.through.objects.filter(
+            user=request.user
+        ).values('approvalstep_id')
+        queryset = ApprovalRequest.objects.filter(
+            status='pending', current_step__in=approver_steps
+        ).select_related('approval_process', 'submitter')
+        paginator = KeysetPagination(ordering=('created_date', 'id'))
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+
+class EmailCommunicationViewSet(QueryOptimizerMixin, viewsets.ModelViewSet):
+    queryset = EmailCommunication.objects.all()
+    serializer_class = EmailCommunicationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [filters.OrderingFilter, DjangoFilterBackend]
+    ordering_fields = ['sent_date', 'created_date']
+    filterset_class = EmailCommunicationFilter
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Full-text search over subject, body, sender and recipients, best match first.
+
+        ``?q=`` is required; ``?account=`` limits results to one account.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'A search query is required'})
+        queryset = EmailCommunication.objects.select_related('owner')
+        account = request.query_params.get('account')
+        if account is not None:
+            if not account.isdigit():
+                raise ValidationError({'account': 'Expected an account id'})
+            queryset = queryset.filter(account_id=int(account))
+        paginator = KeysetPagination(ordering=('-rank', '-id'))
+        page = paginator.paginate_queryset(search_communications(queryset, query), request, view=self)
+        return paginator.get_paginated_response(EmailSearchResultSerializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='follow-ups')
+    def follow_ups(self, request):
+        """Open follow-ups for one owner, soonest due first.
+
+        ``?owner=`` defaults to the caller; ``?due=`` is ``overdue``,
+        ``upcoming`` or ``all`` (the default), and ``?days=`` sets how far
+        ahead upcoming reaches (default 7, at most 366).
+        """
+        owner = request.query_params.get('owner', str(request.user.pk))
+        if not owner.isdigit():
+            raise ValidationError({'owner': 'Expected a user id'})
+        due = request.query_params.get('due', 'all')
+        if due not in DUE_CHOICES:
+            raise ValidationError({'due': f"Expected one of {', '.join(DUE_CHOICES)}"})
+        days = request.query_params.get('days', str(FOLLOW_UP_DAYS))
+        if not days.isdigit() or int(days) > FOLLOW_UP_MAX_DAYS:
+            raise ValidationError({'days': f'Expected a number of days up to {FOLLOW_UP_MAX_DAYS}'})
+        queryset = due_follow_ups(
+            EmailCommunication.objects.filter(owner_id=int(owner)).select_related('owner'),
+            due=due, days=int(days),
+        )
+        paginator = KeysetPagination(ordering=('follow_up_date', 'id'))
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(EmailFollowUpSerializer(page, many=True).data)
+
+class ResponseCacheStatsView(APIView):
+    """Hit/miss counters of this worker's API response cache."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(response_cache.stats())
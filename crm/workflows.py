@@ -0,0 +1,321 @@
+"""Workflow rule evaluation.
+
+Each workflow rule's ``conditions`` is an object of Django-style lookups on
+the record's own fields (``{"amount__gte": 100000, "stage__in": [...]}``)
+that must all hold. Rules are compiled into Python predicates once per schema
+snapshot and indexed by (model_name, event), so evaluating a save costs one
+registry lookup plus the predicate calls of the rules that apply to it.
+
+Matching rules are announced through the ``rule_triggered`` signal; whatever
+runs their actions connects to it. ``reevaluate_chunk`` applies rules to
+records that already exist (see the ``reevaluate_workflow_rules`` command).
+"""
+import logging
+import operator
+import threading
+from datetime import datetime
+from typing import Callable, NamedTuple
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import models, transaction
+from django.db.models.constants import LOOKUP_SEP
+from django.dispatch import Signal
+from django.utils import timezone
+
+from . import metrics
+from .models import get_record_model
+from .outbox import resolve_field_update
+from .registry import WorkflowRuleSpec, schema_registry
+
+logger = logging.getLogger(__name__)
+
+CREATED = 'created'
+EDITED = 'edited'
+
+EVENTS_FOR_CRITERIA = {
+    'created': (CREATED,),
+    'created_edited': (CREATED, EDITED),
+    'edited': (EDITED,),
+}
+
+# Sent once per matching rule with rule=<WorkflowRuleSpec>, instance and created.
+rule_triggered = Signal()
+
+
+class WorkflowConditionError(ValueError):
+    """Raised when a rule's conditions cannot be compiled."""
+
+
+def _text(value):
+    return '' if value is None else str(value)
+
+
+def _compare(op):
+    # Comparisons against NULL never match, as in SQL.
+    return lambda actual, expected: actual is not None and op(actual, expected)
+
+
+LOOKUPS = {
+    'exact': operator.eq,
+    'iexact': lambda actual, expected: actual is not None and _text(actual).lower() == _text(expected).lower(),
+    'gt': _compare(operator.gt),
+    'gte': _compare(operator.ge),
+    'lt': _compare(operator.lt),
+    'lte': _compare(operator.le),
+    'in': lambda actual, expected: actual in expected,
+    'contains': lambda actual, expected: actual is not None and expected in _text(actual),
+    'icontains': lambda actual, expected: actual is not None and expected.lower() in _text(actual).lower(),
+    'startswith': lambda actual, expected: actual is not None and _text(actual).startswith(expected),
+    'istartswith': lambda actual, expected: actual is not None and _text(actual).lower().startswith(expected.lower()),
+    'endswith': lambda actual, expected: actual is not None and _text(actual).endswith(expected),
+    'iendswith': lambda actual, expected: actual is not None and _text(actual).lower().endswith(expected.lower()),
+    'isnull': lambda actual, expected: (actual is None) == expected,
+}
+TEXT_LOOKUPS = {'contains', 'icontains', 'startswith', 'istartswith', 'endswith', 'iendswith'}
+
+
+def _to_python(field, value):
+    """Convert like ``field.to_python``, making naive datetimes aware as the ORM would on save."""
+    value = field.to_python(value)
+    if (isinstance(field, models.DateTimeField) and settings.USE_TZ and isinstance(value, datetime)
+            and timezone.is_naive(value)):
+        value = timezone.make_aware(value)
+    return value
+
+
+def _coerce(field, value, key):
+    try:
+        return _to_python(field, value)
+    except ValidationError as exc:
+        raise WorkflowConditionError(f"Invalid value for '{key}': {exc.messages[0]}")
+
+
+def _parse_condition(model, key, expected):
+    """Validate one lookup; return (attname, field, lookup, coerced expected value)."""
+    name, _, lookup = key.partition(LOOKUP_SEP)
+    lookup = lookup or 'exact'
+    if lookup not in LOOKUPS:
+        raise WorkflowConditionError(f"Unsupported lookup '{lookup}' in '{key}'")
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        raise WorkflowConditionError(f"Unknown field '{name}' on {model.__name__}")
+    if not field.concrete or field.many_to_many:
+        raise WorkflowConditionError(f"'{name}' is not a field of {model.__name__}")
+    if field.is_relation:
+        # Related rows are not loaded on save; compare the key instead.
+        field = field.target_field
+        attname = model._meta.get_field(name).attname
+    else:
+        attname = field.attname
+
+    if lookup == 'isnull':
+        if not isinstance(expected, bool):
+            raise WorkflowConditionError(f"'{key}' expects true or false")
+    elif lookup == 'in':
+        if not isinstance(expected, (list, tuple)):
+            raise WorkflowConditionError(f"'{key}' expects a list")
+        expected = frozenset(_coerce(field, item, key) for item in expected)
+    elif lookup in TEXT_LOOKUPS or lookup == 'iexact':
+        expected = _text(expected)
+    elif expected is None:
+        if lookup != 'exact':
+            raise WorkflowConditionError(f"'{key}' needs a value")
+    else:
+        expected = _coerce(field, expected, key)
+
+    return attname, field, lookup, expected
+
+
+def _compile_condition(model, key, expected):
+    attname, field, lookup, expected = _parse_condition(model, key, expected)
+    test = LOOKUPS[lookup]
+
+    def check(instance):
+        actual = getattr(instance, attname)
+        if actual is not None:
+            try:
+                actual = _to_python(field, actual)
+            except ValidationError:
+                return False
+        return test(actual, expected)
+
+    return check
+
+
+def compile_conditions(model, conditions):
+    """Compile a conditions object into a predicate over ``model`` instances."""
+    if not isinstance(conditions, dict):
+        raise WorkflowConditionError('conditions must be an object of lookups')
+    checks = tuple(_compile_condition(model, key, value) for key, value in conditions.items())
+    return lambda instance: all(check(instance) for check in checks)
+
+
+def equality_constraints(model, conditions):
+    """Return {attname: (field, frozenset of allowed values)} for exact/in lookups.
+
+    Records can only match ``conditions`` if, for each of these attributes,
+    ``field.to_python`` of their value is in the set; callers use this to
+    index conditions by value instead of testing each one.
+    """
+    constraints = {}
+    for key, value in conditions.items():
+        attname, field, lookup, expected = _parse_condition(model, key, value)
+        if lookup == 'exact':
+            allowed = frozenset([expected])
+        elif lookup == 'in':
+            allowed = expected
+        else:
+            continue
+        if attname in constraints:
+            allowed &= constraints[attname][1]
+        constraints[attname] = (field, allowed)
+    return constraints
+
+
+class CompiledRule(NamedTuple):
+    spec: WorkflowRuleSpec
+    predicate: Callable
+
+
+def compile_rules(snapshot):
+    """Index the active rules of a schema snapshot by (model_name, event)."""
+    index = {}
+    for spec in snapshot.workflow_rules.values():
+        if not spec.active:
+            continue
+        try:
+            model = get_record_model(spec.model_name)
+            compiled = CompiledRule(spec, compile_conditions(model, spec.conditions))
+        except (LookupError, WorkflowConditionError) as exc:
+            logger.warning('Skipping workflow rule %s (%s): %s', spec.pk, spec.name, exc)
+            continue
+        for event in EVENTS_FOR_CRITERIA.get(spec.evaluation_criteria, ()):
+            index.setdefault((spec.model_name, event), []).append(compiled)
+    return {key: tuple(rules) for key, rules in index.items()}
+
+
+class WorkflowEngine:
+    """Evaluates compiled workflow rules against saved records."""
+
+    def __init__(self, registry=schema_registry):
+        self.registry = registry
+        self._compiled = (None, {})
+        self._lock = threading.Lock()
+
+    def rules_for(self, model_name, created):
+        snapshot = self.registry.snapshot()
+        compiled_snapshot, index = self._compiled
+        if compiled_snapshot is not snapshot:
+            with self._lock:
+                compiled_snapshot, index = self._compiled
+                if compiled_snapshot is not snapshot:
+                    index = compile_rules(snapshot)
+                    self._compiled = (snapshot, index)
+        return index.get((model_name, CREATED if created else EDITED), ())
+
+    def evaluate(self, instance, created):
+        """Return the specs of the active rules ``instance`` matches."""
+        matched = []
+        for rule in self.rules_for(type(instance).__name__, created):
+            try:
+                if rule.predicate(instance):
+                    matched.append(rule.spec)
+            except TypeError as exc:
+                logger.warning('Workflow rule %s could not be evaluated: %s', rule.spec.pk, exc)
+        return matched
+
+    def run(self, instance, created):
+        """Evaluate ``instance`` and send ``rule_triggered`` for every match."""
+        matched = self.evaluate(instance, created)
+        for spec in matched:
+            rule_triggered.send(sender=type(instance), rule=spec, instance=instance, created=created)
+        return matched
+
+
+workflow_engine = WorkflowEngine()
+
+
+# Re-evaluating existing records
+
+class ReevaluationPlan(NamedTuple):
+    rules: tuple  # ((predicate, ((attname, value), ...)), ...)
+    load_fields: tuple
+    update_fields: tuple
+
+
+def build_reevaluation_plan(model, rules):
+    """Compile ``rules`` (WorkflowRuleSpecs on ``model``) and their field updates.
+
+    Only ``field_update`` actions are applied to existing records; emails,
+    tasks and outbound messages are not replayed. Raises
+    WorkflowConditionError or PermanentActionError for a rule that cannot run.
+    """
+    compiled = []
+    load_fields = {model._meta.pk.name}
+    update_fields = set()
+    for rule in rules:
+        predicate = compile_conditions(model, rule.conditions)
+        load_fields.update(key.partition(LOOKUP_SEP)[0] for key in rule.conditions)
+        updates = []
+        for action in rule.actions:
+            if action.action_type != 'field_update':
+                continue
+            field, value = resolve_field_update(model, action.config)
+            updates.append((field.attname, value))
+            load_fields.add(field.name)
+            update_fields.add(field.name)
+        compiled.append((predicate, tuple(updates)))
+    if update_fields:
+        auto_now = {f.name for f in model._meta.concrete_fields if getattr(f, 'auto_now', False)}
+        update_fields |= auto_now
+        load_fields |= auto_now
+        load_fields.update(metrics.TRACKED_FIELDS.get(model, ()))
+    return ReevaluationPlan(tuple(compiled), tuple(sorted(load_fields)), tuple(sorted(update_fields)))
+
+
+def reevaluate_chunk(model_name, rule_ids, first_pk, last_pk, batch_size=1000):
+    """Apply ``rule_ids`` to records with first_pk <= pk <= last_pk.
+
+    Returns (scanned, matched, updated); only rows whose values change are
+    written, with one ``bulk_update`` that also applies their dashboard
+    metrics deltas.
+    """
+    model = get_record_model(model_name)
+    rules = [schema_registry.snapshot().workflow_rules[pk] for pk in rule_ids]
+    plan = build_reevaluation_plan(model, rules)
+    rows = model._default_manager.filter(pk__gte=first_pk, pk__lte=last_pk).only(*plan.load_fields).order_by('pk')
+
+    tracked = model in metrics.TRACKED_FIELDS
+    auto_now = [
+        f for f in model._meta.concrete_fields if f.name in plan.update_fields and getattr(f, 'auto_now', False)
+    ]
+    scanned = matched = 0
+    changed = []
+    deltas = []
+    for row in rows.iterator(chunk_size=batch_size):
+        scanned += 1
+        hit = dirty = False
+        old_values = metrics.instance_values(row) if tracked else None
+        for predicate, updates in plan.rules:
+            if not predicate(row):
+                continue
+            hit = True
+            for attname, value in updates:
+                if getattr(row, attname) != value:
+                    setattr(row, attname, value)
+                    dirty = True
+        matched += hit
+        if dirty:
+            for field in auto_now:
+                field.pre_save(row, add=False)
+            changed.append(row)
+            if tracked:
+                deltas.append((old_values, metrics.instance_values(row)))
+    if changed:
+        with transaction.atomic():
+            model._default_manager.bulk_update(changed, plan.update_fields, batch_size=batch_size)
+            if deltas:
+                metrics.apply_deltas(model, deltas)
+    return scanned, matched, len(changed)
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 import dj_database_url
 from dotenv import load_dotenv
 
@@ -111,6 +112,38 @@ else:
 if DEBUG:
     print(f"Final Database configuration: {DATABASES['default']}")
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The version counters behind the API response cache and the schema registry
+# live here, so production should use a backend shared by every worker
+# (e.g. CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache). A bump in
+# the per-process LocMemCache never reaches the other gunicorn workers or the
+# outbox worker, so with it the response cache stays off unless
+# CRM_RESPONSE_CACHE_ENABLED=True (safe only with a single worker), and the
+# schema registry checks a version row in the database instead, one query
+# per CRM_SCHEMA_CHECK_INTERVAL. CRM_SCHEMA_VERSIONS=cache|database overrides
+# that choice; the test run, a single process, uses the cache counters so its
+# query counts stay deterministic.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'crm_cache'),
+    }
+}
+if os.getenv('CRM_RESPONSE_CACHE_ENABLED'):
+    CRM_RESPONSE_CACHE_ENABLED = os.getenv('CRM_RESPONSE_CACHE_ENABLED') == 'True'
+if os.getenv('CRM_SCHEMA_VERSIONS'):
+    CRM_SCHEMA_VERSIONS = os.getenv('CRM_SCHEMA_VERSIONS')
+elif sys.argv[1:2] == ['test']:
+    CRM_SCHEMA_VERSIONS = 'cache'
+
+# Workflow outbound messages
+# Without an allow-list only public addresses are contacted. Set
+# CRM_OUTBOUND_ALLOWED_HOSTS (comma-separated, ".example.com" matches
+# subdomains) to restrict messages to those hosts instead.
+if os.getenv('CRM_OUTBOUND_ALLOWED_HOSTS'):
+    CRM_OUTBOUND_ALLOWED_HOSTS = os.getenv('CRM_OUTBOUND_ALLOWED_HOSTS').split(',')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -178,7 +211,7 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'crm.pagination.CRMPagination',
     'PAGE_SIZE': 10
 }
 